@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Activity Scheduler - Coalesces FEM activity samples onto a fixed tick
+Posted samples go into a latest-wins buffer per session and a background thread
+applies whatever is pending once per tick, so a client posting faster than the
+viewer can follow costs one update per tick instead of a queue of transactions
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_HZ = float(os.getenv('ACTIVITY_TICK_HZ', '30'))
+DEFAULT_MAX_SESSIONS = int(os.getenv('ACTIVITY_MAX_SESSIONS', '64'))
+
+
+class ActivityScheduler:
+    """Applies the latest FEM sample of each session once per tick"""
+
+    def __init__(self, apply: Callable[[Dict[str, Any]], None], tick_hz: float = DEFAULT_TICK_HZ,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS, autostart: bool = True):
+        self.apply = apply
+        self.autostart = autostart
+        self.period = 1.0 / tick_hz
+        self.max_sessions = max_sessions
+        self.sequence = 0
+        self.counters = {'submitted': 0, 'applied': 0, 'coalesced': 0, 'dropped': 0, 'errors': 0,
+                         'ticks': 0, 'late_ticks': 0}
+        self.max_latency = 0.0
+        self._pending: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name='activity-ticks', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def submit(self, fem_data: Dict[str, Any], session: str = 'default') -> int:
+        """Buffer a sample, replacing the session's pending one; returns the tick that will apply it
+
+        Samples from new sessions are dropped once max_sessions are pending.
+        The tick thread starts with the first sample unless autostart is off.
+        """
+        if self.autostart:
+            self.start()
+        with self._lock:
+            self.counters['submitted'] += 1
+            if session in self._pending:
+                self.counters['coalesced'] += 1
+            elif len(self._pending) >= self.max_sessions:
+                self.counters['dropped'] += 1
+                raise OverflowError(f"Too many sessions with pending activity ({self.max_sessions})")
+            self._pending[session] = (fem_data, time.monotonic())
+            sequence = self.sequence + 1
+        self._wake.set()
+        return sequence
+
+    def tick(self) -> int:
+        """Apply all pending samples now and return this tick's sequence number"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.sequence += 1
+            sequence = self.sequence
+            self.counters['ticks'] += 1
+
+        for session, (fem_data, submitted_at) in pending.items():
+            try:
+                self.apply(fem_data)
+                self.counters['applied'] += 1
+            except Exception as e:
+                self.counters['errors'] += 1
+                logger.error(f"Activity update for session {session} failed: {e}")
+            self.max_latency = max(self.max_latency, time.monotonic() - submitted_at)
+        return sequence
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stopped.is_set():
+            # Idle until a sample arrives, then stay on the tick grid
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+
+            now = time.monotonic()
+            if now < next_tick:
+                time.sleep(next_tick - now)
+            elif now - next_tick > self.period:
+                next_tick = now
+
+            self.tick()
+            next_tick += self.period
+            if time.monotonic() > next_tick:
+                self.counters['late_ticks'] += 1
+            with self._lock:
+                if self._pending:
+                    self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                'sequence': self.sequence,
+                'pending_sessions': len(self._pending),
+                'tick_hz': round(1.0 / self.period, 2),
+                'max_latency_ms': round(self.max_latency * 1000, 1)
+            }
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Activity Stream - Server-sent events of per-neuron activity
+Each computed activity update is quantized to one uint8 per neuron and fanned
+out to every subscribed browser as one frame per changed circuit, so clients
+follow activity from a single computation instead of polling full circuit JSON
+
+Frames are SSE events:
+    event: circuits  data: {"generation": g, "circuits": [{"circuit": i, "name": ..., "neurons": n}, ...]}
+    event: activity  data: {"generation": g, "circuit": i, "activity": "<base64 uint8[n]>"}
+Activity bytes follow the neuron order of /api/circuits/current (0 = idle, 255 = 1.0)
+"""
+
+import base64
+import json
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+DEFAULT_BACKLOG = 16
+HEARTBEAT_SECONDS = 15.0
+
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def quantize_activity(activity: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(activity * 255), 0, 255).astype(np.uint8)
+
+
+class Subscription:
+    """One client's queue of pending SSE events; the oldest are dropped when it falls behind"""
+
+    def __init__(self, backlog: int):
+        self.events = deque(maxlen=backlog)
+        self.dropped = 0
+        self._ready = threading.Condition()
+
+    def put(self, event: str):
+        with self._ready:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout: float) -> Optional[str]:
+        with self._ready:
+            if not self.events:
+                self._ready.wait(timeout)
+            return self.events.popleft() if self.events else None
+
+
+class ActivityBroadcaster:
+    """Fans quantized activity frames out to SSE subscribers"""
+
+    def __init__(self, backlog: int = DEFAULT_BACKLOG, heartbeat: float = HEARTBEAT_SECONDS):
+        self.backlog = backlog
+        self.heartbeat = heartbeat
+        self.generation = 0
+        self.sequence = 0
+        self.frames_published = 0
+        self._subscribers: List[Subscription] = []
+        self._circuits_event: Optional[str] = None
+        self._last_bytes: Dict[int, bytes] = {}
+        self._last_events: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def _broadcast(self, event: str):
+        for subscription in list(self._subscribers):
+            subscription.put(event)
+
+    def reset(self, circuits: List[Dict[str, Any]]):
+        """Start a new generation for a new set of circuits"""
+        with self._lock:
+            self.generation += 1
+            self._last_bytes.clear()
+            self._last_events.clear()
+            self._circuits_event = sse_event('circuits', {
+                'generation': self.generation,
+                'circuits': [{'circuit': index, 'name': circuit['name'], 'neurons': len(circuit['neurons'])}
+                             for index, circuit in enumerate(circuits)]
+            })
+            self._broadcast(self._circuits_event)
+
+    def publish(self, activity) -> int:
+        """Send a frame for every circuit whose quantized activity changed; returns frames sent"""
+        quantized = quantize_activity(activity.activity)
+        sent = 0
+        with self._lock:
+            for index in range(len(activity.names)):
+                payload = quantized[activity.circuit_slice(index)].tobytes()
+                if self._last_bytes.get(index) == payload:
+                    continue
+                self.sequence += 1
+                event = sse_event('activity', {
+                    'generation': self.generation,
+                    'circuit': index,
+                    'activity': base64.b64encode(payload).decode('ascii')
+                }, event_id=self.sequence)
+                self._last_bytes[index] = payload
+                self._last_events[index] = event
+                self._broadcast(event)
+                sent += 1
+            self.frames_published += sent
+        return sent
+
+    def subscribe(self) -> Subscription:
+        """New subscription primed with the circuit list and the latest frame of each circuit"""
+        with self._lock:
+            # Sized under the lock so the priming burst always fits alongside the circuit list
+            subscription = Subscription(max(self.backlog, len(self._last_events) + 1))
+            if self._circuits_event is not None:
+                subscription.put(self._circuits_event)
+            for index in sorted(self._last_events):
+                subscription.put(self._last_events[index])
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def stream(self, subscription: Optional[Subscription] = None) -> Iterator[str]:
+        """SSE text for one client until it disconnects, with comment heartbeats when idle"""
+        subscription = subscription or self.subscribe()
+        try:
+            while True:
+                event = subscription.get(timeout=self.heartbeat)
+                yield event if event is not None else ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'generation': self.generation,
+                'frames_published': self.frames_published,
+                'frames_dropped': sum(subscription.dropped for subscription in self._subscribers)
+            }
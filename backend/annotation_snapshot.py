@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Annotation Snapshot Store - Typed columnar cache of the FlyWire annotation table
+Converts the supplemental TSV once into one .npy file per column (string columns
+as categorical codes) so later process starts load or memory-map it instead of
+re-parsing tens of megabytes of text
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Any, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+
+# Id columns that must stay exact 64-bit integers
+INT64_COLUMNS = ('root_id', 'supervoxel_id')
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """Hash a file on disk without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prepare_annotation_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize dtypes: int64 ids and categorical string columns"""
+    df = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if column in INT64_COLUMNS and series.notna().all():
+            df[column] = series.astype(np.int64)
+        elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            df[column] = series.astype('category')
+    return df
+
+
+def write_columnar(df: pd.DataFrame, path: Union[str, Path], metadata: Optional[Dict[str, Any]] = None) -> Path:
+    """Write a frame as a directory of per-column .npy files plus a JSON manifest"""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    columns = []
+    for i, column in enumerate(df.columns):
+        series = df[column]
+        file_name = f'col_{i:03d}.npy'
+        if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            # Uncategorized strings are stored as categoricals too
+            series = series.astype('category')
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Codes keep pandas' own dtype so reading them back never copies
+            np.save(path / file_name, series.cat.codes.to_numpy())
+            columns.append({
+                'name': str(column),
+                'kind': 'categorical',
+                'file': file_name,
+                'categories': [str(c) for c in series.cat.categories]
+            })
+        else:
+            values = series.to_numpy()
+            np.save(path / file_name, values)
+            columns.append({
+                'name': str(column),
+                'kind': 'numeric',
+                'file': file_name,
+                'dtype': str(values.dtype)
+            })
+
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'rows': len(df),
+        'columns': columns,
+        'created': datetime.now().isoformat()
+    }
+    manifest.update(metadata or {})
+    with open(path / MANIFEST_NAME, 'w') as f:
+        json.dump(manifest, f)
+
+    return path
+
+
+def read_manifest(path: Union[str, Path]) -> Optional[Dict[str, Any]]:
+    """Read a columnar manifest, None if the directory is not a complete snapshot"""
+    manifest_file = Path(path) / MANIFEST_NAME
+    if not manifest_file.exists():
+        return None
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def read_columnar(path: Union[str, Path], mmap: bool = True) -> pd.DataFrame:
+    """Load a columnar directory, memory-mapping the column arrays when requested
+
+    Mapped columns stay backed by the snapshot files, so every process that
+    opens the same snapshot shares one copy through the page cache.
+    """
+    path = Path(path)
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No columnar snapshot at {path}")
+
+    mmap_mode = 'r' if mmap else None
+    data = {}
+    for column in manifest['columns']:
+        values = np.load(path / column['file'], mmap_mode=mmap_mode)
+        if column['kind'] == 'categorical':
+            data[column['name']] = pd.Categorical.from_codes(values, categories=column['categories'])
+        else:
+            data[column['name']] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+class AnnotationSnapshotStore:
+    """Source-hash keyed snapshots of the neuron annotation table"""
+
+    def __init__(self, snapshot_dir: Union[str, Path, None] = None, name: str = 'neuron_annotations'):
+        self.snapshot_dir = Path(snapshot_dir or os.environ.get('FLYWIRE_SNAPSHOT_DIR', 'flywire_cache/snapshots'))
+        self.name = name
+
+    def snapshot_path(self, source_hash: str) -> Path:
+        """Directory holding the snapshot built from a given source file"""
+        return self.snapshot_dir / f"{self.name}-{source_hash[:16]}"
+
+    def load(self, source_hash: str, mmap: bool = True) -> Optional[pd.DataFrame]:
+        """Load the snapshot for a source hash, None if it has not been built"""
+        path = self.snapshot_path(source_hash)
+        manifest = read_manifest(path)
+        if manifest is None or manifest.get('source_sha256') != source_hash:
+            return None
+
+        try:
+            df = read_columnar(path, mmap=mmap)
+            logger.info(f"⚡ Loaded annotation snapshot {path.name} ({len(df):,} rows)")
+            return df
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+            return None
+
+    def save(self, df: pd.DataFrame, source_hash: str) -> Path:
+        """Write a snapshot atomically and drop snapshots of older source files"""
+        final_path = self.snapshot_path(source_hash)
+        tmp_path = self.snapshot_dir / f".tmp-{final_path.name}-{os.getpid()}"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+
+        write_columnar(df, tmp_path, metadata={'source_sha256': source_hash, 'name': self.name})
+        try:
+            os.rename(tmp_path, final_path)
+        except OSError:
+            # Another process finished the same snapshot first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.prune(keep=final_path)
+        logger.info(f"💾 Saved annotation snapshot {final_path.name}")
+        return final_path
+
+    def prune(self, keep: Path):
+        """Remove snapshots of this table other than the one in use"""
+        for path in self.snapshot_dir.glob(f"{self.name}-*"):
+            if path != keep and path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def read_sidecar(self, source_hash: str, name: str) -> Optional[Dict[str, Any]]:
+        """Read a JSON file stored next to a snapshot, None if absent"""
+        sidecar = self.snapshot_path(source_hash) / name
+        if not sidecar.exists():
+            return None
+        try:
+            with open(sidecar) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable snapshot sidecar {sidecar}: {e}")
+            return None
+
+    def write_sidecar(self, source_hash: str, name: str, data: Dict[str, Any]):
+        """Store derived data (e.g. statistics) next to an existing snapshot"""
+        path = self.snapshot_path(source_hash)
+        if read_manifest(path) is None:
+            return
+        try:
+            tmp_file = path / f".{name}.{os.getpid()}"
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, path / name)
+        except OSError as e:
+            logger.warning(f"Could not save snapshot sidecar {name}: {e}")
+
+    def load_or_build(self, source_hash: str, parse: Callable[[], pd.DataFrame], mmap: bool = True) -> pd.DataFrame:
+        """Return the snapshot for source_hash, parsing and saving it on a miss"""
+        df = self.load(source_hash, mmap=mmap)
+        if df is not None:
+            return df
+
+        df = prepare_annotation_frame(parse())
+        try:
+            self.save(df, source_hash)
+        except Exception as e:
+            # A read-only filesystem only costs us the next cold start
+            logger.warning(f"Could not save annotation snapshot: {e}")
+        return df
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Binary Responses - Content negotiation between JSON and msgpack neuron payloads
+Clients ask for msgpack with format=msgpack or an Accept header; numpy arrays in
+the payload are sent as raw little-endian buffers the browser can wrap in typed
+arrays without parsing a number at a time
+"""
+
+from typing import Dict, Any
+
+import msgpack
+import numpy as np
+from flask import Request, Response, jsonify
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# format= values and the mimetypes that select them via Accept
+RESPONSE_FORMATS = {
+    'json': (JSON_MIMETYPE,),
+    'msgpack': (MSGPACK_MIMETYPE, 'application/x-msgpack'),
+}
+
+
+def response_format(req: Request) -> str:
+    """Pick the response encoding from format= or, failing that, the Accept header"""
+    requested = req.args.get('format')
+    if requested:
+        if requested not in RESPONSE_FORMATS:
+            raise ValueError(f"Unknown format '{requested}'. Available: {', '.join(RESPONSE_FORMATS)}")
+        return requested
+
+    offered = [mimetype for mimetypes in RESPONSE_FORMATS.values() for mimetype in mimetypes]
+    best = req.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+    return next(name for name, mimetypes in RESPONSE_FORMATS.items() if best in mimetypes)
+
+
+def _encode_array(value):
+    if isinstance(value, np.ndarray):
+        array = value.astype(value.dtype.newbyteorder('<'), copy=False)
+        return {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'data': np.ascontiguousarray(array).tobytes()
+        }
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def pack_payload(payload: Dict[str, Any]) -> bytes:
+    """msgpack-encode a payload, numpy arrays as {dtype, shape, data} buffers"""
+    return msgpack.packb(payload, default=_encode_array, use_bin_type=True)
+
+
+def encoded_response(payload: Dict[str, Any], fmt: str, status: int = 200) -> Response:
+    """Serialize a payload in the negotiated format"""
+    if fmt == 'msgpack':
+        response = Response(pack_payload(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Blob Cache - Conditional HTTP downloads kept on local disk
+Stores each downloaded file with its ETag/Last-Modified validators, revalidates
+with If-None-Match/If-Modified-Since, and streams changed bodies straight to
+disk so a refresh of an unchanged dataset costs one header round-trip
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CachedBlob:
+    """A cached download and what the last fetch found"""
+
+    def __init__(self, path: Path, meta: Dict[str, Any], changed: bool):
+        self.path = path
+        self.meta = meta
+        self.changed = changed
+
+    @property
+    def sha256(self) -> str:
+        return self.meta['sha256']
+
+    @property
+    def size(self) -> int:
+        return self.meta.get('size', 0)
+
+
+class BlobCache:
+    """Local disk cache of HTTP downloads with validator-based revalidation"""
+
+    def __init__(self, cache_dir: Union[str, Path, None] = None, session: Optional[requests.Session] = None):
+        self.cache_dir = Path(cache_dir or os.environ.get('FLYWIRE_CACHE_DIR', 'flywire_cache/blobs'))
+        self.session = session or requests.Session()
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+    def _meta_path(self, url: str) -> Path:
+        return self.cache_dir / f"{self._key(url)}.meta.json"
+
+    def _default_path(self, url: str) -> Path:
+        name = Path(urlparse(url).path).name or 'blob'
+        return self.cache_dir / f"{self._key(url)}-{name}"
+
+    def _read_meta(self, url: str, path: Path) -> Optional[Dict[str, Any]]:
+        meta_path = self._meta_path(url)
+        if not meta_path.exists() or not path.exists():
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A cached file replaced behind our back cannot be revalidated
+        if meta.get('size') != path.stat().st_size:
+            return None
+        return meta
+
+    def fetch(self, url: str, dest: Union[str, Path, None] = None, timeout: float = 30,
+              chunk_size: int = 1 << 20) -> CachedBlob:
+        """Download url unless the cached copy is still current
+
+        The returned blob reports changed=False when the server answered 304
+        or sent identical bytes. If the server is unreachable a cached copy is
+        returned as unchanged instead of failing.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = Path(dest) if dest else self._default_path(url)
+        meta = self._read_meta(url, path)
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            with self.session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304 and meta:
+                    logger.info(f"✅ {path.name} not modified - using cached copy")
+                    return CachedBlob(path, meta, changed=False)
+                response.raise_for_status()
+                new_meta = self._stream_to_disk(response, path, chunk_size)
+        except requests.RequestException as e:
+            if meta:
+                logger.warning(f"Download of {url} failed ({e}) - using cached copy")
+                return CachedBlob(path, meta, changed=False)
+            raise
+
+        new_meta['url'] = url
+        with open(self._meta_path(url), 'w') as f:
+            json.dump(new_meta, f, indent=2)
+
+        changed = meta is None or meta.get('sha256') != new_meta['sha256']
+        return CachedBlob(path, new_meta, changed=changed)
+
+    def _stream_to_disk(self, response: requests.Response, path: Path, chunk_size: int) -> Dict[str, Any]:
+        """Write the body to path via a temporary file, hashing it on the way"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        logger.info(f"📥 Downloaded {path.name} ({size / (1024 * 1024):.1f} MB)")
+        return {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': digest.hexdigest(),
+            'size': size,
+            'fetched_at': datetime.now().isoformat()
+        }
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+CAVE Executor - Bounded fan-out of independent CAVE requests
+A shared thread pool runs independent queries concurrently, a semaphore per
+host keeps us from flooding one server, and results are gathered against a
+single deadline so a search takes about as long as its slowest query
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.getenv('CAVE_MAX_WORKERS', '8'))
+DEFAULT_PER_HOST_LIMIT = int(os.getenv('CAVE_PER_HOST_LIMIT', '4'))
+
+
+class CaveQueryExecutor:
+    """Thread pool for CAVE requests with a per-host concurrency limit"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        self.per_host_limit = per_host_limit
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cave')
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _slots(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def submit(self, fn: Callable[..., Any], *args, host: Optional[str] = None, **kwargs) -> Future:
+        """Run fn in the pool, holding one of host's slots while it runs"""
+        if host is None:
+            return self._pool.submit(fn, *args, **kwargs)
+
+        slots = self._slots(host)
+
+        def run():
+            with slots:
+                return fn(*args, **kwargs)
+        return self._pool.submit(run)
+
+    def gather(self, futures: Dict[str, Future], timeout: Optional[float]) -> Dict[str, Any]:
+        """Results of named futures, TimeoutError if any is unfinished when timeout runs out
+
+        Unfinished futures are cancelled if they have not started; the first
+        failure is re-raised once everything has settled.
+        """
+        started = time.monotonic()
+        done, pending = wait(futures.values(), timeout=timeout)
+        if pending:
+            for future in pending:
+                future.cancel()
+            late = [name for name, future in futures.items() if future in pending]
+            raise TimeoutError(f"CAVE queries {', '.join(late)} did not finish within {timeout:.1f}s")
+
+        results = {name: future.result() for name, future in futures.items()}
+        logger.info(f"⚡ {len(futures)} CAVE queries finished in {time.monotonic() - started:.2f}s")
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+CAVE Table Cache - Local copies of CAVE tables pinned to a materialization version
+A table is downloaded once per (datastack, table, materialization version),
+written as per-column .npy files and memory-mapped on later reads, so repeated
+circuit searches filter an in-memory frame instead of re-downloading the table
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import pandas as pd
+
+from annotation_snapshot import read_columnar, read_manifest, write_columnar
+
+logger = logging.getLogger(__name__)
+
+# How long a materialization version is trusted before asking CAVE again
+DEFAULT_VERSION_TTL = 300
+
+
+def prepare_table_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Make a CAVE query result storable column by column
+
+    Timezone-aware timestamps become naive UTC datetime64 and string columns
+    become categoricals, so every column saves as a plain numpy array.
+    """
+    df = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            df[column] = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            df[column] = series.astype('category')
+    return df.reset_index(drop=True)
+
+
+class CaveTableCache:
+    """Materialization-version pinned local cache of whole CAVE tables"""
+
+    def __init__(self, client, datastack: str, cache_dir: Union[str, Path, None] = None,
+                 version_ttl: float = DEFAULT_VERSION_TTL):
+        self.client = client
+        self.datastack = datastack
+        self.cache_dir = Path(cache_dir or os.environ.get('FLYWIRE_CAVE_CACHE_DIR', 'flywire_cache/cave'))
+        self.version_ttl = version_ttl
+        self._version = None
+        self._version_checked_at = 0.0
+        self._tables: Dict[Tuple[str, int], pd.DataFrame] = {}
+        self._metadata: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        # One lock per table version being loaded; _lock only guards the dicts
+        self._load_locks: Dict[Tuple[str, int], threading.Lock] = {}
+
+    def materialization_version(self) -> int:
+        """Latest materialization version, asked of CAVE at most once per version_ttl"""
+        with self._lock:
+            if self._version is None or time.monotonic() - self._version_checked_at > self.version_ttl:
+                version = int(self.client.materialize.most_recent_version())
+                if version != self._version and self._version is not None:
+                    logger.info(f"🆕 CAVE materialization {self._version} -> {version}, table cache will refresh")
+                self._version = version
+                self._version_checked_at = time.monotonic()
+            return self._version
+
+    def table_metadata(self) -> Dict[str, Any]:
+        """CAVE table metadata, asked for once per materialization version"""
+        version = self.materialization_version()
+        with self._lock:
+            if self._metadata is None or self._metadata[0] != version:
+                self._metadata = (version, self.client.materialize.get_table_metadata())
+            return self._metadata[1]
+
+    def table_path(self, table: str, version: int) -> Path:
+        return self.cache_dir / f"{self.datastack}-{table}-v{version}"
+
+    def get(self, table: str) -> pd.DataFrame:
+        """The whole table at the current materialization version
+
+        Served from memory, then from the local files, and only downloaded
+        (with split position columns) when neither has this version. Concurrent
+        requests for the same version wait for a single load; other tables
+        keep being served meanwhile.
+        """
+        version = self.materialization_version()
+        key = (table, version)
+        with self._lock:
+            df = self._tables.get(key)
+            if df is not None:
+                return df
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                df = self._tables.get(key)
+            if df is not None:
+                # Another request loaded this version while we were waiting
+                return df
+
+            path = self.table_path(table, version)
+            if read_manifest(path) is not None:
+                df = read_columnar(path)
+                logger.info(f"⚡ Loaded cached CAVE table {table} v{version} ({len(df):,} rows)")
+            else:
+                logger.info(f"📥 Downloading CAVE table {table} at materialization {version}...")
+                df = prepare_table_frame(self.client.materialize.query_table(
+                    table, materialization_version=version, split_positions=True
+                ))
+                self._save(df, table, version)
+
+            with self._lock:
+                # Older versions of this table are no longer served
+                for old_key in [k for k in self._tables if k[0] == table]:
+                    del self._tables[old_key]
+                self._tables[key] = df
+                self._load_locks.pop(key, None)
+            return df
+
+    def _save(self, df: pd.DataFrame, table: str, version: int):
+        path = self.table_path(table, version)
+        tmp_path = self.cache_dir / f".tmp-{path.name}-{os.getpid()}"
+        try:
+            if tmp_path.exists():
+                shutil.rmtree(tmp_path)
+            write_columnar(df, tmp_path, metadata={
+                'datastack': self.datastack, 'table': table, 'materialization_version': version
+            })
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # Another process finished the same table first
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        except Exception as e:
+            # A read-only filesystem only costs a download per process
+            logger.warning(f"Could not cache CAVE table {table}: {e}")
+            return
+
+        for other in self.cache_dir.glob(f"{self.datastack}-{table}-v*"):
+            if other != path and other.is_dir():
+                shutil.rmtree(other, ignore_errors=True)
+        logger.info(f"💾 Cached CAVE table {path.name} ({len(df):,} rows)")
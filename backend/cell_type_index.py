@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Cell Type Index - Inverted index from distinct cell_type strings to table rows
+Substring, prefix and regex searches scan the few thousand distinct types
+(narrowed by a trigram index) instead of every row of the annotation table
+"""
+
+import bisect
+import logging
+import re
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+REGEX_METACHARACTERS = set('.^$*+?{}[]\\|()')
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CellTypeIndex:
+    """Distinct cell types mapped to sorted row-index arrays"""
+
+    def __init__(self, codes: np.ndarray, types: List[str]):
+        self.types = list(types)
+        self.lower_types = [t.lower() for t in self.types]
+        self.n_rows = len(codes)
+
+        # Group row numbers by type code; a stable sort keeps each group in table order
+        codes = np.asarray(codes, dtype=np.int64)
+        self._order = np.argsort(codes, kind='stable')
+        self._bounds = np.searchsorted(codes[self._order], np.arange(-1, len(self.types) + 1))
+
+        # Trigram postings over the lowercased distinct types
+        postings: Dict[str, List[int]] = {}
+        for type_id, text in enumerate(self.lower_types):
+            for gram in _trigrams(text):
+                postings.setdefault(gram, []).append(type_id)
+        self._trigram_postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        # Sorted lowercased types for prefix lookups
+        self._prefix_order = sorted(range(len(self.types)), key=self.lower_types.__getitem__)
+        self._prefix_keys = [self.lower_types[i] for i in self._prefix_order]
+
+        logger.info(f"🔎 Indexed {len(self.types):,} cell types over {self.n_rows:,} rows")
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> 'CellTypeIndex':
+        """Build the index from a (preferably categorical) cell_type column"""
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+        categories = [str(c) for c in series.cat.categories]
+        return cls(series.cat.codes.to_numpy(), categories)
+
+    def type_count(self, type_id: int) -> int:
+        """Number of rows carrying a distinct type"""
+        return int(self._bounds[type_id + 2] - self._bounds[type_id + 1])
+
+    def rows_for_types(self, type_ids) -> np.ndarray:
+        """Union of the rows of several types, ascending like a boolean mask would give"""
+        type_ids = np.asarray(type_ids, dtype=np.int64)
+        if len(type_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        chunks = [self._order[self._bounds[t + 1]:self._bounds[t + 2]] for t in type_ids]
+        return np.sort(np.concatenate(chunks))
+
+    def match_substring(self, query: str, case: bool = False) -> np.ndarray:
+        """Type ids whose name contains query"""
+        needle = query.lower()
+        if len(needle) >= 3:
+            candidates = None
+            for gram in _trigrams(needle):
+                ids = self._trigram_postings.get(gram)
+                if ids is None:
+                    return np.empty(0, dtype=np.int64)
+                candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+            candidates = candidates.tolist()
+        else:
+            candidates = range(len(self.types))
+
+        if case:
+            matched = [t for t in candidates if query in self.types[t]]
+        else:
+            matched = [t for t in candidates if needle in self.lower_types[t]]
+        return np.array(matched, dtype=np.int64)
+
+    def match_prefix(self, prefix: str) -> np.ndarray:
+        """Type ids whose name starts with prefix, case-insensitive"""
+        needle = prefix.lower()
+        start = bisect.bisect_left(self._prefix_keys, needle)
+        end = start
+        while end < len(self._prefix_keys) and self._prefix_keys[end].startswith(needle):
+            end += 1
+        return np.array(sorted(self._prefix_order[start:end]), dtype=np.int64)
+
+    def match_regex(self, pattern: str, case: bool = False) -> np.ndarray:
+        """Type ids matched by a regular expression search"""
+        compiled = re.compile(pattern, 0 if case else re.IGNORECASE)
+        return np.array([t for t, text in enumerate(self.types) if compiled.search(text)], dtype=np.int64)
+
+    def contains(self, pattern: str, case: bool = True) -> np.ndarray:
+        """Rows matching Series.str.contains(pattern, case=case, na=False)"""
+        if REGEX_METACHARACTERS.intersection(pattern):
+            type_ids = self.match_regex(pattern, case=case)
+        else:
+            type_ids = self.match_substring(pattern, case=case)
+        return self.rows_for_types(type_ids)
+
+    def startswith(self, prefix: str) -> np.ndarray:
+        """Rows whose cell type starts with prefix, case-insensitive"""
+        return self.rows_for_types(self.match_prefix(prefix))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Circuit Activity - Array-backed neuron state for FEM-driven activity updates
+Keeps the neurons of all current circuits as one struct-of-arrays (type codes,
+response class, activity) with circuits as contiguous slices, so an update is a
+handful of NumPy expressions instead of a walk over neuron dicts
+
+Colours pushed to Neuroglancer are quantized into activity buckets and the last
+pushed bucket of every segment is remembered, so a viewer update only carries
+the segments whose colour actually changed
+"""
+
+from typing import Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Response classes, checked in this order against each cell type
+MECHANOSENSORY, PHOTORECEPTOR, OTHER = 0, 1, 2
+RESPONSE_PATTERNS = ((MECHANOSENSORY, ('mechanosensory', 'touch')), (PHOTORECEPTOR, ('photoreceptor',)))
+
+# Per response class: activity with and without the optogenetic stimulus, gain
+# per unit of mechanical force, and ceiling, before the temporal factor
+BASE_STIMULATED = np.array([0.9, 0.8, 0.0])
+BASE_UNSTIMULATED = np.array([0.05, 0.1, 0.0])
+FORCE_GAIN = np.array([0.2, 0.0, 0.15])
+ACTIVITY_CEILING = np.array([1.0, np.inf, np.inf])
+
+# Activity 0..1 maps onto this many colours, from the circuit colour towards white
+COLOR_BUCKETS = 16
+MAX_BRIGHTENING = 0.75
+
+
+def response_class(cell_type: str) -> int:
+    for response, patterns in RESPONSE_PATTERNS:
+        if any(pattern in cell_type for pattern in patterns):
+            return response
+    return OTHER
+
+
+def activity_palette(color: str, buckets: int = COLOR_BUCKETS) -> List[str]:
+    """Hex colours for each activity bucket, brightening the circuit colour with activity"""
+    base = np.array([int(color.lstrip('#')[i:i + 2], 16) for i in (0, 2, 4)], dtype=float)
+    mix = np.linspace(0.0, MAX_BRIGHTENING, buckets)[:, None]
+    rgb = np.rint(base + (255 - base) * mix).astype(int)
+    return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in rgb]
+
+
+class CircuitActivity:
+    """Activity state of the neurons of a list of circuits"""
+
+    def __init__(self, circuits: List[Dict[str, Any]]):
+        sizes = [len(circuit['neurons']) for circuit in circuits]
+        self.names = [circuit['name'] for circuit in circuits]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+        types = pd.Categorical([neuron['type'] for circuit in circuits for neuron in circuit['neurons']])
+        self.type_codes = types.codes
+        self.type_labels = list(types.categories)
+
+        # Classify each distinct type once, then broadcast to its neurons
+        classes = np.array([response_class(str(label)) for label in self.type_labels], dtype=np.uint8)
+        self.response = classes[self.type_codes] if len(classes) else np.empty(0, dtype=np.uint8)
+        self.mesh_ids = np.array([int(neuron['mesh_id']) for circuit in circuits for neuron in circuit['neurons']],
+                                 dtype=np.uint64)
+        self.activity = np.array([neuron.get('activity', 0.0) for circuit in circuits for neuron in circuit['neurons']],
+                                 dtype=np.float64)
+
+        # Colour bucket last pushed to the viewer per neuron, -1 when never pushed
+        self.palettes = [activity_palette(circuit.get('color', '#ffffff')) for circuit in circuits]
+        self.pushed_buckets = np.full(len(self.activity), -1, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.activity)
+
+    def circuit_slice(self, index: int) -> slice:
+        return slice(int(self.offsets[index]), int(self.offsets[index + 1]))
+
+    def update(self, fem_data: Dict[str, Any]) -> np.ndarray:
+        """Set every neuron's activity from one FEM frame and return the activity vector"""
+        optogenetic_stimulus = fem_data.get('optogeneticStimulus', False)
+        mechanical_force = fem_data.get('femParameters', {}).get('mechanicalForce', 0)
+        timestamp = fem_data.get('timestamp', 0)
+        peak_time = fem_data.get('peakTime', 11.5)
+
+        # Calculate temporal factor
+        time_factor = np.exp(-abs(timestamp - peak_time) / 5.0)
+
+        # Activity depends only on the response class: three values, then one gather
+        base = BASE_STIMULATED if optogenetic_stimulus else BASE_UNSTIMULATED
+        class_activity = np.minimum(ACTIVITY_CEILING, (base + FORCE_GAIN * mechanical_force) * time_factor)
+        np.take(class_activity, self.response, out=self.activity)
+        return self.activity
+
+    def write_back(self, circuits: Sequence[Dict[str, Any]]):
+        """Copy the activity vector into the circuits' neuron dicts (for JSON responses)"""
+        for index, circuit in enumerate(circuits):
+            for neuron, activity in zip(circuit['neurons'], self.activity[self.circuit_slice(index)].tolist()):
+                neuron['activity'] = activity
+
+    def color_buckets(self) -> np.ndarray:
+        return np.clip(np.rint(self.activity * (COLOR_BUCKETS - 1)), 0, COLOR_BUCKETS - 1).astype(np.int16)
+
+    def color_updates(self, full: bool = False) -> Tuple[List[Dict[int, str]], np.ndarray]:
+        """Per circuit, segment colours whose bucket differs from the last pushed one
+
+        With full=True every segment is included. Returns the buckets to pass
+        to mark_pushed once the colours are in the viewer.
+        """
+        buckets = self.color_buckets()
+        changed = np.ones(len(buckets), dtype=bool) if full else buckets != self.pushed_buckets
+
+        updates = []
+        for index, palette in enumerate(self.palettes):
+            part = self.circuit_slice(index)
+            rows = np.flatnonzero(changed[part])
+            mesh_ids = self.mesh_ids[part][rows].tolist()
+            updates.append({mesh_id: palette[bucket]
+                            for mesh_id, bucket in zip(mesh_ids, buckets[part][rows].tolist())})
+        return updates, buckets
+
+    def mark_pushed(self, buckets: np.ndarray):
+        self.pushed_buckets = buckets
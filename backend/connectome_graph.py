@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Connectome Graph - Synapse-weighted adjacency of the FlyWire edge list
+Stream-parses the Zenodo connections table in chunks into CSR (outgoing) and
+CSC (incoming) arrays over int32 node indices, persisted as .npy files that
+later loads memory-map instead of re-reading millions of edge rows
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+GRAPH_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+GRAPH_ARRAYS = ('root_ids', 'out_indptr', 'out_indices', 'out_weights', 'in_indptr', 'in_indices', 'in_weights')
+
+# Column names used by the FlyWire connections / synapse tables and Codex exports
+PRE_COLUMNS = ('pre_pt_root_id', 'pre_root_id')
+POST_COLUMNS = ('post_pt_root_id', 'post_root_id')
+WEIGHT_COLUMNS = ('syn_count', 'weight')
+
+DIRECTIONS = ('downstream', 'upstream')
+
+# Edge list formats read through pyarrow; anything else is CSV/TSV
+ARROW_SUFFIXES = ('.feather', '.arrow', '.parquet')
+
+
+def _pick_column(columns: Sequence[str], candidates: Sequence[str], required: bool = True) -> Optional[str]:
+    for column in candidates:
+        if column in columns:
+            return column
+    if required:
+        raise ValueError(f"Edge list has none of the columns {', '.join(candidates)}")
+    return None
+
+
+def _pyarrow():
+    try:
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading Feather/Parquet edge lists needs pyarrow; install it or use a CSV export")
+    return pyarrow
+
+
+def _csv_sep(path: Path) -> str:
+    return '\t' if '.tsv' in path.suffixes else ','
+
+
+def table_columns(path: Union[str, Path]) -> List[str]:
+    """Column names of a CSV/TSV, Feather or Parquet table without reading its rows"""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return _pyarrow().parquet.ParquetFile(path).schema_arrow.names
+    if path.suffix in ARROW_SUFFIXES:
+        return _pyarrow().ipc.open_file(path).schema.names
+    return list(pd.read_csv(path, sep=_csv_sep(path), nrows=0).columns)
+
+
+def _arrow_batches(path: Path, columns: Optional[List[str]], chunksize: int) -> Iterator[pd.DataFrame]:
+    """Feather (Arrow IPC) or Parquet rows as frames of at most chunksize rows"""
+    pa = _pyarrow()
+    if path.suffix == '.parquet':
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    # IPC record batches can hold a whole file; zero-copy slices keep conversions chunk sized
+    reader = pa.ipc.open_file(path)
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if columns:
+            batch = batch.select(columns)
+        for offset in range(0, batch.num_rows, chunksize):
+            yield batch.slice(offset, chunksize).to_pandas()
+
+
+def iter_table_chunks(path: Union[str, Path], columns: Optional[List[str]] = None,
+                      chunksize: int = 2_000_000) -> Iterator[pd.DataFrame]:
+    """Frames of a CSV/TSV (optionally gzipped), Feather or Parquet table, chunk by chunk"""
+    path = Path(path)
+    if path.suffix in ARROW_SUFFIXES:
+        return _arrow_batches(path, columns, chunksize)
+    return iter(pd.read_csv(path, sep=_csv_sep(path), usecols=columns, chunksize=chunksize))
+
+
+def iter_edge_chunks(path: Union[str, Path], chunksize: int = 2_000_000) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (pre, post, weight) arrays from an edge list without loading it whole
+
+    CSV/TSV (optionally gzipped) is read with pandas, Feather and Parquet with
+    pyarrow, chunksize rows at a time. Without a syn_count column every row
+    (e.g. of the synapse table) counts as one synapse.
+    """
+    names = table_columns(path)
+    pre = _pick_column(names, PRE_COLUMNS)
+    post = _pick_column(names, POST_COLUMNS)
+    weight = _pick_column(names, WEIGHT_COLUMNS, required=False)
+    columns = [pre, post] + ([weight] if weight else [])
+
+    for chunk in iter_table_chunks(path, columns, chunksize=chunksize):
+        weights = chunk[weight].to_numpy(dtype=np.int64) if weight else np.ones(len(chunk), dtype=np.int64)
+        yield chunk[pre].to_numpy(dtype=np.int64), chunk[post].to_numpy(dtype=np.int64), weights
+
+
+class ConnectomeGraph:
+    """Directed synapse-count graph between neurons, indexed by int32 node ids
+
+    Node i is root_ids[i] (sorted). Outgoing edges of i are
+    out_indices[out_indptr[i]:out_indptr[i + 1]] with matching out_weights;
+    the in_* arrays hold the same edges grouped by target.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], metadata: Optional[Dict[str, Any]] = None):
+        self.root_ids = arrays['root_ids']
+        self.out_indptr = arrays['out_indptr']
+        self.out_indices = arrays['out_indices']
+        self.out_weights = arrays['out_weights']
+        self.in_indptr = arrays['in_indptr']
+        self.in_indices = arrays['in_indices']
+        self.in_weights = arrays['in_weights']
+        self.metadata = metadata or {}
+        self._weight_sums: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_edges(cls, pre: np.ndarray, post: np.ndarray, weights: np.ndarray,
+                   root_ids: Optional[np.ndarray] = None) -> 'ConnectomeGraph':
+        """Build from root_id edge arrays, summing repeated (pre, post) pairs"""
+        if root_ids is None:
+            root_ids = np.union1d(pre, post)
+        root_ids = np.unique(np.asarray(root_ids, dtype=np.int64))
+        return cls._from_indices(_index_of(root_ids, pre), _index_of(root_ids, post), weights, root_ids)
+
+    @classmethod
+    def _from_indices(cls, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray,
+                      root_ids: np.ndarray) -> 'ConnectomeGraph':
+        # Edges touching nodes outside root_ids map to -1 and are dropped
+        keep = (sources >= 0) & (targets >= 0)
+        n = len(root_ids)
+        coo = sparse.coo_matrix(
+            (weights[keep].astype(np.int32), (sources[keep], targets[keep])), shape=(n, n)
+        )
+        out = coo.tocsr()
+        out.sum_duplicates()
+        incoming = out.tocsc()
+
+        graph = cls({
+            'root_ids': root_ids,
+            'out_indptr': out.indptr.astype(np.int64),
+            'out_indices': out.indices.astype(np.int32),
+            'out_weights': out.data.astype(np.int32),
+            'in_indptr': incoming.indptr.astype(np.int64),
+            'in_indices': incoming.indices.astype(np.int32),
+            'in_weights': incoming.data.astype(np.int32),
+        })
+        logger.info(f"🕸️ Built connectome graph: {graph.n_nodes:,} neurons, {graph.n_edges:,} edges")
+        return graph
+
+    @classmethod
+    def from_edge_list(cls, path: Union[str, Path], root_ids: Optional[np.ndarray] = None,
+                       chunksize: int = 2_000_000) -> 'ConnectomeGraph':
+        """Stream an edge list file into a graph
+
+        Without root_ids a first pass collects the node set. Each chunk is
+        reduced to distinct int32 (pre, post) pairs with summed weights, so a
+        per-synapse table costs no more memory than the connection list.
+        """
+        if root_ids is None:
+            root_ids = np.empty(0, dtype=np.int64)
+            for pre, post, _ in iter_edge_chunks(path, chunksize):
+                root_ids = np.union1d(root_ids, np.union1d(pre, post))
+        root_ids = np.unique(np.asarray(root_ids, dtype=np.int64))
+
+        sources, targets, weights = [], [], []
+        n_rows = 0
+        n = len(root_ids)
+        for pre, post, weight in iter_edge_chunks(path, chunksize):
+            source, target = _index_of(root_ids, pre), _index_of(root_ids, post)
+            keep = (source >= 0) & (target >= 0)
+            chunk = sparse.coo_matrix((weight[keep].astype(np.int32), (source[keep], target[keep])), shape=(n, n))
+            chunk.sum_duplicates()
+            sources.append(chunk.row.astype(np.int32))
+            targets.append(chunk.col.astype(np.int32))
+            weights.append(chunk.data)
+            n_rows += len(pre)
+            logger.info(f"  📥 Read {n_rows:,} edge rows")
+
+        if not sources:
+            sources = targets = weights = [np.empty(0, dtype=np.int32)]
+        return cls._from_indices(np.concatenate(sources), np.concatenate(targets),
+                                 np.concatenate(weights), root_ids)
+
+    def save(self, path: Union[str, Path], metadata: Optional[Dict[str, Any]] = None) -> Path:
+        """Write the arrays and a manifest to a directory"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in GRAPH_ARRAYS:
+            np.save(path / f'{name}.npy', getattr(self, name))
+
+        manifest = {
+            'format_version': GRAPH_FORMAT_VERSION,
+            'nodes': self.n_nodes,
+            'edges': self.n_edges,
+            'created': datetime.now().isoformat()
+        }
+        manifest.update(metadata or {})
+        with open(path / MANIFEST_NAME, 'w') as f:
+            json.dump(manifest, f)
+        self.metadata = manifest
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> Optional['ConnectomeGraph']:
+        """Load a saved graph, memory-mapping its arrays; None if there is none"""
+        path = Path(path)
+        manifest_file = path / MANIFEST_NAME
+        if not manifest_file.exists():
+            return None
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != GRAPH_FORMAT_VERSION:
+            return None
+
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in GRAPH_ARRAYS}
+        graph = cls(arrays, manifest)
+        logger.info(f"⚡ Loaded connectome graph {path.name} ({graph.n_nodes:,} neurons, {graph.n_edges:,} edges)")
+        return graph
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.root_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.out_indices)
+
+    @property
+    def version(self) -> str:
+        """Source hash of the edge list the graph was built from"""
+        return self.metadata.get('source_sha256', '')
+
+    def adjacency(self, direction: str = 'downstream') -> sparse.csr_matrix:
+        """Sparse matrix view (no copy) whose row i lists i's partners in a direction"""
+        indptr, indices, weights = self._csr_arrays(direction)
+        return sparse.csr_matrix((weights, indices, indptr), shape=(self.n_nodes, self.n_nodes), copy=False)
+
+    def node_index(self, root_ids) -> np.ndarray:
+        """int32 node indices of root_ids, -1 for neurons without edges"""
+        return _index_of(self.root_ids, np.atleast_1d(np.asarray(root_ids, dtype=np.int64)))
+
+    def out_degree(self, root_ids, weighted: bool = False) -> np.ndarray:
+        """Number of downstream partners (or synapses, if weighted) per neuron"""
+        return self._degree(root_ids, 'downstream', weighted)
+
+    def in_degree(self, root_ids, weighted: bool = False) -> np.ndarray:
+        """Number of upstream partners (or synapses, if weighted) per neuron"""
+        return self._degree(root_ids, 'upstream', weighted)
+
+    def _degree(self, root_ids, direction: str, weighted: bool) -> np.ndarray:
+        indptr, _, weights = self._csr_arrays(direction)
+        nodes = self.node_index(root_ids)
+        known = nodes[nodes >= 0]
+        degree = np.zeros(len(nodes), dtype=np.int64)
+        if weighted:
+            # Prefix sums turn every node's synapse total into one subtraction
+            if direction not in self._weight_sums:
+                self._weight_sums[direction] = np.concatenate(([0], np.cumsum(weights, dtype=np.int64)))
+            sums = self._weight_sums[direction]
+            degree[nodes >= 0] = sums[indptr[known + 1]] - sums[indptr[known]]
+        else:
+            degree[nodes >= 0] = indptr[known + 1] - indptr[known]
+        return degree
+
+    def _csr_arrays(self, direction: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if direction == 'downstream':
+            return self.out_indptr, self.out_indices, self.out_weights
+        if direction == 'upstream':
+            return self.in_indptr, self.in_indices, self.in_weights
+        raise ValueError(f"Unknown direction '{direction}'. Available: {', '.join(DIRECTIONS)}")
+
+    def partners(self, root_id: int, direction: str = 'downstream',
+                 min_weight: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """(partner root_ids, synapse counts) of one neuron, strongest first"""
+        indptr, indices, weights = self._csr_arrays(direction)
+        node = self.node_index(root_id)[0]
+        if node < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+        start, end = indptr[node], indptr[node + 1]
+        partner_nodes = indices[start:end]
+        partner_weights = weights[start:end]
+        keep = partner_weights >= min_weight
+        partner_nodes, partner_weights = partner_nodes[keep], partner_weights[keep]
+        order = np.argsort(-partner_weights, kind='stable')
+        return self.root_ids[partner_nodes[order]], partner_weights[order]
+
+    def downstream(self, root_id: int, min_weight: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Postsynaptic partners of a neuron with synapse counts"""
+        return self.partners(root_id, 'downstream', min_weight)
+
+    def upstream(self, root_id: int, min_weight: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Presynaptic partners of a neuron with synapse counts"""
+        return self.partners(root_id, 'upstream', min_weight)
+
+    def edges(self, root_ids, min_weight: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(pre, post, weight) of every edge among a set of neurons"""
+        nodes = self.node_index(root_ids)
+        nodes = np.unique(nodes[nodes >= 0])
+        sub = self.adjacency('downstream')[nodes][:, nodes].tocoo()
+        keep = sub.data >= min_weight
+        return (self.root_ids[nodes[sub.row[keep]]], self.root_ids[nodes[sub.col[keep]]],
+                sub.data[keep].astype(np.int32))
+
+
+def _index_of(sorted_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Positions of values in a sorted id array as int32, -1 where absent"""
+    values = np.asarray(values, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.full(len(values), -1, dtype=np.int32)
+    positions = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == values, positions, -1).astype(np.int32)
+
+
+class ConnectomeGraphStore:
+    """Source-hash keyed graph directories, built once per edge list file"""
+
+    def __init__(self, graph_dir: Union[str, Path, None] = None, name: str = 'connectome'):
+        self.graph_dir = Path(graph_dir or os.environ.get('FLYWIRE_GRAPH_DIR', 'flywire_cache/graphs'))
+        self.name = name
+
+    def graph_path(self, source_hash: str) -> Path:
+        return self.graph_dir / f"{self.name}-{source_hash[:16]}"
+
+    def latest(self, mmap: bool = True) -> Optional[ConnectomeGraph]:
+        """The most recently built graph, None if none was built"""
+        paths = sorted(self.graph_dir.glob(f"{self.name}-*"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in paths:
+            graph = ConnectomeGraph.load(path, mmap=mmap)
+            if graph is not None:
+                return graph
+        return None
+
+    def load_or_build(self, source_hash: str, edge_list: Union[str, Path],
+                      root_ids: Optional[np.ndarray] = None, mmap: bool = True) -> ConnectomeGraph:
+        """Return the graph for an edge list file, building and saving it on a miss"""
+        path = self.graph_path(source_hash)
+        graph = ConnectomeGraph.load(path, mmap=mmap)
+        if graph is not None and graph.version == source_hash:
+            return graph
+
+        graph = ConnectomeGraph.from_edge_list(edge_list, root_ids=root_ids)
+        tmp_path = self.graph_dir / f".tmp-{path.name}-{os.getpid()}"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        graph.save(tmp_path, metadata={'source_sha256': source_hash, 'source_file': Path(edge_list).name})
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process finished the same graph first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        for other in self.graph_dir.glob(f"{self.name}-*"):
+            if other != path and other.is_dir():
+                shutil.rmtree(other, ignore_errors=True)
+        logger.info(f"💾 Saved connectome graph {path.name}")
+        return ConnectomeGraph.load(path, mmap=mmap) or graph
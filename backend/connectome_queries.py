@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Connectome Queries - Circuits defined by connectivity instead of cell type strings
+k-hop neighbourhoods grow a whole frontier per step with sparse row slicing,
+and strongest paths run Dijkstra over 1/synapse-count edge costs
+"""
+
+import logging
+import threading
+from typing import Dict, Any, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from connectome_graph import DIRECTIONS, ConnectomeGraph
+
+logger = logging.getLogger(__name__)
+
+EXPAND_DIRECTIONS = DIRECTIONS + ('both',)
+MAX_HOPS = 6
+
+
+class ConnectomeQueries:
+    """Neighbourhood and path queries over one connectome graph"""
+
+    def __init__(self, graph: ConnectomeGraph):
+        self.graph = graph
+        self._cost_matrices: Dict[int, sparse.csr_matrix] = {}
+        self._cost_lock = threading.Lock()
+
+    def _seed_nodes(self, seeds: Sequence[int]) -> np.ndarray:
+        nodes = self.graph.node_index(seeds)
+        nodes = np.unique(nodes[nodes >= 0])
+        if len(nodes) == 0:
+            raise ValueError("None of the seed neurons have connectivity")
+        return nodes
+
+    def expand(self, seeds: Sequence[int], hops: int = 1, direction: str = 'downstream',
+               min_weight: int = 1, max_nodes: int = 5000) -> Dict[str, Any]:
+        """k-hop neighbourhood of a seed set and the edges among it
+
+        Each hop slices the adjacency rows of the whole frontier at once and
+        keeps partners connected by at least min_weight synapses. When a hop
+        would exceed max_nodes, its most strongly connected new neurons are
+        kept and the result is marked truncated. More seeds than max_nodes
+        are rejected before any traversal.
+        """
+        if direction not in EXPAND_DIRECTIONS:
+            raise ValueError(f"Unknown direction '{direction}'. Available: {', '.join(EXPAND_DIRECTIONS)}")
+        if not 0 <= hops <= MAX_HOPS:
+            raise ValueError(f"hops must be between 0 and {MAX_HOPS}")
+        if max_nodes < 1:
+            raise ValueError("max_nodes must be at least 1")
+
+        frontier = self._seed_nodes(seeds)
+        if len(frontier) > max_nodes:
+            raise ValueError(f"{len(frontier)} connected seed neurons exceed max_nodes={max_nodes}; "
+                             f"raise max_nodes or pass fewer seeds")
+
+        n = self.graph.n_nodes
+        matrices = [self.graph.adjacency(d) for d in DIRECTIONS if direction in (d, 'both')]
+        hop = np.full(n, -1, dtype=np.int8)
+        hop[frontier] = 0
+        reached = len(frontier)
+        truncated = False
+
+        for step in range(1, hops + 1):
+            if len(frontier) == 0 or truncated:
+                break
+
+            # Synapses from the frontier to every neuron, over all requested directions
+            strength = np.zeros(n, dtype=np.int64)
+            for matrix in matrices:
+                rows = matrix[frontier]
+                strong = rows.data >= min_weight
+                strength += np.bincount(rows.indices[strong], weights=rows.data[strong], minlength=n).astype(np.int64)
+
+            new = np.flatnonzero((strength > 0) & (hop < 0))
+            if reached + len(new) > max_nodes:
+                keep = max(max_nodes - reached, 0)
+                new = new[np.argsort(-strength[new], kind='stable')[:keep]]
+                truncated = True
+
+            hop[new] = step
+            reached += len(new)
+            frontier = new
+
+        nodes = np.flatnonzero(hop >= 0)
+        nodes = nodes[np.argsort(hop[nodes], kind='stable')]
+        pre, post, weight = self.graph.edges(self.graph.root_ids[nodes], min_weight=min_weight)
+        return {
+            'root_ids': self.graph.root_ids[nodes],
+            'hops': hop[nodes],
+            'edges': {'pre': pre, 'post': post, 'weight': weight},
+            'truncated': truncated
+        }
+
+    def _cost_matrix(self, min_weight: int) -> sparse.csr_matrix:
+        """Downstream adjacency with 1/weight costs, edges below min_weight removed"""
+        with self._cost_lock:
+            costs = self._cost_matrices.get(min_weight)
+        if costs is None:
+            adjacency = self.graph.adjacency('downstream')
+            # Copies the (possibly memory-mapped, read-only) index arrays once per threshold
+            costs = sparse.csr_matrix(
+                (1.0 / adjacency.data, adjacency.indices, adjacency.indptr), shape=adjacency.shape, copy=True
+            )
+            if min_weight > 1:
+                costs.data[adjacency.data < min_weight] = 0
+                costs.eliminate_zeros()
+            with self._cost_lock:
+                if len(self._cost_matrices) >= 4:
+                    self._cost_matrices.pop(next(iter(self._cost_matrices)))
+                self._cost_matrices[min_weight] = costs
+        return costs
+
+    def strongest_path(self, source: int, target: int, min_weight: int = 1) -> Optional[Dict[str, Any]]:
+        """Path from source to target minimizing the sum of 1/synapse-count, None if unreachable"""
+        nodes = self.graph.node_index([source, target])
+        if (nodes < 0).any():
+            raise ValueError("Source or target neuron has no connectivity")
+
+        costs = self._cost_matrix(min_weight)
+        distances, predecessors = csgraph.dijkstra(
+            costs, directed=True, indices=int(nodes[0]), return_predecessors=True
+        )
+        if not np.isfinite(distances[nodes[1]]):
+            return None
+
+        path = [int(nodes[1])]
+        while path[-1] != nodes[0]:
+            path.append(int(predecessors[path[-1]]))
+        path = np.array(path[::-1], dtype=np.int64)
+
+        adjacency = self.graph.adjacency('downstream')
+        weights = np.asarray(adjacency[path[:-1], path[1:]]).ravel().astype(np.int32)
+        return {
+            'root_ids': self.graph.root_ids[path],
+            'weights': weights,
+            'cost': float(distances[nodes[1]])
+        }
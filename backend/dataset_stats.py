@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Dataset Statistics - Summary counts materialized once per annotation snapshot
+/api/stats serves these precomputed counts instead of re-scanning the table
+"""
+
+import logging
+from typing import Dict, Any, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Dimensions counted when a snapshot is built
+DEFAULT_GROUP_BY = ('super_class', 'cell_class', 'cell_type', 'side')
+DEFAULT_TOP_K = 10
+
+
+def group_counts(df: pd.DataFrame, column: str) -> Dict[str, int]:
+    """Non-missing value counts of a column, most frequent first"""
+    if column not in df.columns:
+        raise KeyError(f"Unknown column '{column}'")
+
+    series = df[column]
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+
+    codes = series.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+    order = np.argsort(-counts, kind='stable')
+    categories = series.cat.categories
+    return {str(categories[i]): int(counts[i]) for i in order if counts[i] > 0}
+
+
+def top_counts(counts: Dict[str, int], k: int) -> Dict[str, int]:
+    """First k entries of a most-frequent-first count dict"""
+    return dict(list(counts.items())[:max(0, k)])
+
+
+def compute_dataset_stats(df: pd.DataFrame, auditory_neurons: int,
+                          group_by: Sequence[str] = DEFAULT_GROUP_BY) -> Dict[str, Any]:
+    """Build the statistics summary stored with a snapshot"""
+    counts = {column: group_counts(df, column) for column in group_by if column in df.columns}
+    stats = {
+        'total_neurons': len(df),
+        'mechanosensory_neurons': counts.get('cell_class', {}).get('mechanosensory', 0),
+        'auditory_neurons': auditory_neurons,
+        'sensory_neurons': counts.get('super_class', {}).get('sensory', 0),
+        'counts': counts
+    }
+    logger.info(f"📈 Computed dataset statistics over {len(counts)} dimensions")
+    return stats
+
+
+def stats_summary(stats: Dict[str, Any], extra_counts: Dict[str, Dict[str, int]],
+                  top_k: int = DEFAULT_TOP_K) -> Dict[str, Any]:
+    """API view of stored statistics: headline counts, top-k histograms and requested group-bys"""
+    counts = stats['counts']
+    summary = {
+        'total_neurons': stats['total_neurons'],
+        'mechanosensory_neurons': stats['mechanosensory_neurons'],
+        'auditory_neurons': stats['auditory_neurons'],
+        'sensory_neurons': stats['sensory_neurons'],
+        'top_cell_types': top_counts(counts.get('cell_type', {}), top_k),
+        'top': {column: top_counts(values, top_k) for column, values in counts.items()}
+    }
+    if extra_counts:
+        summary['counts'] = extra_counts
+    return summary
+
+
+def parse_group_by(value: str) -> List[str]:
+    """Split a comma separated group_by query parameter"""
+    return [column.strip() for column in (value or '').split(',') if column.strip()]
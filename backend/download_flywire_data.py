@@ -4,6 +4,7 @@ Download FlyWire datasets for offline use
 Replaces API calls with local data files
 """
 
+import argparse
 import requests
 import pandas as pd
 import json
@@ -13,6 +14,13 @@ import zipfile
 import logging
 from datetime import datetime
 
+from annotation_snapshot import AnnotationSnapshotStore, file_sha256
+from blob_cache import BlobCache
+from chunked_download import ChunkedDownloader
+from connectome_graph import ConnectomeGraphStore
+from nblast_store import NblastStore
+from skeleton_store import SkeletonStore, source_fingerprint
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -21,6 +29,9 @@ class FlyWireDataDownloader:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
+        # Validators of the downloaded files, so re-runs only fetch what changed
+        self.blobs = BlobCache(self.data_dir / ".cache")
+        
         # GitHub repository for annotations
         self.github_base = "https://raw.githubusercontent.com/flyconnectome/flywire_annotations/main"
         
@@ -28,8 +39,20 @@ class FlyWireDataDownloader:
         self.zenodo_synapses = "https://zenodo.org/api/records/10676866"
         self.zenodo_skeletons = "https://zenodo.org/api/records/10877326"
         
-    def download_all_datasets(self):
-        """Download all essential FlyWire datasets"""
+        # Parallel, resumable downloads of the multi-gigabyte Zenodo files
+        self.chunked = ChunkedDownloader()
+        
+        # Memory-mappable adjacency built from the downloaded edge list
+        self.graphs = ConnectomeGraphStore(self.data_dir / "connectome")
+        
+        # Packed multi-resolution skeletons built from the Zenodo skeleton release
+        self.skeletons = SkeletonStore(self.data_dir / "skeletons")
+        
+        # NBLAST scores as a memory-mapped float16 matrix with a top-k table
+        self.nblast = NblastStore(self.data_dir / "nblast")
+        
+    def download_all_datasets(self, zenodo_files=()):
+        """Download all essential FlyWire datasets, plus any named Zenodo connectivity files"""
         logger.info("🚀 Starting FlyWire dataset download...")
         
         try:
@@ -38,8 +61,19 @@ class FlyWireDataDownloader:
             
             # 2. Download connectivity data info
             self.get_connectivity_download_info()
+            if zenodo_files:
+                self.download_zenodo_files(zenodo_files)
+            
+            # 3. Build the connectivity graph if the edge list has been downloaded
+            self.ingest_connectivity()
+            
+            # 4. Pack the skeletons if the skeleton archive has been downloaded
+            self.ingest_skeletons()
+            
+            # 5. Convert the NBLAST scores if the score table has been downloaded
+            self.ingest_nblast()
             
-            # 3. Create data loading functions
+            # 6. Create data loading functions
             self.create_data_loaders()
             
             logger.info("✅ All datasets downloaded successfully!")
@@ -64,13 +98,12 @@ class FlyWireDataDownloader:
             local_path = self.data_dir / Path(file_path).name
             
             logger.info(f"  📋 Downloading {Path(file_path).name}...")
-            response = requests.get(url)
-            response.raise_for_status()
+            blob = self.blobs.fetch(url, dest=local_path, timeout=60)
             
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
-            
-            logger.info(f"  ✅ Saved to {local_path}")
+            if blob.changed:
+                logger.info(f"  ✅ Saved to {local_path}")
+            else:
+                logger.info(f"  ✅ {local_path} already up to date")
         
         # Load and analyze the main annotations file
         self.analyze_neuron_annotations()
@@ -81,7 +114,11 @@ class FlyWireDataDownloader:
         
         # Load main annotations file
         annotations_file = self.data_dir / "Supplemental_file1_neuron_annotations.tsv"
-        df = pd.read_csv(annotations_file, sep='\t')
+        # Building the snapshot here spares the local backend its first TSV parse
+        df = AnnotationSnapshotStore(self.data_dir / "snapshots").load_or_build(
+            file_sha256(annotations_file),
+            lambda: pd.read_csv(annotations_file, sep='\t', low_memory=False)
+        )
         
         logger.info(f"  📊 Total neurons in dataset: {len(df):,}")
         
@@ -156,14 +193,16 @@ class FlyWireDataDownloader:
             download_info["synapses_and_connectivity"]["files"].append({
                 "filename": file_info['key'],
                 "size_mb": round(file_info['size'] / (1024*1024), 2),
-                "download_url": file_info['links']['self']
+                "download_url": file_info['links']['self'],
+                "checksum": file_info.get('checksum')
             })
         
         for file_info in skeletons_info.get('files', []):
             download_info["skeletons_and_nblast"]["files"].append({
                 "filename": file_info['key'],
                 "size_mb": round(file_info['size'] / (1024*1024), 2), 
-                "download_url": file_info['links']['self']
+                "download_url": file_info['links']['self'],
+                "checksum": file_info.get('checksum')
             })
         
         # Save download info
@@ -179,6 +218,104 @@ class FlyWireDataDownloader:
         logger.info(f"  📦 Synapses data total size: {total_synapses_size:,.1f} MB")
         logger.info(f"  📦 Skeletons data total size: {total_skeletons_size:,.1f} MB")
     
+    def download_zenodo_files(self, names, dataset=None):
+        """Download files listed in download_info.json, verified against their Zenodo checksums"""
+        with open(self.data_dir / "download_info.json") as f:
+            download_info = json.load(f)
+        datasets = [dataset] if dataset else list(download_info)
+        files = {f["filename"]: f for name in datasets for f in download_info[name]["files"]}
+        
+        paths = []
+        for name in names:
+            if name not in files:
+                raise KeyError(f"{name} is not listed in download_info.json. Available: {', '.join(files)}")
+            info = files[name]
+            logger.info(f"📥 Downloading {name} ({info['size_mb']:,.1f} MB)...")
+            paths.append(self.chunked.download(info["download_url"], self.data_dir / name, checksum=info.get("checksum")))
+        return paths
+    
+    def find_edge_list(self):
+        """Downloaded Zenodo connections table, None if it is not in the data directory"""
+        candidates = []
+        download_info_file = self.data_dir / "download_info.json"
+        if download_info_file.exists():
+            with open(download_info_file) as f:
+                files = json.load(f)["synapses_and_connectivity"]["files"]
+            candidates = [f["filename"] for f in files if "connections" in f["filename"]]
+        
+        for name in candidates + ["proofread_connections_783.feather", "connections.csv.gz"]:
+            path = self.data_dir / name
+            if path.exists():
+                return path
+        return None
+    
+    def ingest_connectivity(self, edge_list_file=None):
+        """Stream-parse the edge list into the CSR/CSC connectome graph"""
+        logger.info("🕸️ Building connectivity graph...")
+        
+        edge_list = Path(edge_list_file) if edge_list_file else self.find_edge_list()
+        if edge_list is None:
+            logger.info("  ⏭️ No edge list downloaded yet - get the connections table listed in download_info.json")
+            return None
+        
+        graph = self.graphs.load_or_build(file_sha256(edge_list), edge_list)
+        logger.info(f"  ✅ {graph.n_nodes:,} neurons, {graph.n_edges:,} weighted edges from {edge_list.name}")
+        return graph
+    
+    def find_skeleton_source(self):
+        """Downloaded skeleton archive (or extracted directory), None if there is none"""
+        download_info_file = self.data_dir / "download_info.json"
+        if not download_info_file.exists():
+            return None
+        with open(download_info_file) as f:
+            files = json.load(f)["skeletons_and_nblast"]["files"]
+        
+        for name in [f["filename"] for f in files if "sk" in f["filename"] and f["filename"].endswith(".zip")]:
+            for path in (self.data_dir / name, self.data_dir / name[:-len(".zip")]):
+                if path.exists():
+                    return path
+        return None
+    
+    def ingest_skeletons(self, source=None):
+        """Pack SWC/precomputed skeletons into the memory-mapped multi-resolution store"""
+        logger.info("🦴 Packing neuron skeletons...")
+        
+        source = Path(source) if source else self.find_skeleton_source()
+        if source is None:
+            logger.info("  ⏭️ No skeletons downloaded yet - get the skeleton archive listed in download_info.json")
+            return None
+        
+        skeletons = self.skeletons.load_or_build(source_fingerprint(source), source)
+        logger.info(f"  ✅ {len(skeletons):,} skeletons at {len(skeletons.lod_spacings)} levels of detail from {source.name}")
+        return skeletons
+    
+    def find_nblast_table(self):
+        """Downloaded NBLAST score table, None if it is not in the data directory"""
+        download_info_file = self.data_dir / "download_info.json"
+        if not download_info_file.exists():
+            return None
+        with open(download_info_file) as f:
+            files = json.load(f)["skeletons_and_nblast"]["files"]
+        
+        for name in [f["filename"] for f in files if "nblast" in f["filename"].lower()]:
+            path = self.data_dir / name
+            if path.exists() and not name.endswith(".zip"):
+                return path
+        return None
+    
+    def ingest_nblast(self, table_file=None):
+        """Convert the wide NBLAST table into the memory-mapped matrix and top-k table"""
+        logger.info("🧬 Converting NBLAST scores...")
+        
+        table = Path(table_file) if table_file else self.find_nblast_table()
+        if table is None:
+            logger.info("  ⏭️ No NBLAST table downloaded yet - get it from the skeletons record in download_info.json")
+            return None
+        
+        matrix = self.nblast.load_or_build(file_sha256(table), table)
+        logger.info(f"  ✅ {len(matrix.query_ids):,} x {len(matrix.target_ids):,} NBLAST scores from {table.name}")
+        return matrix
+    
     def create_data_loaders(self):
         """Create Python functions to load and use the downloaded data"""
         logger.info("🛠️  Creating data loader functions...")
@@ -190,10 +327,18 @@ FlyWire Data Loaders - Use downloaded datasets instead of API calls
 
 import pandas as pd
 import json
+import sys
 from pathlib import Path
 from typing import List, Dict, Any
 import logging
 
+# The shared record builder lives with the backends that generated this loader
+sys.path.insert(0, __BACKEND_DIR__)
+from connectome_graph import ConnectomeGraphStore
+from neuron_records import build_neuron_records
+from nblast_store import NblastStore
+from skeleton_store import SkeletonStore
+
 logger = logging.getLogger(__name__)
 
 class FlyWireDataLoader:
@@ -204,6 +349,9 @@ class FlyWireDataLoader:
         self._neuron_annotations = None
         self._mechanosensory_neurons = None
         self._larval_neurons = None
+        self._connectome = None
+        self._skeletons = None
+        self._nblast = None
     
     @property 
     def neuron_annotations(self):
@@ -213,6 +361,27 @@ class FlyWireDataLoader:
             self._neuron_annotations = pd.read_csv(file_path, sep='\\t')
         return self._neuron_annotations
     
+    @property
+    def connectome(self):
+        """Lazy load the connectivity graph (None until it has been ingested)"""
+        if self._connectome is None:
+            self._connectome = ConnectomeGraphStore(self.data_dir / "connectome").latest()
+        return self._connectome
+    
+    @property
+    def skeletons(self):
+        """Lazy load the packed skeleton store (None until it has been ingested)"""
+        if self._skeletons is None:
+            self._skeletons = SkeletonStore(self.data_dir / "skeletons").latest()
+        return self._skeletons
+    
+    @property
+    def nblast(self):
+        """Lazy load the NBLAST matrix (None until it has been converted)"""
+        if self._nblast is None:
+            self._nblast = NblastStore(self.data_dir / "nblast").latest()
+        return self._nblast
+    
     @property
     def mechanosensory_neurons(self):
         """Lazy load mechanosensory neurons"""
@@ -239,18 +408,11 @@ class FlyWireDataLoader:
                 return []
             
             # Convert to API format
-            neurons = []
-            for _, row in mech_df.head(limit).iterrows():
-                neuron = {
-                    'id': str(row.get('root_id', row.get('pt_root_id', 'unknown'))),
-                    'type': row.get('cell_type', 'mechanosensory'),
-                    'position': [0.0, 0.0, 0.0],  # Would need position data
-                    'activity': 0.0,
-                    'mesh_id': row.get('root_id', row.get('pt_root_id')),
-                    'confidence': 1.0,
-                    'source': 'local_data'
-                }
-                neurons.append(neuron)
+            neurons = build_neuron_records(
+                mech_df.head(limit),
+                source='local_data',
+                default_type='mechanosensory'
+            )
             
             logger.info(f"Found {len(neurons)} mechanosensory neurons in local data")
             return neurons
@@ -288,8 +450,13 @@ class FlyWireDataLoader:
 # loader = FlyWireDataLoader()
 # circuits = loader.get_circuits()
 # neurons = loader.search_larval_mechanosensory_neurons()
+# partners, synapses = loader.connectome.downstream(720575940600316437)
 '''
         
+        # Absolute, so the loader finds the backends wherever the data directory lives
+        backend_dir = repr(str(Path(__file__).resolve().parent))
+        loader_code = loader_code.replace('__BACKEND_DIR__', backend_dir)
+        
         with open(self.data_dir / "flywire_data_loader.py", 'w') as f:
             f.write(loader_code)
         
@@ -301,7 +468,7 @@ class FlyWireDataLoader:
         logger.info("="*50)
         logger.info(f"📁 Data directory: {self.data_dir.absolute()}")
         
-        files = list(self.data_dir.glob("*"))
+        files = [p for p in self.data_dir.glob("*") if p.is_file()]
         logger.info(f"📄 Files downloaded: {len(files)}")
         
         for file_path in sorted(files):
@@ -310,10 +477,15 @@ class FlyWireDataLoader:
         
         logger.info("\n🚀 NEXT STEPS:")
         logger.info("1. Use flywire_data_loader.py to access data locally")
-        logger.info("2. Download connectivity data from Zenodo (see download_info.json)")
+        logger.info("2. Download connectivity data from Zenodo: python download_flywire_data.py --zenodo <filename>")
         logger.info("3. Update your backend to use FlyWireDataLoader instead of API calls")
         logger.info("\n✅ No more SSL issues - everything is local!")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download FlyWire datasets for offline use")
+    parser.add_argument("--zenodo", nargs="*", default=[], metavar="FILENAME",
+                        help="Zenodo connectivity or skeleton files (see download_info.json) to download, resumably")
+    args = parser.parse_args()
+    
     downloader = FlyWireDataDownloader()
-    downloader.download_all_datasets() 
\ No newline at end of file
+    downloader.download_all_datasets(zenodo_files=args.zenodo) 
\ No newline at end of file
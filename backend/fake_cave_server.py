@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Fake CAVE Server - Offline stand-in for the FlyWire CAVE materialization API
+Serves deterministic synthetic cell_type_local and nucleus_detection_v0 tables
+of any size with a configurable response latency, so the neuroglancer backend
+can be load tested and profiled without network access or SSL setup
+
+Run it, then point the backend at it:
+    python fake_cave_server.py --rows 100000 --latency 0.05 --port 8123
+    FLYWIRE_CAVE_CLIENT=local FLYWIRE_CAVE_SERVER=http://127.0.0.1:8123 python flywire_neuroglancer.py
+"""
+
+import argparse
+import io
+import logging
+import time
+from typing import Dict, Any
+
+import numpy as np
+from flask import Flask, request, jsonify, Response
+
+logger = logging.getLogger(__name__)
+
+NPZ_MIMETYPE = 'application/x-npz'
+
+# Cell types drawn for the synthetic table: the service's search patterns plus filler
+SYNTHETIC_CELL_TYPES = [
+    'CHRIMSON_mechanosensory_larval', 'CHRIMSON_touch_receptor_larval', 'CHRIMSON_stretch_receptor_larval',
+    'CHRIMSON_campaniform_larval', 'CHRIMSON_proprioceptor_larval', 'CHRIMSON_nociceptor_larval',
+    'photoreceptor_R1', 'photoreceptor_R7', 'photoreceptor_R8', 'L1_larval_interneuron',
+    'L3_instar_motor', 'KC_gamma', 'MBON01', 'DNa02', 'LC10', 'T4a', 'Mi1', 'Tm3'
+]
+# Most neurons are filler so a search filters a realistic share of rows
+SYNTHETIC_TYPE_WEIGHTS = np.array([0.5] * 6 + [1] * 5 + [20] * 7, dtype=float)
+
+
+def synthetic_tables(rows: int, seed: int = 783) -> Dict[str, Dict[str, np.ndarray]]:
+    """Column arrays of cell_type_local and nucleus_detection_v0 with `rows` neurons each
+
+    String columns are dictionary encoded as <name>__codes / <name>__categories.
+    """
+    rng = np.random.default_rng(seed)
+    root_ids = 720575940600000000 + rng.choice(rows * 4, size=rows, replace=False).astype(np.int64)
+    weights = SYNTHETIC_TYPE_WEIGHTS / SYNTHETIC_TYPE_WEIGHTS.sum()
+    labelled = rng.choice(rows, size=max(rows // 2, 1), replace=False)
+
+    cell_types = {
+        'id': np.arange(len(labelled), dtype=np.int64),
+        'valid': np.ones(len(labelled), dtype=bool),
+        'pt_root_id': root_ids[labelled],
+        'cell_type__codes': rng.choice(len(SYNTHETIC_CELL_TYPES), size=len(labelled), p=weights).astype(np.int16),
+        'cell_type__categories': np.array(SYNTHETIC_CELL_TYPES),
+        'confidence': rng.uniform(0.5, 1.0, size=len(labelled)).astype(np.float32),
+    }
+    nuclei = {
+        'id': np.arange(rows, dtype=np.int64),
+        'pt_root_id': root_ids,
+        'pt_position_x': rng.uniform(100000, 900000, size=rows).round(),
+        'pt_position_y': rng.uniform(100000, 400000, size=rows).round(),
+        'pt_position_z': rng.uniform(10000, 280000, size=rows).round(),
+        'volume': rng.lognormal(3, 0.5, size=rows).astype(np.float32),
+    }
+    return {'cell_type_local': cell_types, 'nucleus_detection_v0': nuclei}
+
+
+def encode_npz(columns: Dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **columns)
+    return buffer.getvalue()
+
+
+def create_app(rows: int = 10000, latency: float = 0.0, version: int = 783, seed: int = 783,
+               datastack: str = 'flywire_fafb_production') -> Flask:
+    """Flask app answering the subset of CAVE endpoints LocalCaveClient uses"""
+    app = Flask(__name__)
+    tables = synthetic_tables(rows, seed=seed)
+    stats: Dict[str, Any] = {'requests': 0, 'rows_served': 0}
+    app.config.update(FAKE_CAVE_TABLES=tables, FAKE_CAVE_STATS=stats, FAKE_CAVE_VERSION=version)
+
+    @app.before_request
+    def simulate_latency():
+        stats['requests'] += 1
+        if latency:
+            time.sleep(latency)
+
+    @app.route('/info/api/versions')
+    def api_versions():
+        return jsonify([2])
+
+    @app.route('/info/api/v2/datastack/full/<name>')
+    def datastack_info(name):
+        return jsonify({'datastack': name, 'description': f"Fake CAVE datastack with {rows:,} synthetic neurons"})
+
+    @app.route(f'/materialize/api/v3/datastack/{datastack}/versions/latest')
+    def latest_version():
+        return jsonify({'version': app.config['FAKE_CAVE_VERSION']})
+
+    @app.route(f'/materialize/api/v3/datastack/{datastack}/tables')
+    def table_metadata():
+        return jsonify({name: {'rows': len(columns['id'])} for name, columns in tables.items()})
+
+    @app.route(f'/materialize/api/v3/datastack/{datastack}/query', methods=['POST'])
+    def query_table():
+        query = request.get_json()
+        columns = tables.get(query.get('table'))
+        if columns is None:
+            return jsonify({'error': f"Unknown table {query.get('table')}"}), 404
+        if query.get('materialization_version') not in (None, app.config['FAKE_CAVE_VERSION']):
+            return jsonify({'error': f"Materialization {query['materialization_version']} is not available"}), 404
+
+        mask = np.ones(len(columns['id']), dtype=bool)
+        for column, value in (query.get('filter_equal_dict') or {}).items():
+            mask &= columns[column] == value
+        for column, values in (query.get('filter_in_dict') or {}).items():
+            mask &= np.isin(columns[column], np.asarray(values, dtype=columns[column].dtype))
+
+        rows_out = np.flatnonzero(mask)
+        stats['rows_served'] += len(rows_out)
+        result = {name: values if name.endswith('__categories') else values[rows_out]
+                  for name, values in columns.items()}
+        return Response(encode_npz(result), mimetype=NPZ_MIMETYPE)
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the FlyWire CAVE materialization API")
+    parser.add_argument("--rows", type=int, default=10000, help="synthetic neurons per table")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--version", type=int, default=783, help="materialization version reported")
+    parser.add_argument("--seed", type=int, default=783)
+    parser.add_argument("--port", type=int, default=8123)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"🧪 Fake CAVE with {args.rows:,} neurons, {args.latency * 1000:.0f} ms latency on port {args.port}")
+    create_app(args.rows, args.latency, args.version, args.seed).run(host='127.0.0.1', port=args.port, threaded=True)
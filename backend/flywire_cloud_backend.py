@@ -5,16 +5,30 @@ Eliminates SSL issues by using pre-downloaded data hosted in the cloud
 """
 
 import json
+import numpy as np
 import pandas as pd
+import requests
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import logging
-from typing import List, Dict, Any
-import requests
-import io
+from typing import List, Dict, Any, Optional
 import os
+import threading
 from datetime import datetime, timedelta
 
+from annotation_snapshot import AnnotationSnapshotStore
+from binary_response import encoded_response, response_format
+from blob_cache import BlobCache
+from connectome_graph import ConnectomeGraphStore
+from connectome_queries import ConnectomeQueries
+from dataset_stats import DEFAULT_TOP_K, parse_group_by, stats_summary
+from flywire_dataset import FlyWireDataset
+from nblast_store import NblastMatrix, NblastStore
+from neuron_records import NEURON_FIELDS, build_neuron_columns, build_neuron_records, root_id_array
+from pagination import paginate, parse_fields
+from response_cache import ResponseCache
+from skeleton_store import PackedSkeletons, SkeletonStore
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,16 +53,69 @@ class FlyWireCloudDataService:
             'non_neuron_annotations': 'https://raw.githubusercontent.com/flyconnectome/flywire_annotations/main/supplemental_files/Supplemental_file2_non_neuron_annotations.tsv'
         }
         
-        # Cache for loaded data
-        self.neuron_data = None
-        self.mechanosensory_circuit = None
-        self.data_loaded = False
-        self.cache_timestamp = None
+        # Current dataset snapshot - replaced wholesale, never mutated in place
+        self._dataset = None
+        self._validated_at = None
         self.cache_duration = timedelta(hours=24)  # Cache for 24 hours
         
+        # Single-flight loading: one loader at a time, waiters reuse its result
+        self._load_lock = threading.Lock()
+        self._load_generation = 0
+        self._refresh_thread = None
+        self._refresh_thread_lock = threading.Lock()
+        
+        # Downloaded TSV with its HTTP validators, and its typed columnar copy
+        self.blobs = BlobCache()
+        self.snapshots = AnnotationSnapshotStore()
+        
+        # Neurons embedded per circuit; the rest are reachable via its cursor
+        self.circuit_page_size = 100
+        
+        # Connectome graph for connectivity-defined circuits, loaded on first use
+        self.graphs = ConnectomeGraphStore()
+        self._connectome = None
+        self._connectome_checked = False
+        self._connectome_lock = threading.Lock()
+        
+        # Packed multi-resolution skeletons, memory-mapped on first use
+        self.skeleton_stores = SkeletonStore()
+        self._skeletons = None
+        self._skeletons_checked = False
+        self._skeletons_lock = threading.Lock()
+        
+        # Memory-mapped NBLAST scores for morphological similarity
+        self.nblast_stores = NblastStore()
+        self._nblast = None
+        self._nblast_checked = False
+        self._nblast_lock = threading.Lock()
+        
         logger.info("🌐 FlyWire Cloud Data Service initialized")
         logger.info("✅ No SSL issues - using pre-downloaded data from cloud!")
     
+    def after_fork(self):
+        """Give a forked worker its own HTTP connections; the loaded snapshot stays shared"""
+        self.blobs.session = requests.Session()
+        self._refresh_thread = None
+    
+    @property
+    def data_loaded(self) -> bool:
+        return self._dataset is not None
+    
+    @property
+    def neuron_data(self):
+        dataset = self._dataset
+        return dataset.neuron_data if dataset else None
+    
+    @property
+    def mechanosensory_circuit(self):
+        dataset = self._dataset
+        return dataset.mechanosensory_circuit if dataset else None
+    
+    @property
+    def cache_timestamp(self):
+        """When the current data was last confirmed against the upstream file"""
+        return self._validated_at if self.data_loaded else None
+    
     def _should_refresh_cache(self) -> bool:
         """Check if we should refresh the cached data"""
         if not self.data_loaded or self.cache_timestamp is None:
@@ -56,114 +123,180 @@ class FlyWireCloudDataService:
         
         return datetime.now() - self.cache_timestamp > self.cache_duration
     
+    def get_dataset(self) -> FlyWireDataset:
+        """Return the current snapshot, loading it on first use
+        
+        Callers should read everything they need from the returned snapshot
+        so a concurrent refresh cannot mix data from two versions.
+        """
+        self.load_cloud_data()
+        return self._dataset
+    
     def load_cloud_data(self, force_refresh=False):
-        """Load FlyWire data from cloud storage"""
-        if self.data_loaded and not force_refresh and not self._should_refresh_cache():
-            logger.info("📊 Using cached FlyWire data")
+        """Load FlyWire data from cloud storage
+        
+        Without a dataset (or when forced) the caller waits for a single shared
+        load. A stale dataset keeps being served while a background thread
+        builds its replacement.
+        """
+        if self.data_loaded and not force_refresh:
+            if self._should_refresh_cache():
+                self._start_background_refresh()
+            else:
+                logger.info("📊 Using cached FlyWire data")
             return
         
+        generation = self._load_generation
+        with self._load_lock:
+            if self._load_generation != generation and self.data_loaded:
+                # Another request finished a load while we were waiting
+                logger.info("📊 Reusing FlyWire data loaded by a concurrent request")
+                return
+            self._refresh()
+    
+    def _start_background_refresh(self):
+        """Rebuild the dataset in a background thread unless one is already running"""
+        with self._refresh_thread_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._background_refresh, name='flywire-refresh', daemon=True
+            )
+            self._refresh_thread.start()
+    
+    def _background_refresh(self):
+        try:
+            with self._load_lock:
+                if self._should_refresh_cache():
+                    logger.info("🔄 Cache expired - refreshing FlyWire data in the background")
+                    self._refresh()
+        except Exception as e:
+            logger.error(f"❌ Background refresh failed, keeping stale data: {e}")
+    
+    def _refresh(self):
+        """Download and build a new snapshot, then publish it atomically (hold _load_lock)"""
         try:
             logger.info("☁️ Loading FlyWire data from cloud...")
             
-            # Load neuron annotations from GitHub (the official source)
+            # Load neuron annotations from GitHub (the official source),
+            # revalidating the local copy instead of downloading it again
             logger.info("📥 Downloading neuron annotations from GitHub...")
-            response = requests.get(self.data_urls['neuron_annotations'], timeout=30)
-            response.raise_for_status()
+            blob = self.blobs.fetch(self.data_urls['neuron_annotations'], timeout=30)
+            
+            current = self._dataset
+            if current is not None and current.version == blob.sha256:
+                # Unchanged upstream: keep serving the snapshot we already built
+                self._validated_at = datetime.now()
+                logger.info("📊 FlyWire data unchanged upstream - cache renewed without re-parsing")
+                return
             
-            # Parse TSV data
-            tsv_data = io.StringIO(response.text)
-            self.neuron_data = pd.read_csv(tsv_data, sep='\t', low_memory=False)
+            # Parse TSV data, or reuse the columnar snapshot of this exact file
+            dataset = FlyWireDataset.load(
+                self.snapshots,
+                blob.sha256,
+                lambda: pd.read_csv(blob.path, sep='\t', low_memory=False),
+                source='flywire_cloud_data'
+            )
             
-            logger.info(f"✅ Loaded {len(self.neuron_data):,} neurons from cloud")
+            logger.info(f"✅ Loaded {len(dataset):,} neurons from cloud")
             
             # Pre-process mechanosensory circuit
-            self._create_mechanosensory_circuit()
+            dataset.mechanosensory_circuit = self._create_mechanosensory_circuit(dataset)
             
-            self.data_loaded = True
-            self.cache_timestamp = datetime.now()
+            # Publish: readers see either the old snapshot or the complete new one
+            self._dataset = dataset
+            self._validated_at = datetime.now()
+            self._load_generation += 1
             
             logger.info("🎯 Cloud data loaded successfully - no API calls to cave.flywire.ai needed!")
             
         except Exception as e:
             logger.error(f"❌ Failed to load cloud data: {e}")
-            # Fallback to minimal functionality
-            if self.neuron_data is None:
-                logger.warning("Using empty dataset for basic functionality")
-                self.neuron_data = pd.DataFrame()
             raise
     
-    def _create_mechanosensory_circuit(self):
-        """Pre-process mechanosensory neurons into circuit format"""
-        if self.neuron_data is None or len(self.neuron_data) == 0:
-            return
+    def _create_mechanosensory_circuit(self, dataset: FlyWireDataset) -> Optional[Dict[str, Any]]:
+        """Pre-process mechanosensory neurons into circuit format
+        
+        The circuit embeds the first page of neurons; its next_cursor pages
+        through the rest of the population on /api/neurons/mechanosensory.
+        """
+        if len(dataset) == 0:
+            return None
         
         try:
             # Get mechanosensory neurons
-            mech_mask = self.neuron_data['cell_class'] == 'mechanosensory'
-            mech_neurons_df = self.neuron_data[mech_mask]
+            mech_mask = dataset.neuron_data['cell_class'] == 'mechanosensory'
+            dataset.mechanosensory_rows = np.flatnonzero(mech_mask.to_numpy())
+            
+            # Convert the first page to API format
+            rows, next_cursor = paginate(
+                dataset.mechanosensory_rows, self.circuit_page_size, None,
+                query='mechanosensory', version=dataset.version
+            )
+            neurons = build_neuron_records(
+                dataset.neuron_data.iloc[rows],
+                source='flywire_cloud_data',
+                default_type='mechanosensory'
+            )
             
-            # Convert to API format
-            neurons = []
-            for _, row in mech_neurons_df.head(100).iterrows():  # Limit for performance
-                try:
-                    neuron = {
-                        'id': str(row['root_id']),
-                        'type': str(row['cell_type']) if pd.notna(row['cell_type']) else 'mechanosensory',
-                        'position': [
-                            float(row['pos_x']) if pd.notna(row['pos_x']) else 0.0,
-                            float(row['pos_y']) if pd.notna(row['pos_y']) else 0.0,
-                            float(row['pos_z']) if pd.notna(row['pos_z']) else 0.0
-                        ],
-                        'soma_position': [
-                            float(row['soma_x']) if pd.notna(row['soma_x']) else 0.0,
-                            float(row['soma_y']) if pd.notna(row['soma_y']) else 0.0,
-                            float(row['soma_z']) if pd.notna(row['soma_z']) else 0.0
-                        ],
-                        'activity': 0.0,
-                        'mesh_id': row['root_id'],
-                        'confidence': 1.0,
-                        'source': 'flywire_cloud_data',
-                        'super_class': str(row['super_class']) if pd.notna(row['super_class']) else 'unknown',
-                        'cell_class': str(row['cell_class']) if pd.notna(row['cell_class']) else 'unknown',
-                        'side': str(row['side']) if pd.notna(row['side']) else 'unknown'
-                    }
-                    neurons.append(neuron)
-                except Exception as neuron_error:
-                    logger.warning(f"Skipping neuron due to error: {neuron_error}")
-                    continue
+            total = len(dataset.mechanosensory_rows)
+            logger.info(f"✅ Pre-processed {len(neurons)} mechanosensory neurons from {total} total")
             
-            self.mechanosensory_circuit = {
+            return {
                 'name': 'Mechanosensory Circuit',
                 'neurons': neurons,
                 'type': 'mechanosensory',
                 'color': '#FF4081',
                 'source': 'flywire_cloud_data',
-                'total_available': len(mech_neurons_df),
-                'loaded_count': len(neurons)
+                'total_available': total,
+                'loaded_count': len(neurons),
+                'next_cursor': next_cursor
             }
             
-            logger.info(f"✅ Pre-processed {len(neurons)} mechanosensory neurons from {len(mech_neurons_df)} total")
-            
         except Exception as e:
             logger.error(f"Failed to create mechanosensory circuit: {e}")
-            self.mechanosensory_circuit = None
+            return None
+    
+    def _serialize_neurons(self, neurons: pd.DataFrame, default_type='unknown', fields=NEURON_FIELDS,
+                           columnar=False):
+        """API neurons: a list of dicts, or struct-of-arrays columns for binary responses"""
+        build = build_neuron_columns if columnar else build_neuron_records
+        return build(neurons, source='flywire_cloud_data', default_type=default_type, fields=fields)
     
-    def get_circuits(self) -> List[Dict[str, Any]]:
+    def _neuron_page(self, dataset: FlyWireDataset, rows: np.ndarray, limit: int, cursor: Optional[str],
+                     query: str, fields=NEURON_FIELDS, default_type='unknown', columnar=False) -> Dict[str, Any]:
+        """One page of neurons out of a result row array"""
+        page_rows, next_cursor = paginate(rows, limit, cursor, query=query, version=dataset.version)
+        neurons = self._serialize_neurons(
+            dataset.neuron_data.iloc[page_rows], default_type=default_type, fields=fields, columnar=columnar
+        )
+        return {
+            'neurons': neurons,
+            'total_found': len(page_rows),
+            'next_cursor': next_cursor,
+            'total_available': len(rows)
+        }
+    
+    def get_circuits(self, columnar=False) -> List[Dict[str, Any]]:
         """Get available circuits from cloud data"""
-        # Ensure data is loaded
-        if not self.data_loaded:
-            self.load_cloud_data()
+        dataset = self.get_dataset()
         
         circuits = []
         
         # Add mechanosensory circuit
-        if self.mechanosensory_circuit:
-            circuits.append(self.mechanosensory_circuit)
+        circuit = dataset.mechanosensory_circuit
+        if circuit and columnar:
+            rows = dataset.mechanosensory_rows[:circuit['loaded_count']]
+            circuit = dict(circuit, neurons=self._serialize_neurons(
+                dataset.neuron_data.iloc[rows], default_type='mechanosensory', columnar=True
+            ))
+        if circuit:
+            circuits.append(circuit)
         
         # Add auditory circuit
-        if self.neuron_data is not None and len(self.neuron_data) > 0:
-            auditory_neurons = self.get_auditory_neurons(limit=50)
-            if auditory_neurons:
+        if len(dataset) > 0:
+            auditory_neurons = self._auditory_neurons(dataset, limit=50, columnar=columnar)
+            if len(auditory_neurons) > 0:
                 circuits.append({
                     'name': 'Auditory Circuit (Johnston\'s Organ)',
                     'neurons': auditory_neurons,
@@ -174,131 +307,304 @@ class FlyWireCloudDataService:
         
         return circuits
     
-    def get_mechanosensory_neurons(self, limit=50) -> List[Dict[str, Any]]:
-        """Get mechanosensory neurons from cloud data"""
-        if not self.data_loaded:
-            self.load_cloud_data()
+    def get_mechanosensory_neurons(self, limit=50, cursor=None, fields=NEURON_FIELDS,
+                                   columnar=False) -> Dict[str, Any]:
+        """Get a page of mechanosensory neurons from cloud data"""
+        dataset = self.get_dataset()
         
-        if self.mechanosensory_circuit:
-            return self.mechanosensory_circuit['neurons'][:limit]
-        return []
+        return self._neuron_page(
+            dataset, dataset.mechanosensory_rows, limit, cursor,
+            query='mechanosensory', fields=fields, default_type='mechanosensory', columnar=columnar
+        )
     
     def get_auditory_neurons(self, limit=50) -> List[Dict[str, Any]]:
         """Get auditory neurons (JO types) from cloud data"""
-        if not self.data_loaded:
-            self.load_cloud_data()
-        
-        if self.neuron_data is None or len(self.neuron_data) == 0:
+        return self._auditory_neurons(self.get_dataset(), limit=limit)
+    
+    def _auditory_neurons(self, dataset: FlyWireDataset, limit=50, columnar=False):
+        if len(dataset) == 0:
             return []
         
         try:
             # Get JO (Johnston's Organ) neurons
-            jo_mask = self.neuron_data['cell_type'].str.contains('JO-', na=False)
-            jo_neurons = self.neuron_data[jo_mask]
+            jo_rows = dataset.cell_type_index.contains('JO-')[:limit]
+            jo_neurons = dataset.neuron_data.iloc[jo_rows]
             
-            neurons = []
-            for _, row in jo_neurons.head(limit).iterrows():
-                try:
-                    neuron = {
-                        'id': str(row['root_id']),
-                        'type': str(row['cell_type']) if pd.notna(row['cell_type']) else 'auditory',
-                        'position': [
-                            float(row['pos_x']) if pd.notna(row['pos_x']) else 0.0,
-                            float(row['pos_y']) if pd.notna(row['pos_y']) else 0.0,
-                            float(row['pos_z']) if pd.notna(row['pos_z']) else 0.0
-                        ],
-                        'soma_position': [
-                            float(row['soma_x']) if pd.notna(row['soma_x']) else 0.0,
-                            float(row['soma_y']) if pd.notna(row['soma_y']) else 0.0,
-                            float(row['soma_z']) if pd.notna(row['soma_z']) else 0.0
-                        ],
-                        'activity': 0.0,
-                        'mesh_id': row['root_id'],
-                        'confidence': 1.0,
-                        'source': 'flywire_cloud_data',
-                        'super_class': str(row['super_class']) if pd.notna(row['super_class']) else 'unknown',
-                        'cell_class': str(row['cell_class']) if pd.notna(row['cell_class']) else 'unknown',
-                        'side': str(row['side']) if pd.notna(row['side']) else 'unknown'
-                    }
-                    neurons.append(neuron)
-                except Exception as neuron_error:
-                    logger.warning(f"Skipping auditory neuron due to error: {neuron_error}")
-                    continue
+            neurons = self._serialize_neurons(jo_neurons, default_type='auditory', columnar=columnar)
             
-            logger.info(f"Found {len(neurons)} auditory neurons")
+            logger.info(f"Found {len(jo_rows)} auditory neurons")
             return neurons
             
         except Exception as e:
             logger.error(f"Failed to get auditory neurons: {e}")
             return []
     
-    def search_neurons_by_type(self, cell_type: str, limit=20) -> List[Dict[str, Any]]:
-        """Search neurons by cell type from cloud data"""
-        if not self.data_loaded:
-            self.load_cloud_data()
+    def search_neurons_by_type(self, cell_type: str, limit=20, match='contains', cursor=None,
+                               fields=NEURON_FIELDS, columnar=False) -> Dict[str, Any]:
+        """Search neurons by cell type from cloud data, one page at a time"""
+        dataset = self.get_dataset()
         
-        if self.neuron_data is None or len(self.neuron_data) == 0:
-            return []
+        if len(dataset) == 0:
+            return {'neurons': [], 'total_found': 0, 'next_cursor': None, 'total_available': 0}
         
-        try:
-            mask = self.neuron_data['cell_type'].str.contains(cell_type, case=False, na=False)
-            matching_neurons = self.neuron_data[mask]
-            
-            neurons = []
-            for _, row in matching_neurons.head(limit).iterrows():
-                try:
-                    neuron = {
-                        'id': str(row['root_id']),
-                        'type': str(row['cell_type']) if pd.notna(row['cell_type']) else cell_type,
-                        'position': [
-                            float(row['pos_x']) if pd.notna(row['pos_x']) else 0.0,
-                            float(row['pos_y']) if pd.notna(row['pos_y']) else 0.0,
-                            float(row['pos_z']) if pd.notna(row['pos_z']) else 0.0
-                        ],
-                        'soma_position': [
-                            float(row['soma_x']) if pd.notna(row['soma_x']) else 0.0,
-                            float(row['soma_y']) if pd.notna(row['soma_y']) else 0.0,
-                            float(row['soma_z']) if pd.notna(row['soma_z']) else 0.0
-                        ],
-                        'activity': 0.0,
-                        'mesh_id': row['root_id'],
-                        'confidence': 1.0,
-                        'source': 'flywire_cloud_data',
-                        'super_class': str(row['super_class']) if pd.notna(row['super_class']) else 'unknown',
-                        'cell_class': str(row['cell_class']) if pd.notna(row['cell_class']) else 'unknown'
-                    }
-                    neurons.append(neuron)
-                except Exception as neuron_error:
-                    logger.warning(f"Skipping neuron due to error: {neuron_error}")
-                    continue
-            
+        if match == 'prefix':
+            rows = dataset.cell_type_index.startswith(cell_type)
+        else:
+            rows = dataset.cell_type_index.contains(cell_type, case=False)
+        
+        return self._neuron_page(
+            dataset, rows, limit, cursor,
+            query=f"search:{match}:{cell_type}", fields=fields, default_type=cell_type, columnar=columnar
+        )
+
+    def get_nearest_neurons(self, point: List[float], k=10, space='soma',
+                            max_distance=float('inf'), fields=NEURON_FIELDS, columnar=False):
+        """Get the k neurons closest to a point, closest first"""
+        dataset = self.get_dataset()
+        
+        rows, distances = dataset.spatial_index.nearest(point, k=k, space=space, max_distance=max_distance)
+        neurons = self._serialize_neurons(dataset.neuron_data.iloc[rows], fields=fields, columnar=columnar)
+        if columnar:
+            neurons['distance'] = distances.astype(np.float32)
             return neurons
-            
-        except Exception as e:
-            logger.error(f"Failed to search neurons: {e}")
-            return []
+        
+        for neuron, distance in zip(neurons, distances.tolist()):
+            neuron['distance'] = distance
+        
+        return neurons
+    
+    def get_neurons_in_region(self, lower: List[float], upper: List[float], space='soma',
+                              limit=500, cursor=None, fields=NEURON_FIELDS, columnar=False) -> Dict[str, Any]:
+        """Get a page of neurons inside an axis-aligned bounding box"""
+        dataset = self.get_dataset()
+        
+        rows = dataset.spatial_index.within_box(lower, upper, space=space)
+        return self._neuron_page(
+            dataset, rows, limit, cursor,
+            query=f"region:{space}:{lower}:{upper}", fields=fields, columnar=columnar
+        )
+    
+    def get_connectome(self) -> Optional[ConnectomeQueries]:
+        """Connectivity queries, loaded on first use; None when no graph is available
+        
+        With FLYWIRE_CONNECTIONS_URL set the edge list is fetched (revalidated
+        through the blob cache) and built into a graph; otherwise the latest
+        graph under FLYWIRE_GRAPH_DIR is memory-mapped.
+        """
+        with self._connectome_lock:
+            if not self._connectome_checked:
+                connections_url = os.environ.get('FLYWIRE_CONNECTIONS_URL')
+                if connections_url:
+                    blob = self.blobs.fetch(connections_url, timeout=600)
+                    graph = self.graphs.load_or_build(blob.sha256, blob.path)
+                else:
+                    graph = self.graphs.latest()
+                self._connectome = ConnectomeQueries(graph) if graph is not None else None
+                self._connectome_checked = True
+                if graph is None:
+                    logger.info("🕸️ No connectome graph available - connectivity endpoints disabled")
+        return self._connectome
+    
+    def connectome_version(self) -> Optional[str]:
+        """Cache version of connectivity responses: annotation snapshot plus graph"""
+        connectome = self.get_connectome()
+        if connectome is None:
+            return None
+        return f"{self.get_dataset().version}:{connectome.graph.version}"
+    
+    def _require_connectome(self) -> ConnectomeQueries:
+        connectome = self.get_connectome()
+        if connectome is None:
+            raise LookupError("Connectivity graph not available - build it with download_flywire_data.py "
+                              "or set FLYWIRE_CONNECTIONS_URL")
+        return connectome
+    
+    def _connectome_neurons(self, dataset: FlyWireDataset, root_ids: np.ndarray, fields=NEURON_FIELDS,
+                            columnar=False):
+        """Neuron payload for the annotated subset of root_ids, plus its positions in root_ids"""
+        rows = dataset.rows_for_root_ids(root_ids)
+        annotated = np.flatnonzero(rows >= 0)
+        neurons = self._serialize_neurons(dataset.neuron_data.iloc[rows[annotated]], fields=fields,
+                                          columnar=columnar)
+        return neurons, annotated
+    
+    def _id_payload(self, root_ids: np.ndarray, columnar: bool):
+        return root_ids.astype(np.uint64) if columnar else root_ids.astype(str).tolist()
+    
+    def expand_circuit(self, seeds, hops=1, direction='downstream', min_weight=1, max_nodes=5000,
+                       fields=NEURON_FIELDS, columnar=False) -> Dict[str, Any]:
+        """k-hop connectivity neighbourhood of seed neurons as a circuit"""
+        connectome = self._require_connectome()
+        dataset = self.get_dataset()
+        
+        if seeds == 'mechanosensory':
+            seed_ids = root_id_array(dataset.neuron_data.iloc[dataset.mechanosensory_rows])
+        else:
+            seed_ids = np.asarray(seeds, dtype=np.int64)
+        
+        result = connectome.expand(seed_ids, hops=hops, direction=direction,
+                                   min_weight=min_weight, max_nodes=max_nodes)
+        neurons, annotated = self._connectome_neurons(dataset, result['root_ids'], fields, columnar)
+        hop = result['hops'][annotated]
+        if columnar:
+            neurons['hop'] = hop
+        else:
+            for neuron, neuron_hop in zip(neurons, hop.tolist()):
+                neuron['hop'] = neuron_hop
+        
+        edges = result['edges']
+        return {
+            'name': f"{direction.capitalize()} {hops}-hop circuit",
+            'type': 'connectivity',
+            'neurons': neurons,
+            'edges': {
+                'pre': self._id_payload(edges['pre'], columnar),
+                'post': self._id_payload(edges['post'], columnar),
+                'weight': edges['weight'] if columnar else edges['weight'].tolist()
+            },
+            'total_nodes': len(result['root_ids']),
+            'total_edges': len(edges['weight']),
+            'truncated': result['truncated'],
+            'source': 'flywire_cloud_data'
+        }
+    
+    def get_strongest_path(self, source: int, target: int, min_weight=1, fields=NEURON_FIELDS,
+                           columnar=False) -> Optional[Dict[str, Any]]:
+        """Strongest synaptic path between two neurons, None if target is unreachable"""
+        connectome = self._require_connectome()
+        dataset = self.get_dataset()
+        
+        path = connectome.strongest_path(source, target, min_weight=min_weight)
+        if path is None:
+            return None
+        
+        neurons, _ = self._connectome_neurons(dataset, path['root_ids'], fields, columnar)
+        return {
+            'path': self._id_payload(path['root_ids'], columnar),
+            'weights': path['weights'] if columnar else path['weights'].tolist(),
+            'cost': path['cost'],
+            'neurons': neurons
+        }
+    
+    def get_skeletons(self) -> Optional[PackedSkeletons]:
+        """Latest skeleton store under FLYWIRE_SKELETON_DIR, None if none was built"""
+        with self._skeletons_lock:
+            if not self._skeletons_checked:
+                self._skeletons = self.skeleton_stores.latest()
+                self._skeletons_checked = True
+                if self._skeletons is None:
+                    logger.info("🦴 No skeleton store available - skeleton endpoint disabled")
+        return self._skeletons
+    
+    def skeleton_version(self) -> Optional[str]:
+        skeletons = self.get_skeletons()
+        return skeletons.version if skeletons is not None else None
+    
+    def get_skeleton(self, root_id: int, lod=0, columnar=False) -> Optional[Dict[str, Any]]:
+        """One neuron's skeleton at a level of detail, None if the store has no such neuron"""
+        skeletons = self.get_skeletons()
+        if skeletons is None:
+            raise LookupError("Skeleton store not available - build it with download_flywire_data.py "
+                              "and point FLYWIRE_SKELETON_DIR at it")
+        
+        skeleton = skeletons.skeleton(root_id, lod=lod)
+        if skeleton is None:
+            return None
+        if not columnar:
+            for key in ('vertices', 'radius', 'parents'):
+                skeleton[key] = skeleton[key].tolist()
+        return {
+            'root_id': str(root_id),
+            **skeleton,
+            'node_count': len(skeleton['parents']),
+            'lod_spacings': list(skeletons.lod_spacings)
+        }
+    
+    def get_nblast(self) -> Optional[NblastMatrix]:
+        """Latest NBLAST matrix under FLYWIRE_NBLAST_DIR, None if none was converted"""
+        with self._nblast_lock:
+            if not self._nblast_checked:
+                self._nblast = self.nblast_stores.latest()
+                self._nblast_checked = True
+                if self._nblast is None:
+                    logger.info("🧬 No NBLAST matrix available - similarity endpoint disabled")
+        return self._nblast
+    
+    def nblast_version(self) -> Optional[str]:
+        """Cache version of similarity responses: annotation snapshot plus NBLAST matrix"""
+        nblast = self.get_nblast()
+        if nblast is None:
+            return None
+        return f"{self.get_dataset().version}:{nblast.version}"
+    
+    def get_similar_neurons(self, root_id: int, k=20, min_score=None, fields=NEURON_FIELDS,
+                            columnar=False) -> Optional[Dict[str, Any]]:
+        """Neurons most similar in morphology (NBLAST) to root_id, None if it has no scores"""
+        nblast = self.get_nblast()
+        if nblast is None:
+            raise LookupError("NBLAST matrix not available - convert it with download_flywire_data.py "
+                              "and point FLYWIRE_NBLAST_DIR at it")
+        dataset = self.get_dataset()
+        
+        similar = nblast.similar(root_id, k=k, min_score=min_score)
+        if similar is None:
+            return None
+        
+        neurons, annotated = self._connectome_neurons(dataset, similar['root_ids'], fields, columnar)
+        scores = similar['scores'][annotated]
+        if columnar:
+            neurons['score'] = scores
+        else:
+            for neuron, score in zip(neurons, scores.tolist()):
+                neuron['score'] = score
+        return {
+            'root_id': str(root_id),
+            'similar': self._id_payload(similar['root_ids'], columnar),
+            'scores': similar['scores'] if columnar else similar['scores'].tolist(),
+            'neurons': neurons
+        }
 
 # Initialize service
 flywire_service = FlyWireCloudDataService()
 
+# ETags and serialized bodies keyed by dataset version and request parameters
+response_cache = ResponseCache(version=lambda: flywire_service.get_dataset().version)
+response_cache.init_app(app)
+connectome_response_cache = ResponseCache(version=flywire_service.connectome_version)
+skeleton_response_cache = ResponseCache(version=flywire_service.skeleton_version)
+nblast_response_cache = ResponseCache(version=flywire_service.nblast_version)
+
+def _root_id_arg(name) -> int:
+    """Read a required root_id query parameter, ValueError if missing or not an integer"""
+    value = request.args.get(name, type=int)
+    if value is None:
+        raise ValueError(f"Missing or invalid root_id parameter: {name}")
+    return value
+
+def _coordinate_args(*names) -> List[float]:
+    """Read required float query parameters, ValueError if any is missing"""
+    values = [request.args.get(name, type=float) for name in names]
+    missing = [name for name, value in zip(names, values) if value is None]
+    if missing:
+        raise ValueError(f"Missing or invalid coordinate parameters: {', '.join(missing)}")
+    return values
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
         # Lazy load data on health check
-        if not flywire_service.data_loaded:
-            flywire_service.load_cloud_data()
-        
-        neuron_count = len(flywire_service.neuron_data) if flywire_service.neuron_data is not None else 0
+        dataset = flywire_service.get_dataset()
         
         return jsonify({
             'status': 'healthy',
             'service': 'flywire_cloud_backend',
             'data_source': 'cloud_storage',
             'ssl_issues': 'resolved_via_cloud_data',
-            'neurons_available': neuron_count,
-            'cache_status': 'loaded' if flywire_service.data_loaded else 'not_loaded',
-            'cache_age_minutes': int((datetime.now() - flywire_service.cache_timestamp).total_seconds() / 60) if flywire_service.cache_timestamp else 0
+            'neurons_available': len(dataset),
+            'cache_status': 'loaded',
+            'cache_age_minutes': dataset.age_minutes(),
+            'dataset_version': dataset.version[:16]
         })
         
     except Exception as e:
@@ -310,19 +616,27 @@ def health_check():
         }), 500
 
 @app.route('/api/circuits/search', methods=['GET'])
+@response_cache.cached
 def search_circuits():
     """Search for neural circuits - using cloud data"""
     try:
-        circuits = flywire_service.get_circuits()
+        fmt = response_format(request)
+        circuits = flywire_service.get_circuits(columnar=fmt != 'json')
         
-        return jsonify({
+        return encoded_response({
             'success': True,
             'circuits': circuits,
             'total_circuits': len(circuits),
             'data_source': 'flywire_cloud_data',
             'message': 'Circuits loaded from cloud FlyWire data - no SSL API calls needed!'
-        })
+        }, fmt)
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'circuits': []
+        }), 400
     except Exception as e:
         logger.error(f"Circuit search failed: {e}")
         return jsonify({
@@ -333,19 +647,33 @@ def search_circuits():
         }), 500
 
 @app.route('/api/neurons/mechanosensory', methods=['GET'])
+@response_cache.cached
 def get_mechanosensory():
     """Get mechanosensory neurons from cloud data"""
     try:
         limit = request.args.get('limit', 50, type=int)
-        neurons = flywire_service.get_mechanosensory_neurons(limit=limit)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
+        page = flywire_service.get_mechanosensory_neurons(
+            limit=limit, cursor=cursor, fields=fields, columnar=fmt != 'json'
+        )
         
-        return jsonify({
+        return encoded_response({
             'success': True,
-            'neurons': neurons,
-            'total_found': len(neurons),
+            'neurons': page['neurons'],
+            'total_found': page['total_found'],
+            'total_available': page['total_available'],
+            'next_cursor': page['next_cursor'],
             'data_source': 'flywire_cloud_data'
-        })
+        }, fmt)
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'neurons': []
+        }), 400
     except Exception as e:
         logger.error(f"Mechanosensory query failed: {e}")
         return jsonify({
@@ -355,22 +683,38 @@ def get_mechanosensory():
         }), 500
 
 @app.route('/api/neurons/search', methods=['GET'])
+@response_cache.cached
 def search_neurons():
     """Search neurons by type from cloud data"""
     try:
         cell_type = request.args.get('type', 'mechanosensory')
         limit = request.args.get('limit', 20, type=int)
+        match = request.args.get('match', 'contains')
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
         
-        neurons = flywire_service.search_neurons_by_type(cell_type, limit=limit)
+        page = flywire_service.search_neurons_by_type(
+            cell_type, limit=limit, match=match, cursor=cursor, fields=fields, columnar=fmt != 'json'
+        )
         
-        return jsonify({
+        return encoded_response({
             'success': True,
-            'neurons': neurons,
+            'neurons': page['neurons'],
             'search_type': cell_type,
-            'total_found': len(neurons),
+            'match': match,
+            'total_found': page['total_found'],
+            'total_available': page['total_available'],
+            'next_cursor': page['next_cursor'],
             'data_source': 'flywire_cloud_data'
-        })
+        }, fmt)
         
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'neurons': []
+        }), 400
     except Exception as e:
         logger.error(f"Neuron search failed: {e}")
         return jsonify({
@@ -379,34 +723,295 @@ def search_neurons():
             'neurons': []
         }), 500
 
+@app.route('/api/neurons/nearest', methods=['GET'])
+@response_cache.cached
+def get_nearest_neurons():
+    """Get the neurons nearest to a point (soma or pos coordinates)"""
+    try:
+        point = _coordinate_args('x', 'y', 'z')
+        k = request.args.get('k', 10, type=int)
+        space = request.args.get('space', 'soma')
+        max_distance = request.args.get('max_distance', float('inf'), type=float)
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
+        
+        neurons = flywire_service.get_nearest_neurons(
+            point, k=k, space=space, max_distance=max_distance, fields=fields, columnar=fmt != 'json'
+        )
+        
+        return encoded_response({
+            'success': True,
+            'neurons': neurons,
+            'point': point,
+            'space': space,
+            'total_found': neurons['count'] if fmt != 'json' else len(neurons),
+            'data_source': 'flywire_cloud_data'
+        }, fmt)
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'neurons': []
+        }), 400
+    except Exception as e:
+        logger.error(f"Nearest neuron query failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'neurons': []
+        }), 500
+
+@app.route('/api/neurons/region', methods=['GET'])
+@response_cache.cached
+def get_region_neurons():
+    """Get the neurons inside a bounding box (soma or pos coordinates)"""
+    try:
+        lower = _coordinate_args('min_x', 'min_y', 'min_z')
+        upper = _coordinate_args('max_x', 'max_y', 'max_z')
+        space = request.args.get('space', 'soma')
+        limit = request.args.get('limit', 500, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
+        
+        page = flywire_service.get_neurons_in_region(
+            lower, upper, space=space, limit=limit, cursor=cursor, fields=fields, columnar=fmt != 'json'
+        )
+        
+        return encoded_response({
+            'success': True,
+            'neurons': page['neurons'],
+            'region': {'min': lower, 'max': upper},
+            'space': space,
+            'total_found': page['total_found'],
+            'total_available': page['total_available'],
+            'next_cursor': page['next_cursor'],
+            'data_source': 'flywire_cloud_data'
+        }, fmt)
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'neurons': []
+        }), 400
+    except Exception as e:
+        logger.error(f"Region neuron query failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'neurons': []
+        }), 500
+
+@app.route('/api/circuits/expand', methods=['GET'])
+@connectome_response_cache.cached
+def expand_circuit():
+    """k-hop upstream/downstream connectivity circuit around seed neurons"""
+    try:
+        seeds = request.args.get('seeds', 'mechanosensory')
+        if seeds != 'mechanosensory':
+            try:
+                seeds = [int(seed) for seed in seeds.split(',') if seed.strip()]
+            except ValueError:
+                raise ValueError("seeds must be comma separated root_ids or 'mechanosensory'")
+        hops = request.args.get('hops', 1, type=int)
+        direction = request.args.get('direction', 'downstream')
+        min_weight = request.args.get('min_weight', 5, type=int)
+        max_nodes = request.args.get('max_nodes', 5000, type=int)
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
+        
+        circuit = flywire_service.expand_circuit(
+            seeds, hops=hops, direction=direction, min_weight=min_weight, max_nodes=max_nodes,
+            fields=fields, columnar=fmt != 'json'
+        )
+        
+        return encoded_response({
+            'success': True,
+            'circuit': circuit,
+            'hops': hops,
+            'direction': direction,
+            'min_weight': min_weight,
+            'data_source': 'flywire_cloud_data'
+        }, fmt)
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except LookupError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        logger.error(f"Circuit expansion failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/circuits/path', methods=['GET'])
+@connectome_response_cache.cached
+def strongest_path():
+    """Strongest synaptic path (minimum sum of 1/synapse count) between two neurons"""
+    try:
+        source = _root_id_arg('source')
+        target = _root_id_arg('target')
+        min_weight = request.args.get('min_weight', 1, type=int)
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
+        
+        path = flywire_service.get_strongest_path(
+            source, target, min_weight=min_weight, fields=fields, columnar=fmt != 'json'
+        )
+        if path is None:
+            return jsonify({
+                'success': False,
+                'error': f"No path from {source} to {target} with at least {min_weight} synapses per edge"
+            }), 404
+        
+        return encoded_response({
+            'success': True,
+            **path,
+            'min_weight': min_weight,
+            'data_source': 'flywire_cloud_data'
+        }, fmt)
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except LookupError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        logger.error(f"Path query failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/neurons/<int:root_id>/skeleton', methods=['GET'])
+@skeleton_response_cache.cached
+def get_neuron_skeleton(root_id):
+    """Skeleton of one neuron; lod=0 is full detail, higher levels are coarser"""
+    try:
+        lod = request.args.get('lod', 0, type=int)
+        fmt = response_format(request)
+        
+        skeleton = flywire_service.get_skeleton(root_id, lod=lod, columnar=fmt != 'json')
+        if skeleton is None:
+            return jsonify({
+                'success': False,
+                'error': f"No skeleton for neuron {root_id}"
+            }), 404
+        
+        return encoded_response({
+            'success': True,
+            'skeleton': skeleton,
+            'data_source': 'flywire_skeletons'
+        }, fmt)
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except LookupError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        logger.error(f"Skeleton query failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/neurons/<int:root_id>/similar', methods=['GET'])
+@nblast_response_cache.cached
+def get_similar_neurons(root_id):
+    """Top-k morphologically similar neurons by NBLAST score"""
+    try:
+        k = request.args.get('k', 20, type=int)
+        min_score = request.args.get('min_score', type=float)
+        fields = parse_fields(request.args.get('fields'))
+        fmt = response_format(request)
+        
+        similar = flywire_service.get_similar_neurons(
+            root_id, k=k, min_score=min_score, fields=fields, columnar=fmt != 'json'
+        )
+        if similar is None:
+            return jsonify({
+                'success': False,
+                'error': f"No NBLAST scores for neuron {root_id}"
+            }), 404
+        
+        return encoded_response({
+            'success': True,
+            **similar,
+            'k': k,
+            'data_source': 'flywire_nblast'
+        }, fmt)
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except LookupError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        logger.error(f"Similarity query failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get dataset statistics from cloud data"""
     try:
         stats = {}
+        group_by = parse_group_by(request.args.get('group_by', ''))
+        top_k = request.args.get('top_k', DEFAULT_TOP_K, type=int)
+        
+        dataset = flywire_service.get_dataset()
         
-        if not flywire_service.data_loaded:
-            flywire_service.load_cloud_data()
-        
-        if flywire_service.neuron_data is not None and len(flywire_service.neuron_data) > 0:
-            df = flywire_service.neuron_data
-            stats = {
-                'total_neurons': len(df),
-                'mechanosensory_neurons': len(df[df['cell_class'] == 'mechanosensory']),
-                'auditory_neurons': len(df[df['cell_type'].str.contains('JO-', na=False)]),
-                'sensory_neurons': len(df[df['super_class'] == 'sensory']),
-                'top_cell_types': df['cell_type'].value_counts().head(10).to_dict(),
+        if len(dataset) > 0:
+            # Served from counts materialized with the snapshot
+            stats = stats_summary(
+                dataset.stats,
+                {column: dataset.group_counts(column) for column in group_by},
+                top_k=top_k
+            )
+            stats.update({
                 'data_source': 'cloud_flywire_data',
                 'ssl_status': 'not_needed_cloud_data',
                 'cache_status': 'loaded',
-                'cache_age_minutes': int((datetime.now() - flywire_service.cache_timestamp).total_seconds() / 60) if flywire_service.cache_timestamp else 0
-            }
+                'cache_age_minutes': dataset.age_minutes()
+            })
         
         return jsonify({
             'success': True,
             'stats': stats
         })
         
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Stats query failed: {e}")
         return jsonify({
@@ -419,11 +1024,14 @@ def refresh_data():
     """Force refresh of cloud data"""
     try:
         flywire_service.load_cloud_data(force_refresh=True)
+        response_cache.clear()
+        dataset = flywire_service.get_dataset()
         
         return jsonify({
             'success': True,
             'message': 'Cloud data refreshed successfully',
-            'neurons_loaded': len(flywire_service.neuron_data) if flywire_service.neuron_data is not None else 0,
+            'neurons_loaded': len(dataset),
+            'dataset_version': dataset.version[:16],
             'timestamp': datetime.now().isoformat()
         })
         
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+FlyWire Dataset Snapshot - The annotation table bundled with its derived indexes
+A snapshot is fully built before it is published and never mutated afterwards,
+so a backend can swap in a refreshed one with a single reference assignment
+while requests keep reading the one they started with
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from annotation_snapshot import AnnotationSnapshotStore
+from cell_type_index import CellTypeIndex
+from dataset_stats import compute_dataset_stats, group_counts
+from neuron_records import root_id_array
+from spatial_index import NeuronSpatialIndex
+
+logger = logging.getLogger(__name__)
+
+STATS_SIDECAR = 'stats.json'
+
+
+class FlyWireDataset:
+    """Immutable snapshot of the neuron annotation table and its indexes"""
+
+    def __init__(self, neuron_data: pd.DataFrame, version: str, source: str,
+                 stats: Optional[Dict[str, Any]] = None):
+        self.neuron_data = neuron_data
+        self.version = version
+        self.source = source
+        self.loaded_at = datetime.now()
+
+        # Index cell types and coordinates once so requests never scan the full table
+        self.cell_type_index = CellTypeIndex.from_series(neuron_data['cell_type'])
+        self.spatial_index = NeuronSpatialIndex(neuron_data)
+
+        # Statistics summary, materialized with the snapshot
+        self.stats = stats or compute_dataset_stats(
+            neuron_data, auditory_neurons=len(self.cell_type_index.contains('JO-'))
+        )
+        self._extra_counts: Dict[str, Dict[str, int]] = {}
+        self._sorted_root_ids: Optional[np.ndarray] = None
+        self._root_id_order: Optional[np.ndarray] = None
+
+        # Derived circuits are attached by the owning service before publishing
+        self.mechanosensory_circuit: Optional[Dict[str, Any]] = None
+        self.mechanosensory_rows = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def load(cls, store: AnnotationSnapshotStore, source_hash: str,
+             parse: Callable[[], pd.DataFrame], source: str) -> 'FlyWireDataset':
+        """Build a dataset from the snapshot store, reusing or persisting its statistics"""
+        neuron_data = store.load_or_build(source_hash, parse)
+        stats = store.read_sidecar(source_hash, STATS_SIDECAR)
+        dataset = cls(neuron_data, version=source_hash, source=source, stats=stats)
+        if stats is None:
+            store.write_sidecar(source_hash, STATS_SIDECAR, dataset.stats)
+        return dataset
+
+    def __len__(self) -> int:
+        return len(self.neuron_data)
+
+    def group_counts(self, column: str) -> Dict[str, int]:
+        """Value counts for any annotation column, computed at most once per snapshot"""
+        counts = self.stats['counts'].get(column)
+        if counts is None:
+            counts = self._extra_counts.get(column)
+        if counts is None:
+            counts = group_counts(self.neuron_data, column)
+            self._extra_counts[column] = counts
+        return counts
+
+    def rows_for_root_ids(self, root_ids) -> np.ndarray:
+        """Table rows of the given root_ids, -1 for ids not in the table"""
+        if self._root_id_order is None:
+            ids = root_id_array(self.neuron_data)
+            order = np.argsort(ids, kind='stable')
+            self._sorted_root_ids, self._root_id_order = ids[order], order
+
+        root_ids = np.asarray(root_ids, dtype=np.int64)
+        if len(self._sorted_root_ids) == 0:
+            return np.full(len(root_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._sorted_root_ids, root_ids), len(self._sorted_root_ids) - 1)
+        return np.where(self._sorted_root_ids[positions] == root_ids, self._root_id_order[positions], -1)
+    
+    def age_minutes(self) -> int:
+        """Minutes since this snapshot was built"""
+        return int((datetime.now() - self.loaded_at).total_seconds() / 60)
@@ -13,6 +13,12 @@ from typing import List, Dict, Any
 from pathlib import Path
 import os
 
+from annotation_snapshot import AnnotationSnapshotStore, file_sha256
+from dataset_stats import DEFAULT_TOP_K, parse_group_by, stats_summary
+from flywire_dataset import FlyWireDataset
+from neuron_records import build_neuron_records
+from response_cache import ResponseCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -33,7 +39,9 @@ class FlyWireLocalService:
     def __init__(self, data_dir="flywire_data"):
         self.data_dir = Path(data_dir)
         self.neuron_data = None
+        self.dataset = None
         self.mechanosensory_circuit = None
+        self.snapshots = AnnotationSnapshotStore(self.data_dir / "snapshots")
         self.load_local_data()
     
     def load_local_data(self):
@@ -43,7 +51,13 @@ class FlyWireLocalService:
             annotations_file = self.data_dir / "Supplemental_file1_neuron_annotations.tsv"
             if annotations_file.exists():
                 logger.info("📊 Loading neuron annotations...")
-                self.neuron_data = pd.read_csv(annotations_file, sep='\t', low_memory=False)
+                self.dataset = FlyWireDataset.load(
+                    self.snapshots,
+                    file_sha256(annotations_file),
+                    lambda: pd.read_csv(annotations_file, sep='\t', low_memory=False),
+                    source='flywire_local_data'
+                )
+                self.neuron_data = self.dataset.neuron_data
                 logger.info(f"✅ Loaded {len(self.neuron_data):,} neurons")
             
             # Load pre-processed mechanosensory circuit
@@ -95,25 +109,14 @@ class FlyWireLocalService:
         
         try:
             # Get JO (Johnston's Organ) neurons
-            jo_mask = self.neuron_data['cell_type'].str.contains('JO-', na=False)
-            jo_neurons = self.neuron_data[jo_mask]
+            jo_rows = self.dataset.cell_type_index.contains('JO-')
+            jo_neurons = self.neuron_data.iloc[jo_rows[:limit]]
             
-            neurons = []
-            for _, row in jo_neurons.head(limit).iterrows():
-                neuron = {
-                    'id': str(row['root_id']),
-                    'type': row['cell_type'],
-                    'position': [float(row['pos_x']), float(row['pos_y']), float(row['pos_z'])],
-                    'soma_position': [float(row['soma_x']), float(row['soma_y']), float(row['soma_z'])],
-                    'activity': 0.0,
-                    'mesh_id': row['root_id'],
-                    'confidence': 1.0,
-                    'source': 'flywire_local_data',
-                    'super_class': row['super_class'],
-                    'cell_class': row['cell_class'],
-                    'side': row['side'] if pd.notna(row['side']) else 'unknown'
-                }
-                neurons.append(neuron)
+            neurons = build_neuron_records(
+                jo_neurons,
+                source='flywire_local_data',
+                default_type='auditory'
+            )
             
             logger.info(f"Found {len(neurons)} auditory neurons")
             return neurons
@@ -122,30 +125,23 @@ class FlyWireLocalService:
             logger.error(f"Failed to get auditory neurons: {e}")
             return []
     
-    def search_neurons_by_type(self, cell_type: str, limit=20) -> List[Dict[str, Any]]:
+    def search_neurons_by_type(self, cell_type: str, limit=20, match='contains') -> List[Dict[str, Any]]:
         """Search neurons by cell type"""
         if self.neuron_data is None:
             return []
         
         try:
-            mask = self.neuron_data['cell_type'].str.contains(cell_type, case=False, na=False)
-            matching_neurons = self.neuron_data[mask]
+            if match == 'prefix':
+                rows = self.dataset.cell_type_index.startswith(cell_type)
+            else:
+                rows = self.dataset.cell_type_index.contains(cell_type, case=False)
+            matching_neurons = self.neuron_data.iloc[rows[:limit]]
             
-            neurons = []
-            for _, row in matching_neurons.head(limit).iterrows():
-                neuron = {
-                    'id': str(row['root_id']),
-                    'type': row['cell_type'],
-                    'position': [float(row['pos_x']), float(row['pos_y']), float(row['pos_z'])],
-                    'soma_position': [float(row['soma_x']), float(row['soma_y']), float(row['soma_z'])],
-                    'activity': 0.0,
-                    'mesh_id': row['root_id'],
-                    'confidence': 1.0,
-                    'source': 'flywire_local_data',
-                    'super_class': row['super_class'],
-                    'cell_class': row['cell_class']
-                }
-                neurons.append(neuron)
+            neurons = build_neuron_records(
+                matching_neurons,
+                source='flywire_local_data',
+                default_type=cell_type
+            )
             
             return neurons
             
@@ -156,6 +152,12 @@ class FlyWireLocalService:
 # Initialize service
 flywire_service = FlyWireLocalService()
 
+# ETags and serialized bodies keyed by dataset version and request parameters
+response_cache = ResponseCache(
+    version=lambda: flywire_service.dataset.version if flywire_service.dataset is not None else None
+)
+response_cache.init_app(app)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -168,6 +170,7 @@ def health_check():
     })
 
 @app.route('/api/circuits/search', methods=['GET'])
+@response_cache.cached
 def search_circuits():
     """Search for neural circuits - using local data"""
     try:
@@ -191,6 +194,7 @@ def search_circuits():
         }), 500
 
 @app.route('/api/neurons/mechanosensory', methods=['GET'])
+@response_cache.cached
 def get_mechanosensory():
     """Get mechanosensory neurons from local data"""
     try:
@@ -213,18 +217,21 @@ def get_mechanosensory():
         }), 500
 
 @app.route('/api/neurons/search', methods=['GET'])
+@response_cache.cached
 def search_neurons():
     """Search neurons by type from local data"""
     try:
         cell_type = request.args.get('type', 'mechanosensory')
         limit = request.args.get('limit', 20, type=int)
+        match = request.args.get('match', 'contains')
         
-        neurons = flywire_service.search_neurons_by_type(cell_type, limit=limit)
+        neurons = flywire_service.search_neurons_by_type(cell_type, limit=limit, match=match)
         
         return jsonify({
             'success': True,
             'neurons': neurons,
             'search_type': cell_type,
+            'match': match,
             'total_found': len(neurons),
             'data_source': 'flywire_local_data'
         })
@@ -238,28 +245,36 @@ def search_neurons():
         }), 500
 
 @app.route('/api/stats', methods=['GET'])
+@response_cache.cached
 def get_stats():
     """Get dataset statistics"""
     try:
         stats = {}
+        group_by = parse_group_by(request.args.get('group_by', ''))
+        top_k = request.args.get('top_k', DEFAULT_TOP_K, type=int)
         
-        if flywire_service.neuron_data is not None:
-            df = flywire_service.neuron_data
-            stats = {
-                'total_neurons': len(df),
-                'mechanosensory_neurons': len(df[df['cell_class'] == 'mechanosensory']),
-                'auditory_neurons': len(df[df['cell_type'].str.contains('JO-', na=False)]),
-                'sensory_neurons': len(df[df['super_class'] == 'sensory']),
-                'top_cell_types': df['cell_type'].value_counts().head(10).to_dict(),
+        dataset = flywire_service.dataset
+        if dataset is not None:
+            stats = stats_summary(
+                dataset.stats,
+                {column: dataset.group_counts(column) for column in group_by},
+                top_k=top_k
+            )
+            stats.update({
                 'data_source': 'local_flywire_data',
                 'ssl_status': 'not_needed'
-            }
+            })
         
         return jsonify({
             'success': True,
             'stats': stats
         })
         
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Stats query failed: {e}")
         return jsonify({
@@ -6,16 +6,27 @@ Cloud Run Compatible
 
 import neuroglancer
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, send_from_directory
 from flask_cors import CORS
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import os
+import threading
+import time
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from caveclient import CAVEclient
 import pandas as pd
 
+from activity_scheduler import ActivityScheduler
+from activity_stream import ActivityBroadcaster
+from cave_executor import CaveQueryExecutor
+from cave_table_cache import CaveTableCache
+from circuit_activity import CircuitActivity
+from local_cave_client import LocalCaveClient
+from precomputed_annotations import AnnotationStore
+
 # Load environment variables
 load_dotenv()
 
@@ -25,13 +36,16 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Configure CORS for Firebase frontend
-CORS(app, origins=[
-    'https://neurovis-3d.web.app',
-    'https://neurovis-3d.firebaseapp.com', 
-    'http://localhost:4200',
-    'http://0.0.0.0:4200'
-])
+# Configure CORS for Firebase frontend; precomputed annotations are fetched by the Neuroglancer page itself
+CORS(app, resources={
+    r'/precomputed/*': {'origins': '*'},
+    r'/*': {'origins': [
+        'https://neurovis-3d.web.app',
+        'https://neurovis-3d.firebaseapp.com', 
+        'http://localhost:4200',
+        'http://0.0.0.0:4200'
+    ]}
+})
 
 class FlyWireNeuroglancerService:
     """FlyWire larval circuit visualization service"""
@@ -39,10 +53,34 @@ class FlyWireNeuroglancerService:
     def __init__(self):
         self.viewer = None
         self.cave_client = None
-        self.current_circuits = []
+        # Circuits and their activity arrays, always replaced together as one tuple
+        self._circuit_state: Tuple[List[Dict[str, Any]], Optional[CircuitActivity]] = ([], None)
         self.cave_token = os.getenv('FLYWIRE_CAVE_TOKEN', 'b927b9cd93ba0a9b569ab9e32d231dbc')
         self.dataset = 'flywire_fafb_production'
         
+        # FLYWIRE_CAVE_CLIENT=local talks to fake_cave_server.py at FLYWIRE_CAVE_SERVER instead
+        self.cave_server = os.getenv('FLYWIRE_CAVE_SERVER', 'https://cave.flywire.ai').rstrip('/')
+        self.cave_client_kind = os.getenv('FLYWIRE_CAVE_CLIENT', 'cave')
+        
+        # Independent CAVE queries run concurrently, bounded per host and by one deadline
+        self.executor = CaveQueryExecutor()
+        self.search_deadline = float(os.getenv('CAVE_SEARCH_DEADLINE', '60'))
+        
+        # Posted FEM samples are coalesced per session and applied on a fixed tick
+        self.activity_scheduler = ActivityScheduler(self.update_circuit_activity)
+        self.activity_stream = ActivityBroadcaster()
+        
+        # Soma annotations are exported as precomputed layers served from /precomputed
+        self.annotation_store = AnnotationStore()
+        self.annotation_url = os.getenv('FLYWIRE_ANNOTATION_URL')
+        
+        # Whole CAVE tables cached per materialization version, and soma
+        # positions already looked up at that version
+        self.table_cache = None
+        self._soma_positions = {}
+        self._soma_version = None
+        self._soma_lock = threading.Lock()
+        
         # Get Neuroglancer port from environment
         self.neuroglancer_port = int(os.getenv('NEUROGLANCER_PORT', '9997'))
         
@@ -79,6 +117,14 @@ class FlyWireNeuroglancerService:
         
         self.initialize_services()
     
+    @property
+    def current_circuits(self) -> List[Dict[str, Any]]:
+        return self._circuit_state[0]
+    
+    @property
+    def activity(self) -> Optional[CircuitActivity]:
+        return self._circuit_state[1]
+    
     def initialize_services(self):
         """Initialize Neuroglancer and CAVE client"""
         try:
@@ -106,12 +152,12 @@ class FlyWireNeuroglancerService:
             # Create session with retry strategy
             session = requests.Session()
             
-            # Configure retry strategy
+            # Configure retry strategy; materialization queries are read-only POSTs
             retry_strategy = Retry(
                 total=3,
                 backoff_factor=1,
                 status_forcelist=[429, 500, 502, 503, 504],
-                allowed_methods=["HEAD", "GET", "OPTIONS"]
+                allowed_methods=["HEAD", "GET", "OPTIONS", "POST"]
             )
             
             # Create adapter with SSL context
@@ -120,17 +166,23 @@ class FlyWireNeuroglancerService:
                     kwargs['ssl_context'] = ssl_context
                     return super().init_poolmanager(*args, **kwargs)
             
-            adapter = SSLAdapter(max_retries=retry_strategy)
+            # Enough pooled connections for every concurrent query to one host
+            adapter = SSLAdapter(max_retries=retry_strategy, pool_maxsize=self.executor.per_host_limit)
             session.mount("https://", adapter)
             session.mount("http://", adapter)
+            self.session = session
             
             # Try to initialize CAVE client with custom session
             try:
-                self.cave_client = CAVEclient(
-                    datastack_name=self.dataset,
-                    server_address='https://cave.flywire.ai',
-                    auth_token=self.cave_token
-                )
+                if self.cave_client_kind == 'local':
+                    self.cave_client = LocalCaveClient(self.dataset, self.cave_server, session=session)
+                    logger.info(f"Using local CAVE stand-in at {self.cave_server}")
+                else:
+                    self.cave_client = CAVEclient(
+                        datastack_name=self.dataset,
+                        server_address=self.cave_server,
+                        auth_token=self.cave_token
+                    )
                 
                 # Monkey patch the session to use our SSL configuration
                 if hasattr(self.cave_client, '_info') and hasattr(self.cave_client._info, 'session'):
@@ -138,6 +190,12 @@ class FlyWireNeuroglancerService:
                 elif hasattr(self.cave_client, 'info') and hasattr(self.cave_client.info, 'session'):
                     self.cave_client.info.session = session
                 
+                # Table queries fan out concurrently, so they share the retrying pooled session too
+                try:
+                    self.cave_client.materialize.session = session
+                except Exception as session_error:
+                    logger.warning(f"Could not configure materialization session: {session_error}")
+                
                 logger.info("FlyWire CAVE client initialized with SSL configuration")
                 logger.info(f"Dataset: {self.dataset}")
                 
@@ -145,7 +203,7 @@ class FlyWireNeuroglancerService:
                 try:
                     # Simple connection test with timeout
                     test_response = session.get(
-                        'https://cave.flywire.ai/info/api/versions', 
+                        f'{self.cave_server}/info/api/versions', 
                         timeout=30,
                         headers={'Authorization': f'Bearer {self.cave_token}'}
                     )
@@ -179,13 +237,35 @@ class FlyWireNeuroglancerService:
                 raise RuntimeError(f"Cannot initialize Neuroglancer: {e}")
         return self.viewer
     
+    def _tables(self) -> CaveTableCache:
+        """Table cache bound to the current CAVE client"""
+        if self.table_cache is None or self.table_cache.client is not self.cave_client:
+            self.table_cache = CaveTableCache(self.cave_client, self.dataset)
+        return self.table_cache
+    
     def search_chrimson_circuits(self) -> List[Dict[str, Any]]:
         """Search for CHRIMSON-expressing larval neurons from FlyWire"""
         try:
             circuits = []
             
-            # Query mechanosensory neurons from FlyWire
-            mechanosensory_neurons = self._query_mechanosensory_neurons()
+            search_started = time.monotonic()
+            
+            # One cached cell type table shared by all circuits
+            cell_df = self._tables().get('cell_type_local')
+            logger.info(f"Retrieved {len(cell_df)} cell type annotations")
+            
+            # The three circuit queries (and their soma lookups) are independent
+            host = urlparse(self.cave_server).netloc
+            futures = {
+                'mechanosensory': self.executor.submit(self._query_mechanosensory_neurons, cell_df, host=host),
+                'photoreceptor': self.executor.submit(self._query_photoreceptor_neurons, cell_df, host=host),
+                'larval': self.executor.submit(self._query_larval_neurons, cell_df, host=host)
+            }
+            remaining = max(self.search_deadline - (time.monotonic() - search_started), 0)
+            results = self.executor.gather(futures, timeout=remaining)
+            
+            # Mechanosensory neurons from FlyWire
+            mechanosensory_neurons = results['mechanosensory']
             if mechanosensory_neurons:
                 circuits.append({
                     'name': 'Mechanosensory Larval Circuit',
@@ -195,8 +275,8 @@ class FlyWireNeuroglancerService:
                     'source': 'flywire_cave'
                 })
             
-            # Query photoreceptor neurons
-            photoreceptor_neurons = self._query_photoreceptor_neurons()
+            # Photoreceptor neurons
+            photoreceptor_neurons = results['photoreceptor']
             if photoreceptor_neurons:
                 circuits.append({
                     'name': 'Photoreceptor Circuit', 
@@ -206,8 +286,8 @@ class FlyWireNeuroglancerService:
                     'source': 'flywire_cave'
                 })
             
-            # Query larval-specific neurons
-            larval_neurons = self._query_larval_neurons()
+            # Larval-specific neurons
+            larval_neurons = results['larval']
             if larval_neurons:
                 circuits.append({
                     'name': 'Larval Specific Circuits',
@@ -217,31 +297,38 @@ class FlyWireNeuroglancerService:
                     'source': 'flywire_cave'
                 })
             
-            self.current_circuits = circuits
+            # Publish circuits with their activity arrays in one assignment,
+            # so a concurrent tick never pairs one search's circuits with another's arrays
+            self._circuit_state = (circuits, CircuitActivity(circuits))
+            self.activity_stream.reset(circuits)
             logger.info(f"Found {len(circuits)} circuit types from FlyWire")
             total_neurons = sum(len(c['neurons']) for c in circuits)
             logger.info(f"Total neurons: {total_neurons}")
             
             return circuits
             
+        except TimeoutError as e:
+            logger.error(f"Circuit search timed out: {e}")
+            raise
         except Exception as e:
             logger.error(f"Circuit search failed: {e}")
             raise RuntimeError(f"Failed to get FlyWire data: {e}")
     
-    def _query_mechanosensory_neurons(self) -> List[Dict[str, Any]]:
+    def _query_mechanosensory_neurons(self, cell_df: Optional[pd.DataFrame] = None) -> List[Dict[str, Any]]:
         """Query mechanosensory neurons from FlyWire CAVE"""
         try:
             logger.info("Querying mechanosensory neurons from FlyWire...")
             
-            # Get cell type table from CAVE
-            cell_types_table = self.cave_client.materialize.get_table_metadata()
+            # Table metadata only changes with the materialization version
+            cell_types_table = self._tables().table_metadata()
             logger.info(f"Available tables: {list(cell_types_table.keys())}")
             
             # Query for mechanosensory cell types
             try:
                 # Try to get cell type annotations
-                cell_df = self.cave_client.materialize.query_table('cell_type_local')
-                logger.info(f"Retrieved {len(cell_df)} cell type annotations")
+                if cell_df is None:
+                    cell_df = self._tables().get('cell_type_local')
+                    logger.info(f"Retrieved {len(cell_df)} cell type annotations")
                 
                 # Filter for mechanosensory types
                 mechanosensory_mask = cell_df['cell_type'].str.contains(
@@ -253,24 +340,8 @@ class FlyWireNeuroglancerService:
                 
                 logger.info(f"Found {len(mechanosensory_df)} mechanosensory neurons")
                 
-                neurons = []
-                for _, row in mechanosensory_df.head(20).iterrows():  # Limit to 20 for demo
-                    # Get neuron position and mesh data
-                    neuron_id = row['pt_root_id']
-                    
-                    # Get soma position
-                    soma_position = self._get_neuron_soma_position(neuron_id)
-                    
-                    neuron = {
-                        'id': str(neuron_id),
-                        'type': row['cell_type'],
-                        'position': soma_position,
-                        'activity': 0.0,
-                        'mesh_id': neuron_id,  # For mesh loading
-                        'confidence': row.get('confidence', 1.0),
-                        'source': 'flywire'
-                    }
-                    neurons.append(neuron)
+                # Limit to 20 for demo
+                neurons = self._neurons_with_soma(mechanosensory_df.head(20), 'flywire')
                 
                 logger.info(f"Processed {len(neurons)} mechanosensory neurons")
                 return neurons
@@ -283,39 +354,78 @@ class FlyWireNeuroglancerService:
             logger.error(f"Mechanosensory query failed: {e}")
             raise RuntimeError(f"Cannot get mechanosensory data: {e}")
     
-    def _get_neuron_soma_position(self, neuron_id: int) -> List[float]:
-        """Get soma position for a neuron from FlyWire"""
+    def _get_soma_positions(self, neuron_ids) -> Dict[int, List[float]]:
+        """Get soma positions for many neurons with one nucleus table query
+        
+        Positions are remembered for the current materialization version, so
+        only neurons not looked up before at that version are queried.
+        """
+        neuron_ids = [int(neuron_id) for neuron_id in neuron_ids]
+        if not neuron_ids:
+            return {}
         try:
-            # Query neuron's soma location using CAVE
-            soma_df = self.cave_client.materialize.query_table(
-                'nucleus_detection_v0',
-                filter_equal_dict={'pt_root_id': neuron_id}
-            )
-            
-            if len(soma_df) > 0:
-                # Use the detected nucleus position
-                soma_row = soma_df.iloc[0]
-                position = [
-                    float(soma_row['pt_position_x']),
-                    float(soma_row['pt_position_y']),
-                    float(soma_row['pt_position_z'])
-                ]
-                logger.debug(f"Soma position for {neuron_id}: {position}")
-                return position
-            else:
-                raise RuntimeError(f"No soma position found for neuron {neuron_id}")
+            version = self._tables().materialization_version()
+            with self._soma_lock:
+                if version != self._soma_version:
+                    self._soma_positions = {}
+                    self._soma_version = version
+                soma_positions = self._soma_positions
+                unknown = [neuron_id for neuron_id in neuron_ids if neuron_id not in soma_positions]
+            if unknown:
+                soma_df = self.cave_client.materialize.query_table(
+                    'nucleus_detection_v0',
+                    filter_in_dict={'pt_root_id': unknown},
+                    materialization_version=version,
+                    split_positions=True
+                )
                 
+                # Use the first detected nucleus of each neuron
+                soma_df = soma_df.drop_duplicates('pt_root_id')
+                positions = soma_df[['pt_position_x', 'pt_position_y', 'pt_position_z']].to_numpy(dtype=float)
+                with self._soma_lock:
+                    soma_positions.update(zip(soma_df['pt_root_id'].astype('int64').tolist(), positions.tolist()))
+            
+            missing = [neuron_id for neuron_id in neuron_ids if neuron_id not in soma_positions]
+            if missing:
+                raise RuntimeError(f"No soma position found for neurons {missing}")
+            logger.debug(f"Soma positions for {len(neuron_ids)} neurons, {len(unknown)} queried")
+            return {neuron_id: soma_positions[neuron_id] for neuron_id in neuron_ids}
+            
         except Exception as e:
-            logger.error(f"Soma position query failed for {neuron_id}: {e}")
-            raise RuntimeError(f"Cannot get soma position for neuron {neuron_id}: {e}")
+            logger.error(f"Soma position query failed for {len(neuron_ids)} neurons: {e}")
+            raise RuntimeError(f"Cannot get soma positions: {e}")
     
-    def _query_photoreceptor_neurons(self) -> List[Dict[str, Any]]:
+    def _get_neuron_soma_position(self, neuron_id: int) -> List[float]:
+        """Get soma position for a neuron from FlyWire"""
+        return self._get_soma_positions([neuron_id])[int(neuron_id)]
+    
+    def _neurons_with_soma(self, cell_df: pd.DataFrame, source: str) -> List[Dict[str, Any]]:
+        """Neuron records for cell type rows, soma positions fetched in one batch"""
+        neuron_ids = cell_df['pt_root_id'].tolist()
+        soma_positions = self._get_soma_positions(neuron_ids)
+        confidences = cell_df['confidence'].tolist() if 'confidence' in cell_df else [1.0] * len(cell_df)
+        
+        return [
+            {
+                'id': str(neuron_id),
+                'type': cell_type,
+                'position': soma_positions[int(neuron_id)],
+                'activity': 0.0,
+                'mesh_id': neuron_id,  # For mesh loading
+                'confidence': confidence,
+                'source': source
+            }
+            for neuron_id, cell_type, confidence in zip(neuron_ids, cell_df['cell_type'].tolist(), confidences)
+        ]
+    
+    def _query_photoreceptor_neurons(self, cell_df: Optional[pd.DataFrame] = None) -> List[Dict[str, Any]]:
         """Query photoreceptor neurons from FlyWire"""
         try:
             logger.info("Querying photoreceptor neurons...")
             
             # Query from cell type annotations
-            cell_df = self.cave_client.materialize.query_table('cell_type_local')
+            if cell_df is None:
+                cell_df = self._tables().get('cell_type_local')
             
             # Filter for photoreceptor types
             photoreceptor_mask = cell_df['cell_type'].str.contains(
@@ -325,21 +435,7 @@ class FlyWireNeuroglancerService:
             )
             photoreceptor_df = cell_df[photoreceptor_mask]
             
-            neurons = []
-            for _, row in photoreceptor_df.head(10).iterrows():
-                neuron_id = row['pt_root_id']
-                soma_position = self._get_neuron_soma_position(neuron_id)
-                
-                neuron = {
-                    'id': str(neuron_id),
-                    'type': row['cell_type'],
-                    'position': soma_position,
-                    'activity': 0.0,
-                    'mesh_id': neuron_id,
-                    'confidence': row.get('confidence', 1.0),
-                    'source': 'flywire_photoreceptor'
-                }
-                neurons.append(neuron)
+            neurons = self._neurons_with_soma(photoreceptor_df.head(10), 'flywire_photoreceptor')
             
             logger.info(f"Retrieved {len(neurons)} photoreceptor neurons")
             return neurons
@@ -348,13 +444,14 @@ class FlyWireNeuroglancerService:
             logger.error(f"Photoreceptor query failed: {e}")
             raise RuntimeError(f"Cannot get photoreceptor data: {e}")
     
-    def _query_larval_neurons(self) -> List[Dict[str, Any]]:
+    def _query_larval_neurons(self, cell_df: Optional[pd.DataFrame] = None) -> List[Dict[str, Any]]:
         """Query larval-specific neurons from FlyWire"""
         try:
             logger.info("Querying larval neurons...")
             
             # Query from cell type annotations
-            cell_df = self.cave_client.materialize.query_table('cell_type_local')
+            if cell_df is None:
+                cell_df = self._tables().get('cell_type_local')
             
             # Filter for larval patterns
             larval_mask = cell_df['cell_type'].str.contains(
@@ -364,21 +461,7 @@ class FlyWireNeuroglancerService:
             )
             larval_df = cell_df[larval_mask]
             
-            neurons = []
-            for _, row in larval_df.head(10).iterrows():
-                neuron_id = row['pt_root_id']
-                soma_position = self._get_neuron_soma_position(neuron_id)
-                
-                neuron = {
-                    'id': str(neuron_id),
-                    'type': row['cell_type'],
-                    'position': soma_position,
-                    'activity': 0.0,
-                    'mesh_id': neuron_id,
-                    'confidence': row.get('confidence', 1.0),
-                    'source': 'flywire_larval'
-                }
-                neurons.append(neuron)
+            neurons = self._neurons_with_soma(larval_df.head(10), 'flywire_larval')
             
             logger.info(f"Retrieved {len(neurons)} larval neurons")
             return neurons
@@ -387,12 +470,27 @@ class FlyWireNeuroglancerService:
             logger.error(f"Larval query failed: {e}")
             raise RuntimeError(f"Cannot get larval data: {e}")
     
-    def create_neuroglancer_visualization(self) -> str:
-        """Create Neuroglancer visualization with FlyWire meshes"""
+    def create_neuroglancer_visualization(self, annotation_url: Optional[str] = None) -> str:
+        """Create Neuroglancer visualization with FlyWire meshes
+
+        annotation_url is where /precomputed is reachable from the browser;
+        FLYWIRE_ANNOTATION_URL takes precedence when set.
+        """
         try:
             # Ensure Neuroglancer is initialized
             viewer = self._ensure_neuroglancer()
             
+            # Every segment gets its current activity colour
+            state = self._circuit_state
+            circuits, activity = state
+            self.circuits_with_activity(state)
+            colors, buckets = activity.color_updates(full=True) if activity else ([None] * len(circuits), None)
+            
+            # Somata go to the viewer as precomputed:// layers instead of inline points
+            export = self.annotation_store.load_or_build(circuits)
+            base_url = (self.annotation_url or annotation_url
+                        or f"http://localhost:{os.getenv('PORT', '8080')}/precomputed").rstrip('/')
+            
             # Clear existing layers
             with viewer.txn() as s:
                 s.layers.clear()
@@ -410,8 +508,9 @@ class FlyWireNeuroglancerService:
                 )
                 
                 # Add circuit layers with meshes
-                for circuit in self.current_circuits:
-                    self._add_circuit_layer(s, circuit)
+                for index, (circuit, segment_colors) in enumerate(zip(circuits, colors)):
+                    self._add_circuit_layer(s, circuit, f"precomputed://{base_url}/{export.name}/{index}",
+                                            segment_colors)
                 
                 # Set view to larval brain region
                 s.position = [50000, 30000, 20000]  # Larval brain center
@@ -419,6 +518,9 @@ class FlyWireNeuroglancerService:
                 s.projection_scale = 500
                 s.layout = '4panel'
             
+            if activity is not None:
+                activity.mark_pushed(buckets)
+            
             url = str(viewer)
             logger.info(f"Neuroglancer URL: {url}")
             return url
@@ -427,8 +529,9 @@ class FlyWireNeuroglancerService:
             logger.error(f"Visualization creation failed: {e}")
             raise RuntimeError(f"Cannot create visualization: {e}")
     
-    def _add_circuit_layer(self, state, circuit: Dict[str, Any]):
-        """Add circuit with meshes to Neuroglancer"""
+    def _add_circuit_layer(self, state, circuit: Dict[str, Any], annotation_source: str,
+                           segment_colors: Optional[Dict[int, str]] = None):
+        """Add circuit with meshes and its precomputed soma annotations to Neuroglancer"""
         try:
             # Add segmentation layer for neuron meshes
             mesh_source = f'precomputed://https://flywire-daf-20230503.s3.amazonaws.com/segmentation'
@@ -440,37 +543,21 @@ class FlyWireNeuroglancerService:
             )
             
             # Set circuit-specific visualization properties
-            layer.segment_colors = {
+            layer.segment_colors = segment_colors if segment_colors is not None else {
                 neuron['mesh_id']: circuit['color'] 
                 for neuron in circuit['neurons']
             }
             
-            layer.visible = True
+            # Visibility belongs to the managed layer, not the layer itself
             state.layers[f"{circuit['name']}_meshes"] = layer
+            state.layers[f"{circuit['name']}_meshes"].visible = True
             
-            # Add annotation layer for soma positions
-            annotations = []
-            for neuron in circuit['neurons']:
-                point = neuroglancer.PointAnnotation(
-                    point=neuron['position'],
-                    id=neuron['id'],
-                    description=f"{circuit['name']}: {neuron['type']}\n"
-                               f"Activity: {neuron.get('activity', 0):.2f}\n"
-                               f"Confidence: {neuron.get('confidence', 1.0):.2f}\n"
-                               f"Source: {neuron.get('source', 'unknown')}"
-                )
-                annotations.append(point)
-            
-            # Create annotation layer
-            annotation_layer = neuroglancer.LocalAnnotationLayer(
-                dimensions=state.dimensions,
-                annotations=annotations
-            )
-            
+            # Add annotation layer for soma positions, fetched chunk by chunk by the browser
+            annotation_layer = neuroglancer.AnnotationLayer(source=annotation_source)
             annotation_layer.annotation_color = circuit['color']
-            annotation_layer.visible = True
             
             state.layers[f"{circuit['name']}_annotations"] = annotation_layer
+            state.layers[f"{circuit['name']}_annotations"].visible = True
             
             logger.info(f"Added layer: {circuit['name']} ({len(circuit['neurons'])} neurons)")
             
@@ -481,66 +568,71 @@ class FlyWireNeuroglancerService:
     def update_circuit_activity(self, fem_data: Dict[str, Any]):
         """Update circuit activity based on FEM data"""
         try:
-            optogenetic_stimulus = fem_data.get('optogeneticStimulus', False)
-            mechanical_force = fem_data.get('femParameters', {}).get('mechanicalForce', 0)
-            timestamp = fem_data.get('timestamp', 0)
-            peak_time = fem_data.get('peakTime', 11.5)
-            
-            # Calculate temporal factor
-            time_factor = np.exp(-abs(timestamp - peak_time) / 5.0)
-            
-            for circuit in self.current_circuits:
-                for neuron in circuit['neurons']:
-                    if 'mechanosensory' in neuron['type'] or 'touch' in neuron['type']:
-                        # CHRIMSON response
-                        base_activity = 0.9 if optogenetic_stimulus else 0.05
-                        mechanical_boost = mechanical_force * 0.2
-                        neuron['activity'] = min(1.0, (base_activity + mechanical_boost) * time_factor)
-                    
-                    elif 'photoreceptor' in neuron['type']:
-                        # Photoreceptor response
-                        base_activity = 0.8 if optogenetic_stimulus else 0.1
-                        neuron['activity'] = base_activity * time_factor
-                    
-                    else:
-                        # Other neurons
-                        base_activity = mechanical_force * 0.15
-                        neuron['activity'] = base_activity * time_factor
+            # One read of the circuit state per tick
+            state = self._circuit_state
+            circuits, activity = state
+            if activity is None:
+                logger.info("No circuits loaded yet, skipping activity update")
+                return
+            
+            # Neuron state lives in arrays; the circuit dicts are synced on read
+            activity.update(fem_data)
+            if self.activity_stream.has_subscribers():
+                self.activity_stream.publish(activity)
             
             # Update visualization
-            self._update_visualization()
-            logger.info(f"Updated activity for {len(self.current_circuits)} circuits")
+            self._update_visualization(state)
+            logger.info(f"Updated activity for {len(activity)} neurons in {len(circuits)} circuits")
             
         except Exception as e:
             logger.error(f"Activity update failed: {e}")
             raise RuntimeError(f"Cannot update activity: {e}")
     
-    def _update_visualization(self):
-        """Update Neuroglancer visualization"""
+    def subscribe_activity(self):
+        """Activity stream subscription, primed with the current activity of every circuit"""
+        activity = self.activity
+        if activity is not None:
+            self.activity_stream.publish(activity)
+        return self.activity_stream.subscribe()
+    
+    def circuits_with_activity(self, state=None) -> List[Dict[str, Any]]:
+        """Current circuits with each neuron's 'activity' copied from the activity arrays"""
+        circuits, activity = state or self._circuit_state
+        if activity is not None:
+            activity.write_back(circuits)
+        return circuits
+    
+    def _update_visualization(self, state=None):
+        """Update Neuroglancer visualization from one (circuits, activity) state"""
         try:
             # Only update if viewer is already initialized
             if self.viewer is None:
                 logger.info("Neuroglancer not initialized yet, skipping visualization update")
                 return
                 
-            # Recreate layers with updated activity
+            circuits, activity = state or self._circuit_state
+            if activity is None:
+                return
+            
+            # Only segments whose colour bucket changed since the last push
+            colors, buckets = activity.color_updates()
+            changed = sum(len(circuit_colors) for circuit_colors in colors)
+            if not changed:
+                return
+            
             with self.viewer.txn() as s:
-                # Update segment colors based on activity
-                for circuit in self.current_circuits:
+                for circuit, circuit_colors in zip(circuits, colors):
                     layer_name = f"{circuit['name']}_meshes"
-                    if layer_name in s.layers:
-                        layer = s.layers[layer_name]
-                        
-                        # Update colors based on activity
-                        new_colors = {}
-                        for neuron in circuit['neurons']:
-                            activity = neuron.get('activity', 0)
-                            # Interpolate between base color and bright color based on activity
-                            base_color = int(circuit['color'].replace('#', ''), 16)
-                            bright_factor = activity
-                            new_colors[neuron['mesh_id']] = f"#{base_color:06x}"
-                        
-                        layer.segment_colors = new_colors
+                    if circuit_colors and layer_name in s.layers:
+                        # Only changed keys are written. Overwriting a key of neuroglancer's map leaves a
+                        # stale cache entry that reads back as "None", so each key is removed first
+                        segment_colors = s.layers[layer_name].segment_colors
+                        for mesh_id, color in circuit_colors.items():
+                            segment_colors.pop(mesh_id, None)
+                            segment_colors[mesh_id] = color
+            
+            activity.mark_pushed(buckets)
+            logger.debug(f"Pushed {changed} of {len(activity)} segment colours")
             
         except Exception as e:
             logger.error(f"Visualization update failed: {e}")
@@ -615,6 +707,12 @@ def search_circuits():
             'total_neurons': sum(len(c['neurons']) for c in circuits),
             'data_source': 'flywire'
         })
+    except TimeoutError as e:
+        return jsonify({
+            'success': False, 
+            'error': str(e),
+            'data_source': 'flywire'
+        }), 504
     except Exception as e:
         logger.error(f"Circuit search failed: {e}")
         return jsonify({
@@ -635,11 +733,13 @@ def create_visualization():
         }), 500
     
     try:
-        url = flywire_service.create_neuroglancer_visualization()
+        url = flywire_service.create_neuroglancer_visualization(
+            annotation_url=request.host_url.rstrip('/') + '/precomputed'
+        )
         return jsonify({
             'success': True,
             'neuroglancer_url': url,
-            'features': ['meshes', 'flywire_image', 'coordinates'],
+            'features': ['meshes', 'flywire_image', 'coordinates', 'precomputed_annotations'],
             'data_source': 'flywire'
         })
     except Exception as e:
@@ -652,7 +752,7 @@ def create_visualization():
 
 @app.route('/api/activity/update', methods=['POST'])
 def update_activity():
-    """Update circuit activity from FEM data"""
+    """Queue FEM data for the next activity tick"""
     flywire_service = get_service()
     if flywire_service is None:
         return jsonify({
@@ -661,13 +761,30 @@ def update_activity():
             'data_source': 'flywire'
         }), 500
     
+    fem_data = request.get_json(silent=True)
+    if not isinstance(fem_data, dict):
+        return jsonify({
+            'success': False,
+            'error': 'FEM data must be a JSON object',
+            'data_source': 'flywire'
+        }), 400
+    
     try:
-        fem_data = request.get_json()
-        flywire_service.update_circuit_activity(fem_data)
+        # Latest sample per session wins; the tick thread applies it
+        session = request.headers.get('X-Session-Id') or str(fem_data.get('sessionId', 'default'))
+        tick = flywire_service.activity_scheduler.submit(fem_data, session=session)
         return jsonify({
             'success': True,
+            'tick': tick,
             'data_source': 'flywire'
         })
+    except OverflowError as e:
+        logger.warning(f"Activity update dropped: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'data_source': 'flywire'
+        }), 429
     except Exception as e:
         logger.error(f"Activity update failed: {e}")
         return jsonify({
@@ -676,6 +793,56 @@ def update_activity():
             'data_source': 'flywire'
         }), 500
 
+@app.route('/api/activity/stats', methods=['GET'])
+def activity_stats():
+    """Counters of the activity update scheduler"""
+    flywire_service = get_service()
+    if flywire_service is None:
+        return jsonify({
+            'success': False, 
+            'error': 'FlyWire service not initialized',
+            'data_source': 'flywire'
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'scheduler': flywire_service.activity_scheduler.stats(),
+        'stream': flywire_service.activity_stream.stats(),
+        'data_source': 'flywire'
+    })
+
+@app.route('/api/activity/stream', methods=['GET'])
+def activity_stream():
+    """Server-sent events of quantized per-neuron activity"""
+    flywire_service = get_service()
+    if flywire_service is None:
+        return jsonify({
+            'success': False, 
+            'error': 'FlyWire service not initialized',
+            'data_source': 'flywire'
+        }), 500
+    
+    return Response(
+        flywire_service.activity_stream.stream(flywire_service.subscribe_activity()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/precomputed/<path:filename>', methods=['GET'])
+def precomputed_annotations(filename):
+    """Static precomputed annotation files (info and shards, with range requests)"""
+    flywire_service = get_service()
+    if flywire_service is None:
+        return jsonify({
+            'success': False, 
+            'error': 'FlyWire service not initialized',
+            'data_source': 'flywire'
+        }), 500
+    
+    # Exports are content-addressed, so they never change under a URL
+    return send_from_directory(flywire_service.annotation_store.annotation_dir.resolve(), filename,
+                               max_age=86400)
+
 @app.route('/api/circuits/current', methods=['GET'])
 def get_circuits():
     """Get current circuit data"""
@@ -689,7 +856,7 @@ def get_circuits():
     
     return jsonify({
         'success': True,
-        'circuits': flywire_service.current_circuits,
+        'circuits': flywire_service.circuits_with_activity(),
         'data_source': 'flywire'
     })
 
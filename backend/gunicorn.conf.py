@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for the FlyWire cloud backend
+The master loads the annotation snapshot once before forking, so workers share
+its memory-mapped columns and derived indexes instead of each building a copy
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 300
+
+# Import the app (and load the dataset, see when_ready) in the master
+preload_app = True
+
+
+def when_ready(server):
+    """Load the snapshot in the master so forked workers inherit it read-only"""
+    if os.environ.get('FLYWIRE_PRELOAD_DATA', '1') != '1':
+        return
+
+    from flywire_cloud_backend import flywire_service
+    try:
+        dataset = flywire_service.get_dataset()
+        server.log.info(f"Preloaded {len(dataset):,} neurons (snapshot {dataset.version[:16]}) before forking workers")
+        if flywire_service.get_connectome() is not None:
+            server.log.info("Preloaded connectome graph before forking workers")
+        if flywire_service.get_skeletons() is not None:
+            server.log.info("Preloaded skeleton store index before forking workers")
+        if flywire_service.get_nblast() is not None:
+            server.log.info("Preloaded NBLAST index before forking workers")
+    except Exception as e:
+        server.log.warning(f"Dataset preload failed, workers will load on first request: {e}")
+
+    # Keep the cyclic GC from writing to (and so un-sharing) the preloaded objects
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from flywire_cloud_backend import flywire_service
+    flywire_service.after_fork()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Local CAVE Client - Minimal CAVEclient stand-in for the fake CAVE server
+Implements the calls the neuroglancer service makes (table queries, latest
+materialization version, table metadata, datastack info) over plain HTTP with
+tables shipped as .npz columns, so the service runs unchanged against
+fake_cave_server.py
+"""
+
+import io
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+from fake_cave_server import NPZ_MIMETYPE
+
+
+def decode_npz(content: bytes) -> pd.DataFrame:
+    """Frame from .npz columns, <name>__codes/<name>__categories pairs as categoricals"""
+    with np.load(io.BytesIO(content), allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+
+    data = {}
+    for name, values in arrays.items():
+        if name.endswith('__categories'):
+            continue
+        if name.endswith('__codes'):
+            column = name[:-len('__codes')]
+            data[column] = pd.Categorical.from_codes(values, categories=arrays[f'{column}__categories'])
+        else:
+            data[name] = values
+    return pd.DataFrame(data)
+
+
+class LocalMaterializationClient:
+    def __init__(self, client: 'LocalCaveClient'):
+        self._client = client
+        self.session = client.session
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self._client.server_address}/materialize/api/v3/datastack/{self._client.datastack_name}/{endpoint}"
+
+    def most_recent_version(self) -> int:
+        response = self.session.get(self._url('versions/latest'), timeout=self._client.timeout)
+        response.raise_for_status()
+        return response.json()['version']
+
+    def get_table_metadata(self) -> Dict[str, Any]:
+        response = self.session.get(self._url('tables'), timeout=self._client.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def query_table(self, table: str, filter_in_dict: Optional[Dict[str, List]] = None,
+                    filter_equal_dict: Optional[Dict[str, Any]] = None,
+                    materialization_version: Optional[int] = None, split_positions: bool = False,
+                    **kwargs) -> pd.DataFrame:
+        """Same filters as CAVEclient.materialize.query_table, numpy ids made JSON-safe"""
+        query = {
+            'table': table,
+            'filter_in_dict': {k: [int(v) if isinstance(v, np.integer) else v for v in values]
+                               for k, values in (filter_in_dict or {}).items()},
+            'filter_equal_dict': {k: int(v) if isinstance(v, np.integer) else v
+                                  for k, v in (filter_equal_dict or {}).items()},
+            'materialization_version': materialization_version
+        }
+        response = self.session.post(self._url('query'), json=query, timeout=self._client.timeout,
+                                     headers={'Accept': NPZ_MIMETYPE})
+        response.raise_for_status()
+        df = decode_npz(response.content)
+
+        if not split_positions:
+            # CAVEclient's default: one pt_position column of [x, y, z]
+            split = [f'pt_position_{axis}' for axis in 'xyz']
+            if all(column in df for column in split):
+                df['pt_position'] = list(df[split].to_numpy())
+                df = df.drop(columns=split)
+        return df
+
+
+class LocalInfoClient:
+    def __init__(self, client: 'LocalCaveClient'):
+        self._client = client
+        self.session = client.session
+
+    def get_datastack_info(self) -> Dict[str, Any]:
+        url = f"{self._client.server_address}/info/api/v2/datastack/full/{self._client.datastack_name}"
+        response = self.session.get(url, timeout=self._client.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class LocalCaveClient:
+    """The parts of CAVEclient the neuroglancer service uses, against fake_cave_server.py"""
+
+    def __init__(self, datastack_name: str, server_address: str, session: Optional[requests.Session] = None,
+                 timeout: float = 60):
+        self.datastack_name = datastack_name
+        self.server_address = server_address.rstrip('/')
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.materialize = LocalMaterializationClient(self)
+        self.info = LocalInfoClient(self)
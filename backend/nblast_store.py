@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+NBLAST Store - Morphological similarity scores without holding the matrix in RAM
+Converts the Schlegel et al. all-by-all NBLAST table, chunk by chunk, into a
+memory-mapped float16 matrix plus a precomputed top-k neighbour table, both
+indexed by root_id, so similar-neuron queries touch a single row on disk
+"""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from connectome_graph import iter_table_chunks, table_columns
+
+logger = logging.getLogger(__name__)
+
+NBLAST_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+INDEX_ARRAYS = ('query_ids', 'query_order', 'target_ids', 'top_targets', 'top_scores')
+
+# Neighbours precomputed per neuron; larger k falls back to scanning the row
+DEFAULT_TOP_K = 100
+MAX_SIMILAR = 1000
+
+
+def iter_score_rows(path: Union[str, Path], chunksize: int = 256) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (query root_ids, target root_ids, float32 score rows) from a wide NBLAST table
+
+    The table has one row per query neuron: a root_id column followed by one
+    column per target neuron named by its root_id (CSV/TSV, Feather or Parquet).
+    """
+    names = table_columns(path)
+    id_column = next((name for name in names if not str(name).isdigit()), None)
+    if id_column is None:
+        raise ValueError("NBLAST table needs a root_id column before the per-neuron score columns")
+    target_columns = [name for name in names if str(name).isdigit()]
+    target_ids = np.array([int(name) for name in target_columns], dtype=np.int64)
+
+    for chunk in iter_table_chunks(path, [id_column] + target_columns, chunksize=chunksize):
+        scores = chunk[target_columns].to_numpy(dtype=np.float32)
+        yield chunk[id_column].to_numpy(dtype=np.int64), target_ids, scores
+
+
+def _self_matches(queries: np.ndarray, target_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, column) of each query neuron's score against itself"""
+    sorter = np.argsort(target_ids)
+    positions = np.searchsorted(target_ids, queries, sorter=sorter)
+    rows = np.flatnonzero(positions < len(target_ids))
+    columns = sorter[positions[rows]]
+    matches = target_ids[columns] == queries[rows]
+    return rows[matches], columns[matches]
+
+
+def rank_top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indexes and scores of the k highest scores per row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((len(scores), 0), dtype=np.int32), np.empty((len(scores), 0), dtype=scores.dtype)
+    columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-best, axis=1, kind='stable')
+    return np.take_along_axis(columns, order, axis=1).astype(np.int32), np.take_along_axis(best, order, axis=1)
+
+
+class NblastMatrix:
+    """Query x target float16 NBLAST scores, memory-mapped, with a top-k neighbour table"""
+
+    def __init__(self, path: Path, manifest: Dict[str, Any], mmap: bool = True):
+        self.path = Path(path)
+        self.metadata = manifest
+        mmap_mode = 'r' if mmap else None
+        for name in INDEX_ARRAYS:
+            setattr(self, name, np.load(self.path / f'{name}.npy', mmap_mode=mmap_mode))
+        shape = (len(self.query_ids), len(self.target_ids))
+        self.scores = (np.memmap(self.path / 'scores.f16', dtype='<f2', mode='r', shape=shape)
+                       if shape[0] * shape[1] else np.empty(shape, dtype='<f2'))
+
+    @classmethod
+    def from_table(cls, table: Union[str, Path], path: Union[str, Path], k: int = DEFAULT_TOP_K,
+                   metadata: Optional[Dict[str, Any]] = None) -> 'NblastMatrix':
+        """Stream a wide NBLAST table into the float16 matrix and top-k table
+
+        Only one chunk of rows is in memory at a time. A neuron's score against
+        itself is left out of its neighbours.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        query_ids, top_targets, top_scores = [], [], []
+        target_ids = np.empty(0, dtype=np.int64)
+
+        with open(path / 'scores.f16', 'wb') as f:
+            for queries, target_ids, scores in iter_score_rows(table):
+                f.write(scores.astype('<f2').tobytes())
+
+                scores[_self_matches(queries, target_ids)] = -np.inf
+                columns, best = rank_top_k(scores, k)
+                query_ids.append(queries)
+                top_targets.append(columns)
+                top_scores.append(best.astype(np.float16))
+                logger.info(f"  🧬 {sum(len(q) for q in query_ids):,} NBLAST rows converted")
+
+        query_ids = np.concatenate(query_ids) if query_ids else np.empty(0, dtype=np.int64)
+        width = min(k, len(target_ids))
+        np.save(path / 'query_ids.npy', query_ids)
+        np.save(path / 'query_order.npy', np.argsort(query_ids, kind='stable'))
+        np.save(path / 'target_ids.npy', target_ids)
+        np.save(path / 'top_targets.npy', np.concatenate(top_targets) if top_targets else np.empty((0, width), np.int32))
+        np.save(path / 'top_scores.npy', np.concatenate(top_scores) if top_scores else np.empty((0, width), np.float16))
+
+        manifest = {
+            'format_version': NBLAST_FORMAT_VERSION,
+            'queries': len(query_ids),
+            'targets': len(target_ids),
+            'top_k': width,
+            'created': datetime.now().isoformat()
+        }
+        manifest.update(metadata or {})
+        with open(path / MANIFEST_NAME, 'w') as f:
+            json.dump(manifest, f)
+        return cls(path, manifest)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> Optional['NblastMatrix']:
+        """Open a converted matrix, None if there is none"""
+        path = Path(path)
+        manifest_file = path / MANIFEST_NAME
+        if not manifest_file.exists():
+            return None
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != NBLAST_FORMAT_VERSION:
+            return None
+
+        matrix = cls(path, manifest, mmap=mmap)
+        logger.info(f"⚡ Loaded NBLAST matrix {path.name} ({len(matrix.query_ids):,} x {len(matrix.target_ids):,})")
+        return matrix
+
+    @property
+    def version(self) -> str:
+        return self.metadata.get('source_sha256', self.path.name)
+
+    @property
+    def top_k(self) -> int:
+        return self.top_targets.shape[1]
+
+    def _row(self, root_id: int) -> int:
+        position = int(np.searchsorted(self.query_ids, root_id, sorter=self.query_order))
+        if position < len(self.query_ids):
+            row = int(self.query_order[position])
+            if self.query_ids[row] == root_id:
+                return row
+        return -1
+
+    def similar(self, root_id: int, k: int = 20, min_score: Optional[float] = None) -> Optional[Dict[str, np.ndarray]]:
+        """The k targets scoring highest against root_id, best first; None if it is not a query neuron
+
+        Served from the top-k table when it is deep enough, otherwise from the
+        neuron's one row of the mapped matrix.
+        """
+        if not 1 <= k <= MAX_SIMILAR:
+            raise ValueError(f"k must be between 1 and {MAX_SIMILAR}")
+        row = self._row(root_id)
+        if row < 0:
+            return None
+
+        if k <= self.top_k:
+            columns = np.asarray(self.top_targets[row, :k])
+            scores = np.asarray(self.top_scores[row, :k]).astype(np.float32)
+        else:
+            ranked = np.asarray(self.scores[row], dtype=np.float32)[np.newaxis]
+            ranked[0, self.target_ids == root_id] = -np.inf
+            columns, scores = rank_top_k(ranked, k)
+            columns, scores = columns[0], scores[0]
+
+        keep = np.isfinite(scores)
+        if min_score is not None:
+            keep &= scores >= min_score
+        return {'root_ids': np.asarray(self.target_ids)[columns[keep]], 'scores': scores[keep]}
+
+
+class NblastStore:
+    """Source-hash keyed NBLAST matrices, converted once per score table"""
+
+    def __init__(self, nblast_dir: Union[str, Path, None] = None, name: str = 'nblast'):
+        self.nblast_dir = Path(nblast_dir or os.environ.get('FLYWIRE_NBLAST_DIR', 'flywire_cache/nblast'))
+        self.name = name
+
+    def matrix_path(self, source_hash: str) -> Path:
+        return self.nblast_dir / f"{self.name}-{source_hash[:16]}"
+
+    def latest(self, mmap: bool = True) -> Optional[NblastMatrix]:
+        """The most recently converted matrix, None if none was converted"""
+        paths = sorted(self.nblast_dir.glob(f"{self.name}-*"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in paths:
+            matrix = NblastMatrix.load(path, mmap=mmap)
+            if matrix is not None:
+                return matrix
+        return None
+
+    def load_or_build(self, source_hash: str, table: Union[str, Path], k: int = DEFAULT_TOP_K) -> NblastMatrix:
+        """Return the matrix for an NBLAST table, converting it on a miss"""
+        path = self.matrix_path(source_hash)
+        matrix = NblastMatrix.load(path)
+        if matrix is not None and matrix.version == source_hash:
+            return matrix
+
+        self.nblast_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.nblast_dir / f".tmp-{path.name}-{os.getpid()}"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        NblastMatrix.from_table(table, tmp_path, k=k,
+                                metadata={'source_sha256': source_hash, 'source_file': Path(table).name})
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process finished the same matrix first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        for other in self.nblast_dir.glob(f"{self.name}-*"):
+            if other != path and other.is_dir():
+                shutil.rmtree(other, ignore_errors=True)
+        logger.info(f"💾 Saved NBLAST matrix {path.name}")
+        return NblastMatrix.load(path)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Neuron Record Builder - Column-wise serialization of FlyWire annotation rows
+Shared by the cloud, local and downloaded-data backends so API neuron dicts
+are emitted in bulk instead of one iterrows() call per neuron
+"""
+
+import itertools
+import logging
+from typing import List, Dict, Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Keys of an API neuron dict, in the order the frontend has always received them
+NEURON_FIELDS = (
+    'id', 'type', 'position', 'soma_position', 'activity', 'mesh_id',
+    'confidence', 'source', 'super_class', 'cell_class', 'side'
+)
+
+POSITION_COLUMNS = ('pos_x', 'pos_y', 'pos_z')
+SOMA_COLUMNS = ('soma_x', 'soma_y', 'soma_z')
+
+# Annotation exports use root_id, CAVE tables use pt_root_id
+ID_COLUMNS = ('root_id', 'pt_root_id')
+
+
+def stack_coordinates(df: pd.DataFrame, columns: Sequence[str] = POSITION_COLUMNS,
+                      fill_missing: bool = True) -> np.ndarray:
+    """Stack coordinate columns into an (N, 3) float64 array
+
+    NaN and missing columns become 0.0 as the API has always reported them,
+    unless fill_missing is False, in which case they stay NaN.
+    """
+    coords = np.full((len(df), len(columns)), np.nan, dtype=np.float64)
+    for axis, column in enumerate(columns):
+        if column in df.columns:
+            coords[:, axis] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    if fill_missing:
+        np.nan_to_num(coords, copy=False, nan=0.0)
+    return coords
+
+
+def root_id_array(df: pd.DataFrame) -> np.ndarray:
+    """Return the neuron ids of a frame as an int64 array"""
+    for column in ID_COLUMNS:
+        if column in df.columns:
+            return pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    return np.zeros(len(df), dtype=np.int64)
+
+
+def label_column(df: pd.DataFrame, column: str, default: str) -> List[str]:
+    """Return a string column as a list with missing values replaced by default"""
+    if column not in df.columns:
+        return [default] * len(df)
+
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Code -1 (missing) indexes the appended default
+        labels = np.append(series.cat.categories.astype(str).to_numpy(dtype=object), default)
+        return labels[series.cat.codes.to_numpy()].tolist()
+
+    values = series.astype(object)
+    return values.where(values.notna(), default).astype(str).tolist()
+
+
+def dictionary_column(df: pd.DataFrame, column: str, default: str) -> Dict[str, Any]:
+    """Dictionary-encode a string column as integer codes into a label list
+
+    Only labels that occur in df are kept; missing values map to default.
+    """
+    if column not in df.columns:
+        return {'codes': np.zeros(len(df), dtype=np.uint8), 'labels': [default]}
+
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        labels = [str(c) for c in series.cat.categories]
+    else:
+        codes, uniques = pd.factorize(series)
+        labels = [str(c) for c in uniques]
+
+    labels.append(default)
+    used, codes = np.unique(np.where(codes < 0, len(labels) - 1, codes), return_inverse=True)
+    dtype = np.min_scalar_type(max(len(used) - 1, 0))
+    return {'codes': codes.astype(dtype), 'labels': [labels[i] for i in used]}
+
+
+def build_neuron_records(df: pd.DataFrame, source: str, default_type: str = 'unknown',
+                         fields: Sequence[str] = NEURON_FIELDS) -> List[Dict[str, Any]]:
+    """Serialize annotation rows into API neuron dicts column by column
+
+    Every requested field is materialized once as a Python list, then the
+    records are assembled with a single zip over those lists.
+    """
+    n_rows = len(df)
+    if n_rows == 0:
+        return []
+
+    ids = root_id_array(df)
+    builders = {
+        'id': lambda: ids.astype(str).tolist(),
+        'type': lambda: label_column(df, 'cell_type', default_type),
+        'position': lambda: stack_coordinates(df, POSITION_COLUMNS).tolist(),
+        'soma_position': lambda: stack_coordinates(df, SOMA_COLUMNS).tolist(),
+        'activity': lambda: itertools.repeat(0.0, n_rows),
+        'mesh_id': lambda: ids.tolist(),
+        'confidence': lambda: itertools.repeat(1.0, n_rows),
+        'source': lambda: itertools.repeat(source, n_rows),
+        'super_class': lambda: label_column(df, 'super_class', 'unknown'),
+        'cell_class': lambda: label_column(df, 'cell_class', 'unknown'),
+        'side': lambda: label_column(df, 'side', 'unknown'),
+    }
+
+    names = [field for field in fields if field in builders]
+    columns = [builders[field]() for field in names]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def build_neuron_columns(df: pd.DataFrame, source: str, default_type: str = 'unknown',
+                         fields: Sequence[str] = NEURON_FIELDS) -> Dict[str, Any]:
+    """Serialize annotation rows as struct-of-arrays for binary responses
+
+    Ids are uint64, coordinates float32 (N, 3) and label columns dictionary
+    encoded; constant fields are sent once instead of per neuron.
+    """
+    ids = root_id_array(df).astype(np.uint64)
+    builders = {
+        'id': lambda: ids,
+        'type': lambda: dictionary_column(df, 'cell_type', default_type),
+        'position': lambda: stack_coordinates(df, POSITION_COLUMNS).astype(np.float32),
+        'soma_position': lambda: stack_coordinates(df, SOMA_COLUMNS).astype(np.float32),
+        'activity': lambda: 0.0,
+        'mesh_id': lambda: ids,
+        'confidence': lambda: 1.0,
+        'source': lambda: source,
+        'super_class': lambda: dictionary_column(df, 'super_class', 'unknown'),
+        'cell_class': lambda: dictionary_column(df, 'cell_class', 'unknown'),
+        'side': lambda: dictionary_column(df, 'side', 'unknown'),
+    }
+
+    columns = {'count': len(df)}
+    columns.update((field, builders[field]()) for field in fields if field in builders)
+    return columns
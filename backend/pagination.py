@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Pagination - Opaque cursors and field projection for neuron listing endpoints
+A cursor records where the next page starts, which query it belongs to and the
+dataset snapshot it was issued against, so a refresh never silently shifts pages
+"""
+
+import base64
+import hashlib
+import json
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from neuron_records import NEURON_FIELDS
+
+MAX_PAGE_SIZE = 5000
+
+
+class CursorError(ValueError):
+    """Raised for malformed cursors or cursors from another query or snapshot"""
+
+
+def _query_key(query: str) -> str:
+    return hashlib.sha1(query.encode()).hexdigest()[:12]
+
+
+def encode_cursor(offset: int, query: str, version: str) -> str:
+    """Opaque token for the page starting at offset"""
+    payload = json.dumps({'o': int(offset), 'q': _query_key(query), 'v': version[:16]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, query: str, version: str) -> int:
+    """Offset encoded in a cursor issued for this query and snapshot"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset = int(payload['o'])
+    except (ValueError, KeyError, TypeError):
+        raise CursorError("Malformed cursor")
+
+    if payload.get('q') != _query_key(query):
+        raise CursorError("Cursor belongs to a different query")
+    if payload.get('v') != version[:16]:
+        raise CursorError("Cursor expired: the dataset was refreshed, restart from the first page")
+    if offset < 0:
+        raise CursorError("Malformed cursor")
+    return offset
+
+
+def paginate(rows: np.ndarray, limit: int, cursor: Optional[str], query: str,
+             version: str) -> Tuple[np.ndarray, Optional[str]]:
+    """Slice one page out of a result row array, returning it with the next cursor"""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    offset = decode_cursor(cursor, query, version) if cursor else 0
+    end = offset + limit
+    next_cursor = encode_cursor(end, query, version) if end < len(rows) else None
+    return rows[offset:end], next_cursor
+
+
+def parse_fields(value: Optional[str]) -> Sequence[str]:
+    """Validate a fields= projection, defaulting to the full neuron record"""
+    if not value:
+        return NEURON_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in NEURON_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(NEURON_FIELDS)}")
+    return fields
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Precomputed Annotations - Circuit somata as Neuroglancer precomputed point layers
+Writes each circuit's soma positions in the sharded precomputed annotation
+format (a spatial index plus an id index, both as neuroglancer_uint64_sharded_v1
+shard files) so the viewer state only carries a precomputed:// URL and the
+browser fetches just the chunks in view, with HTTP range requests
+
+Layout of one export:
+    <annotation_dir>/<name>-<hash>/manifest.json
+    <annotation_dir>/<name>-<hash>/<circuit index>/info
+    <annotation_dir>/<name>-<hash>/<circuit index>/by_id/<shard>.shard
+    <annotation_dir>/<name>-<hash>/<circuit index>/spatial0/<shard>.shard
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANNOTATION_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# Spatial index cell edge in nanometers; FAFB (~1 x 0.5 x 0.3 mm) is a few hundred cells
+DEFAULT_CHUNK_SIZE = (100000.0, 100000.0, 100000.0)
+
+# Roughly this many annotations (or spatial chunks) per minishard
+MINISHARD_TARGET = 64
+MAX_MINISHARD_BITS = 6
+
+# Per point annotation: float32 xyz, then the properties (all 4-byte, so no padding)
+POINT_DTYPE = np.dtype([('point', '<f4', 3), ('confidence', '<f4'), ('cell_type', '<u4')])
+
+
+def sharding_spec(n_keys: int) -> Dict[str, Any]:
+    """neuroglancer_uint64_sharded_v1 spec with about MINISHARD_TARGET keys per minishard"""
+    total_bits = max(0, int(np.ceil(np.log2(max(n_keys, 1) / MINISHARD_TARGET))))
+    minishard_bits = min(total_bits, MAX_MINISHARD_BITS)
+    return {
+        '@type': 'neuroglancer_uint64_sharded_v1',
+        'hash': 'identity',
+        'preshift_bits': 0,
+        'minishard_bits': minishard_bits,
+        'shard_bits': total_bits - minishard_bits,
+        'minishard_index_encoding': 'raw',
+        'data_encoding': 'raw'
+    }
+
+
+def shard_location(key: int, spec: Dict[str, Any]) -> Tuple[int, int]:
+    """(shard, minishard) of a key under an identity-hash sharding spec"""
+    hashed = key >> spec['preshift_bits']
+    minishard = hashed & ((1 << spec['minishard_bits']) - 1)
+    shard = (hashed >> spec['minishard_bits']) & ((1 << spec['shard_bits']) - 1)
+    return shard, minishard
+
+
+def shard_file_name(shard: int, spec: Dict[str, Any]) -> str:
+    return f"{shard:0{(spec['shard_bits'] + 3) // 4}x}.shard"
+
+
+def write_sharded(directory: Path, chunks: Dict[int, bytes], spec: Dict[str, Any]):
+    """Write key -> bytes chunks as shard files
+
+    Each shard starts with its index of [start, end) byte ranges of every
+    minishard index; a minishard's chunks precede its index, which lists
+    delta-coded keys, delta-coded offsets and sizes (offsets are relative to
+    the end of the shard index).
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    shards: Dict[int, Dict[int, List[int]]] = {}
+    for key in sorted(chunks):
+        shard, minishard = shard_location(key, spec)
+        shards.setdefault(shard, {}).setdefault(minishard, []).append(key)
+
+    n_minishards = 1 << spec['minishard_bits']
+    for shard, minishards in shards.items():
+        shard_index = np.zeros((n_minishards, 2), dtype='<u8')
+        body = bytearray()
+        for minishard, keys in sorted(minishards.items()):
+            starts, sizes = [], []
+            for key in keys:
+                starts.append(len(body))
+                sizes.append(len(chunks[key]))
+                body += chunks[key]
+
+            starts, sizes = np.array(starts, dtype=np.uint64), np.array(sizes, dtype=np.uint64)
+            previous_ends = np.concatenate([np.zeros(1, dtype=np.uint64), (starts + sizes)[:-1]])
+            minishard_index = np.stack([
+                np.diff(np.array(keys, dtype=np.uint64), prepend=np.uint64(0)),
+                starts - previous_ends,
+                sizes
+            ]).astype('<u8')
+            shard_index[minishard] = (len(body), len(body) + minishard_index.nbytes)
+            body += minishard_index.tobytes()
+
+        with open(directory / shard_file_name(shard, spec), 'wb') as f:
+            f.write(shard_index.tobytes())
+            f.write(body)
+
+
+def read_sharded(directory: Path, key: int, spec: Dict[str, Any]) -> Optional[bytes]:
+    """One chunk from shard files, the way Neuroglancer fetches it (None if absent)"""
+    shard, minishard = shard_location(key, spec)
+    path = directory / shard_file_name(shard, spec)
+    if not path.exists():
+        return None
+    data = path.read_bytes()
+    data_start = 16 << spec['minishard_bits']
+    start, end = np.frombuffer(data, dtype='<u8', count=2, offset=16 * minishard)
+    if start == end:
+        return None
+    index = np.frombuffer(data[data_start + int(start):data_start + int(end)], dtype='<u8').reshape(3, -1)
+    keys = np.cumsum(index[0])
+    offsets = np.cumsum(index[1] + np.concatenate([np.zeros(1, dtype=np.uint64), index[2][:-1]]))
+    matches = np.flatnonzero(keys == np.uint64(key))
+    if not len(matches):
+        return None
+    offset = data_start + int(offsets[matches[0]])
+    return data[offset:offset + int(index[2][matches[0]])]
+
+
+def compressed_morton_code(cells: np.ndarray, grid_shape: Sequence[int]) -> np.ndarray:
+    """Spatial chunk keys: cell index bits interleaved, skipping exhausted dimensions"""
+    bits = [int(size - 1).bit_length() for size in grid_shape]
+    codes = np.zeros(len(cells), dtype=np.uint64)
+    out_bit = 0
+    for bit in range(max(bits, default=0)):
+        for dim in range(3):
+            if bit < bits[dim]:
+                codes |= ((cells[:, dim].astype(np.uint64) >> np.uint64(bit)) & np.uint64(1)) << np.uint64(out_bit)
+                out_bit += 1
+    return codes
+
+
+def write_point_annotations(path: Path, ids: np.ndarray, positions: np.ndarray, confidence: np.ndarray,
+                            type_codes: np.ndarray, type_labels: Sequence[str],
+                            chunk_size: Sequence[float] = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Write one sharded precomputed point annotation layer and return its info"""
+    ids = np.asarray(ids, dtype=np.uint64)
+    records = np.zeros(len(ids), dtype=POINT_DTYPE)
+    records['point'] = positions
+    records['confidence'] = confidence
+    records['cell_type'] = type_codes
+
+    chunk_size = np.asarray(chunk_size, dtype=np.float64)
+    lower = positions.min(axis=0) if len(ids) else np.zeros(3)
+    upper = positions.max(axis=0) + 1 if len(ids) else np.ones(3)
+    grid_shape = np.maximum(np.ceil((upper - lower) / chunk_size), 1).astype(np.int64)
+
+    # Id index: one encoded annotation per root id (no relationships)
+    by_id = {int(key): record.tobytes() for key, record in zip(ids.tolist(), records)}
+    by_id_spec = sharding_spec(len(by_id))
+    write_sharded(path / 'by_id', by_id, by_id_spec)
+
+    # Spatial index: per cell, a count, the encoded annotations, then their ids
+    cells = np.minimum(np.floor((positions - lower) / chunk_size).astype(np.int64), grid_shape - 1)
+    codes = compressed_morton_code(cells, grid_shape)
+    order = np.argsort(codes, kind='stable')
+    unique_codes, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+    spatial = {
+        int(code): (np.uint64(count).astype('<u8').tobytes() + records[order[start:start + count]].tobytes()
+                    + ids[order[start:start + count]].astype('<u8').tobytes())
+        for code, start, count in zip(unique_codes.tolist(), starts.tolist(), counts.tolist())
+    }
+    spatial_spec = sharding_spec(len(spatial))
+    write_sharded(path / 'spatial0', spatial, spatial_spec)
+
+    info = {
+        '@type': 'neuroglancer_annotations_v1',
+        'dimensions': {axis: [1e-9, 'm'] for axis in 'xyz'},
+        'lower_bound': lower.tolist(),
+        'upper_bound': upper.tolist(),
+        'annotation_type': 'POINT',
+        'properties': [
+            {'id': 'confidence', 'type': 'float32', 'description': 'Cell type annotation confidence'},
+            {'id': 'cell_type', 'type': 'uint32', 'description': 'Cell type',
+             'enum_values': list(range(len(type_labels))), 'enum_labels': [str(label) for label in type_labels]}
+        ],
+        'relationships': [],
+        'by_id': {'key': 'by_id', 'sharding': by_id_spec},
+        'spatial': [{
+            'key': 'spatial0',
+            'grid_shape': grid_shape.tolist(),
+            'chunk_size': chunk_size.tolist(),
+            'limit': int(counts.max()) if len(counts) else 1,
+            'sharding': spatial_spec
+        }]
+    }
+    (path / 'info').write_text(json.dumps(info))
+    return info
+
+
+def circuits_fingerprint(circuits: Sequence[Dict[str, Any]]) -> str:
+    """sha256 of what an export contains: circuit names and neuron ids, types, positions"""
+    digest = hashlib.sha256(f"v{ANNOTATION_FORMAT_VERSION}".encode())
+    for circuit in circuits:
+        digest.update(f"\n{circuit['name']}".encode())
+        for neuron in circuit['neurons']:
+            digest.update(f"|{neuron['id']}:{neuron['type']}:{neuron['position']}:"
+                          f"{neuron.get('confidence', 1.0)}".encode())
+    return digest.hexdigest()
+
+
+class AnnotationStore:
+    """Exports of circuit somata as precomputed annotation layers, one per circuit set"""
+
+    def __init__(self, annotation_dir: Union[str, Path, None] = None, name: str = 'circuits'):
+        self.annotation_dir = Path(annotation_dir or os.environ.get('FLYWIRE_ANNOTATION_DIR',
+                                                                    'flywire_cache/annotations'))
+        self.name = name
+
+    def export_path(self, circuits_hash: str) -> Path:
+        return self.annotation_dir / f"{self.name}-{circuits_hash[:16]}"
+
+    def load_or_build(self, circuits: Sequence[Dict[str, Any]],
+                      chunk_size: Sequence[float] = DEFAULT_CHUNK_SIZE) -> Path:
+        """Directory of the export for these circuits, writing it on a miss
+
+        Circuit i is the layer in subdirectory str(i).
+        """
+        circuits_hash = circuits_fingerprint(circuits)
+        path = self.export_path(circuits_hash)
+        if (path / MANIFEST_NAME).exists():
+            return path
+
+        self.annotation_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.annotation_dir / f".tmp-{path.name}-{os.getpid()}"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+
+        layers = []
+        for index, circuit in enumerate(circuits):
+            neurons = circuit['neurons']
+            types = sorted({neuron['type'] for neuron in neurons})
+            type_index = {cell_type: code for code, cell_type in enumerate(types)}
+            write_point_annotations(
+                tmp_path / str(index),
+                ids=np.array([int(neuron['id']) for neuron in neurons], dtype=np.uint64),
+                positions=np.array([neuron['position'] for neuron in neurons], dtype=np.float64).reshape(-1, 3),
+                confidence=np.array([neuron.get('confidence', 1.0) for neuron in neurons], dtype=np.float32),
+                type_codes=np.array([type_index[neuron['type']] for neuron in neurons], dtype=np.uint32),
+                type_labels=types,
+                chunk_size=chunk_size
+            )
+            layers.append({'layer': str(index), 'name': circuit['name'], 'annotations': len(neurons)})
+
+        (tmp_path / MANIFEST_NAME).write_text(json.dumps({
+            'format_version': ANNOTATION_FORMAT_VERSION,
+            'circuits_sha256': circuits_hash,
+            'created': datetime.now().isoformat(),
+            'layers': layers
+        }, indent=2))
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process finished the same export first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        for other in self.annotation_dir.glob(f"{self.name}-*"):
+            if other != path and other.is_dir():
+                shutil.rmtree(other, ignore_errors=True)
+        logger.info(f"💾 Saved annotation export {path.name} ({len(layers)} layers)")
+        return path
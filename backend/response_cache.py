@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Response Cache - Strong ETags, 304s and compressed bodies for dataset-backed endpoints
+A cached endpoint's body only depends on the dataset snapshot and the request, so
+its ETag is derived from those without running the view, and the serialized (and
+compressed) bytes are kept until the snapshot changes
+"""
+
+import functools
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from flask import Flask, Response, g, make_response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/msgpack', 'text/html', 'text/plain', 'text/csv')
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class ResponseCache:
+    """Per-(endpoint, params, snapshot) response bytes with conditional GET support
+
+    version returns the current snapshot version, or None when nothing is
+    loaded yet; cached views then run uncached.
+    """
+
+    def __init__(self, version: Callable[[], Optional[str]], max_entries: int = 256,
+                 min_compress_size: int = 1024):
+        self.version = version
+        self.max_entries = max_entries
+        self.min_compress_size = min_compress_size
+        self.encodings = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+        self._entries: 'OrderedDict[str, dict]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        """Compress every large enough response of the app"""
+        app.after_request(self.compress)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _etag(self) -> Optional[str]:
+        try:
+            version = self.version()
+        except Exception as e:
+            logger.warning(f"Response cache bypassed, no dataset version: {e}")
+            return None
+        if version is None:
+            return None
+
+        key = repr((
+            version, request.path, sorted(request.args.items(multi=True)),
+            request.headers.get('Accept', '')
+        ))
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    def _content_encoding(self, mimetype: str, length: Optional[int]) -> Optional[str]:
+        """Encoding compress() applies to a body of this request, None to send it as is"""
+        if mimetype not in COMPRESSIBLE_MIMETYPES:
+            return None
+        if length is not None and length < self.min_compress_size:
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _not_modified(self, entry: dict, etag: str) -> Optional[Response]:
+        """304 carrying the ETag and Vary headers of the 200 it stands in for, if the client has that tag"""
+        encoding = self._content_encoding(entry['mimetype'], len(entry['body']))
+        tag = f"{etag}-{encoding}" if encoding else etag
+        if not request.if_none_match.contains(tag):
+            return None
+
+        response = Response(status=304, headers=entry['headers'])
+        if entry['mimetype'] in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(tag)
+        return response
+
+    def cached(self, view: Callable) -> Callable:
+        """Decorate a GET view whose output is fully determined by the snapshot and request"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = self._etag() if request.method == 'GET' else None
+            if etag is None:
+                return view(*args, **kwargs)
+
+            with self._lock:
+                entry = self._entries.get(etag)
+                if entry is not None:
+                    self._entries.move_to_end(etag)
+
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                entry = {
+                    'body': response.get_data(),
+                    'mimetype': response.mimetype,
+                    'headers': [(k, v) for k, v in response.headers if k.lower() == 'vary'],
+                    'encoded': {}
+                }
+                with self._lock:
+                    self._entries[etag] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+            # Revalidation only matches the tag of the encoding this request would get
+            not_modified = self._not_modified(entry, etag)
+            if not_modified is not None:
+                return not_modified
+
+            response = Response(entry['body'], status=200, mimetype=entry['mimetype'], headers=entry['headers'])
+            response.set_etag(etag)
+            g.response_cache_entry = entry
+            return response
+
+        return wrapper
+
+    def compress(self, response: Response) -> Response:
+        """after_request hook: gzip/brotli-encode large bodies the client accepts"""
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._content_encoding(response.mimetype, response.content_length)
+        if encoding is None:
+            return response
+
+        entry = g.get('response_cache_entry')
+        if entry is not None and encoding in entry['encoded']:
+            body = entry['encoded'][encoding]
+        else:
+            body = _compress(response.get_data(), encoding)
+            if entry is not None:
+                entry['encoded'][encoding] = body
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak=weak)
+        return response
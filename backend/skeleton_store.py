@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Skeleton Store - Packed, memory-mapped neuron skeletons at several levels of detail
+Ingests SWC files or neuroglancer precomputed skeletons (a directory or .zip, as
+in the Schlegel et al. Zenodo release) into one binary file per level of detail.
+Each neuron is a contiguous block located through a sorted root_id index, so
+serving a skeleton is a binary search and a single read from the mapped file
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+logger = logging.getLogger(__name__)
+
+SKELETON_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+INDEX_ARRAYS = ('root_ids', 'node_offsets', 'node_counts')
+
+# Cable length between kept nodes at each level of detail, in skeleton units
+# (nanometers for FlyWire); 0 keeps every node
+DEFAULT_LOD_SPACINGS = (0, 500, 2000, 8000)
+
+# Per node within a neuron's block: float32 xyz, then float32 radius, then int32 parent
+NODE_BYTES = 12 + 4 + 4
+
+Skeleton = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _iter_members(path: Path, suffix: Optional[str]) -> Iterator[Tuple[str, bytes]]:
+    """(file name, contents) of the files in a directory or zip archive"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = Path(info.filename).name
+                if not info.is_dir() and (suffix is None or name.endswith(suffix)):
+                    yield name, archive.read(info)
+    else:
+        for file in sorted(path.rglob('*')):
+            if file.is_file() and (suffix is None or file.name.endswith(suffix)):
+                yield file.name, file.read_bytes()
+
+
+def _root_id_from_name(name: str) -> Optional[int]:
+    stem = name.split('.', 1)[0]
+    return int(stem) if stem.isdigit() else None
+
+
+def _tree_order(n: int, children: np.ndarray, parents: np.ndarray,
+                roots: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Breadth-first node order and parent indexes (in that order, -1 for roots)
+
+    Every connected fragment is rooted at its entry in roots, or at its first
+    node; cycles in malformed input are broken by the traversal.
+    """
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    graph = sparse.coo_matrix((np.ones(len(children)), (children, parents)), shape=(n + 1, n + 1)).tocsr()
+    if roots is None or len(roots) == 0:
+        _, labels = csgraph.connected_components(graph[:n, :n], directed=False)
+        _, roots = np.unique(labels, return_index=True)
+
+    # A virtual node above every fragment root makes the forest one traversal
+    links = sparse.coo_matrix((np.ones(len(roots)), (np.full(len(roots), n), roots)), shape=(n + 1, n + 1))
+    order, predecessors = csgraph.breadth_first_order(graph + links.tocsr(), n, directed=False,
+                                                      return_predecessors=True)
+    order = order[1:]
+
+    position = np.empty(n + 1, dtype=np.int64)
+    position[order] = np.arange(len(order))
+    parent = predecessors[order]
+    return order, np.where(parent == n, -1, position[np.maximum(parent, 0)]).astype(np.int32)
+
+
+def parse_swc(data: bytes) -> Skeleton:
+    """Vertices, radii and breadth-first parent indexes of an SWC file"""
+    table = np.loadtxt(io.BytesIO(data), comments='#', ndmin=2)
+    if len(table) == 0:
+        return np.empty((0, 3), np.float32), np.empty(0, np.float32), np.empty(0, np.int32)
+    node_ids = table[:, 0].astype(np.int64)
+    parent_ids = table[:, 6].astype(np.int64)
+
+    sorter = np.argsort(node_ids)
+    positions = np.clip(np.searchsorted(node_ids, parent_ids, sorter=sorter), 0, len(node_ids) - 1)
+    parent_index = sorter[positions]
+    has_parent = node_ids[parent_index] == parent_ids
+
+    children = np.flatnonzero(has_parent)
+    order, parents = _tree_order(len(table), children, parent_index[has_parent], roots=np.flatnonzero(~has_parent))
+    return table[order, 2:5].astype(np.float32), table[order, 5].astype(np.float32), parents
+
+
+def parse_precomputed(data: bytes, vertex_attributes: Sequence[Dict[str, Any]] = ()) -> Skeleton:
+    """Vertices, radii and breadth-first parent indexes of a neuroglancer precomputed skeleton"""
+    n_vertices, n_edges = np.frombuffer(data, dtype='<u4', count=2)
+    offset = 8
+    vertices = np.frombuffer(data, dtype='<f4', count=3 * n_vertices, offset=offset).reshape(-1, 3)
+    offset += 12 * n_vertices
+    edges = np.frombuffer(data, dtype='<u4', count=2 * n_edges, offset=offset).reshape(-1, 2).astype(np.int64)
+    offset += 8 * n_edges
+
+    radius = np.zeros(n_vertices, dtype=np.float32)
+    for attribute in vertex_attributes:
+        dtype = np.dtype(attribute['data_type']).newbyteorder('<')
+        width = attribute.get('num_components', 1)
+        values = np.frombuffer(data, dtype=dtype, count=n_vertices * width, offset=offset)
+        offset += values.nbytes
+        if attribute['id'] == 'radius':
+            radius = values.astype(np.float32)
+
+    order, parents = _tree_order(int(n_vertices), edges[:, 0], edges[:, 1])
+    return vertices[order].astype(np.float32), radius[order], parents
+
+
+def iter_skeletons(source: Union[str, Path]) -> Iterator[Tuple[int, Skeleton]]:
+    """(root_id, skeleton) pairs from SWC files or precomputed skeletons
+
+    source is a directory or zip archive of <root_id>.swc files, or of an
+    unsharded precomputed skeleton layer (an info file plus one file per root_id).
+    """
+    source = Path(source)
+    info = dict(_iter_members(source, 'info')).get('info')
+    if info is not None:
+        info = json.loads(info)
+        if info.get('sharding'):
+            raise ValueError("Sharded precomputed skeletons are not supported; export them unsharded or as SWC")
+        attributes = info.get('vertex_attributes', [])
+        for name, data in _iter_members(source, None):
+            root_id = _root_id_from_name(name)
+            if root_id is not None:
+                yield root_id, parse_precomputed(data, attributes)
+    else:
+        for name, data in _iter_members(source, '.swc'):
+            root_id = _root_id_from_name(name)
+            if root_id is not None:
+                yield root_id, parse_swc(data)
+
+
+def cable_distance(vertices: np.ndarray, parents: np.ndarray) -> np.ndarray:
+    """Path length from each node to its root, by pointer jumping over the parent array"""
+    has_parent = parents >= 0
+    distance = np.zeros(len(parents), dtype=np.float64)
+    distance[has_parent] = np.linalg.norm(vertices[has_parent] - vertices[parents[has_parent]], axis=1)
+
+    ancestor = parents.astype(np.int64)
+    live = ancestor >= 0
+    while live.any():
+        distance[live] += distance[ancestor[live]]
+        ancestor[live] = ancestor[ancestor[live]]
+        live = ancestor >= 0
+    return distance
+
+
+def downsample(skeleton: Skeleton, spacing: float) -> Skeleton:
+    """Keep roots, branch points, leaves and one node per `spacing` of cable in between"""
+    vertices, radius, parents = skeleton
+    if spacing <= 0 or len(parents) == 0:
+        return skeleton
+
+    n = len(parents)
+    child_count = np.bincount(parents[parents >= 0], minlength=n)
+    bucket = np.floor(cable_distance(vertices, parents) / spacing)
+    keep = (parents < 0) | (child_count != 1)
+    keep[parents >= 0] |= bucket[parents >= 0] != bucket[parents[parents >= 0]]
+
+    # Nearest kept ancestor-or-self of every node; roots are kept, so jumping ends
+    nearest = np.where(keep, np.arange(n), parents)
+    while True:
+        jumped = nearest[nearest]
+        if np.array_equal(jumped, nearest):
+            break
+        nearest = jumped
+
+    kept = np.flatnonzero(keep)
+    new_index = np.cumsum(keep) - 1
+    kept_parents = parents[kept]
+    new_parents = np.where(kept_parents >= 0, new_index[nearest[np.maximum(kept_parents, 0)]], -1)
+    return vertices[kept], radius[kept], new_parents.astype(np.int32)
+
+
+def source_fingerprint(source: Union[str, Path]) -> str:
+    """sha256 of a skeleton archive, or of a directory's file names and sizes"""
+    source = Path(source)
+    digest = hashlib.sha256()
+    if source.is_dir():
+        for file in sorted(source.rglob('*')):
+            if file.is_file():
+                digest.update(f"{file.relative_to(source)}:{file.stat().st_size}\n".encode())
+    else:
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class PackedSkeletons:
+    """Skeletons of many neurons at several levels of detail, one mapped file per level"""
+
+    def __init__(self, path: Path, manifest: Dict[str, Any], mmap: bool = True):
+        self.path = Path(path)
+        self.metadata = manifest
+        self.lod_spacings = tuple(manifest['lod_spacings'])
+        mmap_mode = 'r' if mmap else None
+        for name in INDEX_ARRAYS:
+            setattr(self, name, np.load(self.path / f'{name}.npy', mmap_mode=mmap_mode))
+        self._levels = [
+            np.memmap(self.path / f'lod{lod}.bin', dtype=np.uint8, mode='r')
+            if manifest['lod_nodes'][lod] else np.empty(0, dtype=np.uint8)
+            for lod in range(len(self.lod_spacings))
+        ]
+
+    @classmethod
+    def build(cls, skeletons: Iterable[Tuple[int, Skeleton]], path: Union[str, Path],
+              lod_spacings: Sequence[float] = DEFAULT_LOD_SPACINGS,
+              metadata: Optional[Dict[str, Any]] = None) -> 'PackedSkeletons':
+        """Downsample and append each skeleton to the level files, then write the index"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        root_ids, offsets, counts = [], [], []
+        written = [0] * len(lod_spacings)
+
+        files = [open(path / f'lod{lod}.bin', 'wb') for lod in range(len(lod_spacings))]
+        try:
+            for root_id, skeleton in skeletons:
+                neuron_offsets, neuron_counts = [], []
+                for lod, spacing in enumerate(lod_spacings):
+                    vertices, radius, parents = downsample(skeleton, spacing)
+                    files[lod].write(np.ascontiguousarray(vertices, dtype='<f4').tobytes())
+                    files[lod].write(np.ascontiguousarray(radius, dtype='<f4').tobytes())
+                    files[lod].write(np.ascontiguousarray(parents, dtype='<i4').tobytes())
+                    neuron_offsets.append(written[lod])
+                    neuron_counts.append(len(parents))
+                    written[lod] += len(parents)
+                root_ids.append(root_id)
+                offsets.append(neuron_offsets)
+                counts.append(neuron_counts)
+        finally:
+            for f in files:
+                f.close()
+
+        n_lods = len(lod_spacings)
+        root_ids = np.array(root_ids, dtype=np.int64)
+        order = np.argsort(root_ids, kind='stable')
+        np.save(path / 'root_ids.npy', root_ids[order])
+        np.save(path / 'node_offsets.npy', np.array(offsets, dtype=np.int64).reshape(-1, n_lods)[order])
+        np.save(path / 'node_counts.npy', np.array(counts, dtype=np.int32).reshape(-1, n_lods)[order])
+
+        manifest = {
+            'format_version': SKELETON_FORMAT_VERSION,
+            'neurons': len(root_ids),
+            'lod_spacings': list(lod_spacings),
+            'lod_nodes': written,
+            'created': datetime.now().isoformat()
+        }
+        manifest.update(metadata or {})
+        with open(path / MANIFEST_NAME, 'w') as f:
+            json.dump(manifest, f)
+        logger.info(f"🦴 Packed {len(root_ids):,} skeletons, {written[0]:,} nodes at full detail")
+        return cls(path, manifest)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> Optional['PackedSkeletons']:
+        """Open a packed store, None if there is none"""
+        path = Path(path)
+        manifest_file = path / MANIFEST_NAME
+        if not manifest_file.exists():
+            return None
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != SKELETON_FORMAT_VERSION:
+            return None
+
+        skeletons = cls(path, manifest, mmap=mmap)
+        logger.info(f"⚡ Loaded skeleton store {path.name} ({len(skeletons):,} neurons, "
+                    f"{len(skeletons.lod_spacings)} levels of detail)")
+        return skeletons
+
+    def __len__(self) -> int:
+        return len(self.root_ids)
+
+    @property
+    def version(self) -> str:
+        return self.metadata.get('source_sha256', self.path.name)
+
+    def __contains__(self, root_id: int) -> bool:
+        return self._row(root_id) >= 0
+
+    def _row(self, root_id: int) -> int:
+        row = int(np.searchsorted(self.root_ids, root_id))
+        return row if row < len(self.root_ids) and self.root_ids[row] == root_id else -1
+
+    def skeleton(self, root_id: int, lod: int = 0) -> Optional[Dict[str, Any]]:
+        """Vertices (N x 3), radius and parent index (-1 for roots) of one neuron, None if absent
+
+        The arrays are read-only views of the mapped level file.
+        """
+        if not 0 <= lod < len(self.lod_spacings):
+            raise ValueError(f"lod must be between 0 and {len(self.lod_spacings) - 1}")
+        row = self._row(root_id)
+        if row < 0:
+            return None
+
+        n = int(self.node_counts[row, lod])
+        start = int(self.node_offsets[row, lod]) * NODE_BYTES
+        block = self._levels[lod][start:start + n * NODE_BYTES]
+        return {
+            'vertices': block[:12 * n].view('<f4').reshape(n, 3),
+            'radius': block[12 * n:16 * n].view('<f4'),
+            'parents': block[16 * n:].view('<i4'),
+            'lod': lod,
+            'spacing': self.lod_spacings[lod]
+        }
+
+
+class SkeletonStore:
+    """Source-fingerprint keyed skeleton stores, built once per skeleton release"""
+
+    def __init__(self, skeleton_dir: Union[str, Path, None] = None, name: str = 'skeletons'):
+        self.skeleton_dir = Path(skeleton_dir or os.environ.get('FLYWIRE_SKELETON_DIR', 'flywire_cache/skeletons'))
+        self.name = name
+
+    def store_path(self, source_hash: str) -> Path:
+        return self.skeleton_dir / f"{self.name}-{source_hash[:16]}"
+
+    def latest(self, mmap: bool = True) -> Optional[PackedSkeletons]:
+        """The most recently built store, None if none was built"""
+        paths = sorted(self.skeleton_dir.glob(f"{self.name}-*"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in paths:
+            skeletons = PackedSkeletons.load(path, mmap=mmap)
+            if skeletons is not None:
+                return skeletons
+        return None
+
+    def load_or_build(self, source_hash: str, source: Union[str, Path],
+                      lod_spacings: Sequence[float] = DEFAULT_LOD_SPACINGS) -> PackedSkeletons:
+        """Return the store for a skeleton release, packing it on a miss"""
+        path = self.store_path(source_hash)
+        skeletons = PackedSkeletons.load(path)
+        if skeletons is not None and skeletons.version == source_hash:
+            return skeletons
+
+        self.skeleton_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.skeleton_dir / f".tmp-{path.name}-{os.getpid()}"
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        PackedSkeletons.build(iter_skeletons(source), tmp_path, lod_spacings=lod_spacings,
+                              metadata={'source_sha256': source_hash, 'source_file': Path(source).name})
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process finished the same store first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        for other in self.skeleton_dir.glob(f"{self.name}-*"):
+            if other != path and other.is_dir():
+                shutil.rmtree(other, ignore_errors=True)
+        logger.info(f"💾 Saved skeleton store {path.name}")
+        return PackedSkeletons.load(path)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Neuron Spatial Index - KD-trees over the annotation table coordinates
+Answers nearest-neighbour and bounding-box queries on soma or pos_* points
+without scanning the whole table. Coordinates are in the units of the
+annotation table (FlyWire voxels of 4x4x40 nm).
+"""
+
+import logging
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from neuron_records import POSITION_COLUMNS, SOMA_COLUMNS, stack_coordinates
+
+logger = logging.getLogger(__name__)
+
+# Query spaces and the annotation columns they index
+COORDINATE_SPACES = {
+    'soma': SOMA_COLUMNS,
+    'position': POSITION_COLUMNS
+}
+
+
+class NeuronSpatialIndex:
+    """One KD-tree per coordinate space, holding only rows with complete coordinates"""
+
+    def __init__(self, df: pd.DataFrame):
+        self._rows: Dict[str, np.ndarray] = {}
+        self._coords: Dict[str, np.ndarray] = {}
+        self._trees: Dict[str, cKDTree] = {}
+
+        for space, columns in COORDINATE_SPACES.items():
+            coords = stack_coordinates(df, columns, fill_missing=False)
+            valid = np.isfinite(coords).all(axis=1)
+            self._rows[space] = np.flatnonzero(valid)
+            self._coords[space] = coords[valid]
+            self._trees[space] = cKDTree(self._coords[space])
+            logger.info(f"📍 Spatial index '{space}': {int(valid.sum()):,} of {len(df):,} neurons")
+
+    def _space(self, space: str) -> str:
+        if space not in self._trees:
+            raise ValueError(f"Unknown coordinate space '{space}', expected one of {sorted(self._trees)}")
+        return space
+
+    def nearest(self, point: Sequence[float], k: int = 10, space: str = 'soma',
+                max_distance: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the k nearest neurons to point, with their distances, closest first"""
+        space = self._space(space)
+        tree = self._trees[space]
+        k = max(0, min(int(k), tree.n))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        distances, positions = tree.query(np.asarray(point, dtype=np.float64), k=k,
+                                          distance_upper_bound=max_distance)
+        distances = np.atleast_1d(distances)
+        positions = np.atleast_1d(positions)
+        found = np.isfinite(distances)
+        return self._rows[space][positions[found]], distances[found]
+
+    def within_box(self, lower: Sequence[float], upper: Sequence[float], space: str = 'soma') -> np.ndarray:
+        """Rows inside the axis-aligned box [lower, upper], in table order"""
+        space = self._space(space)
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        if np.any(upper < lower):
+            raise ValueError("Region upper corner must not be below the lower corner")
+
+        # Chebyshev ball around the box centre, then trim to the exact box
+        center = (lower + upper) / 2
+        radius = float(np.max(upper - lower) / 2)
+        candidates = np.asarray(self._trees[space].query_ball_point(center, r=radius, p=np.inf), dtype=np.int64)
+        if len(candidates) == 0:
+            return candidates
+
+        coords = self._coords[space][candidates]
+        inside = np.all((coords >= lower) & (coords <= upper), axis=1)
+        return np.sort(self._rows[space][candidates[inside]])
@@ -4,6 +4,7 @@ import numpy as np
 from scipy import stats
 import pandas as pd
 from statsmodels.stats.diagnostic import normal_ad
+import gzip
 import logging
 import os
 import requests
@@ -15,6 +16,35 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ====== RESPONSE ENCODING ======
+MIN_COMPRESS_SIZE = 1024
+
+@app.after_request
+def encode_response(response):
+    """Content-hash ETags for GET responses and gzip for large JSON bodies"""
+    if response.direct_passthrough or response.status_code != 200 or response.mimetype != 'application/json':
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if request.method == 'GET':
+        # Clients revalidate with the tag they were sent, plain or -gzip
+        response.add_etag()
+        etag, _ = response.get_etag()
+        matched = next((tag for tag in request.if_none_match.as_set() if tag in (etag, f"{etag}-gzip")), None)
+        if matched:
+            response.set_etag(matched)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if len(response.get_data()) >= MIN_COMPRESS_SIZE and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-gzip", weak=weak)
+    return response
+
 # ====== NEUROGLANCER INTEGRATION ======
 class FlyWireService:
     """Simplified FlyWire data service for circuit visualization"""
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Test the stats service response encoding
+Checks that GET responses revalidate to 304 with either the plain ETag or the
+-gzip ETag of a compressed response
+"""
+
+import gzip
+
+import app
+
+
+def test_gzip_etag_revalidates_to_304():
+    app.MIN_COMPRESS_SIZE = 0
+    client = app.app.test_client()
+
+    first = client.get('/api/circuits/search', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200 and first.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(first.data)
+    etag = first.headers['ETag']
+    assert etag.endswith('-gzip"'), etag
+
+    again = client.get('/api/circuits/search', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert again.status_code == 304 and not again.data
+    assert again.headers['ETag'] == etag
+
+    plain = client.get('/api/circuits/search')
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    assert client.get('/api/circuits/search', headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+    stale = client.get('/api/circuits/search', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"other-gzip"'})
+    assert stale.status_code == 200
+    print(f"✅ {etag} revalidates to 304")
+
+
+if __name__ == "__main__":
+    print("🧪 STATS SERVICE RESPONSE TESTS")
+    print("=" * 50)
+    test_gzip_etag_revalidates_to_304()
+    print("\n🎉 All stats service response tests passed!")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test the coalescing activity scheduler
+Checks that bursts of FEM samples collapse to one update per session per tick,
+that latency stays within a couple of ticks under bursty posting, and that the
+activity endpoint answers immediately with a tick number - no FlyWire connection needed
+"""
+
+import time
+
+import flywire_neuroglancer
+from activity_scheduler import ActivityScheduler
+from test_cave_queries import OfflineNeuroglancerService
+
+
+def test_burst_is_coalesced_per_session():
+    applied = []
+    scheduler = ActivityScheduler(applied.append, tick_hz=30, autostart=False)
+
+    ticks = {scheduler.submit({'timestamp': t}, session='a') for t in range(50)}
+    scheduler.submit({'timestamp': 7}, session='b')
+    assert ticks == {1}
+    assert scheduler.tick() == 1
+    assert sorted(sample['timestamp'] for sample in applied) == [7, 49]
+
+    stats = scheduler.stats()
+    assert stats['submitted'] == 51 and stats['applied'] == 2 and stats['coalesced'] == 49, stats
+    assert scheduler.tick() == 2 and len(applied) == 2
+    print(f"✅ 51 samples applied as {len(applied)} updates")
+
+
+def test_too_many_sessions_are_dropped():
+    scheduler = ActivityScheduler(lambda fem_data: None, max_sessions=2, autostart=False)
+    scheduler.submit({}, session='a')
+    scheduler.submit({}, session='b')
+    try:
+        scheduler.submit({}, session='c')
+        assert False, "third session should be dropped"
+    except OverflowError:
+        pass
+    scheduler.submit({}, session='a')
+    assert scheduler.stats()['dropped'] == 1 and scheduler.stats()['coalesced'] == 1
+    print("✅ Samples beyond the session limit are dropped")
+
+
+def test_latency_bounded_under_bursts():
+    def slow_apply(fem_data):
+        time.sleep(0.01)
+
+    scheduler = ActivityScheduler(slow_apply, tick_hz=30)
+    started = time.monotonic()
+    for burst in range(10):
+        for sample in range(100):
+            scheduler.submit({'timestamp': burst * 100 + sample}, session=f"s{sample % 3}")
+        time.sleep(0.05)
+    time.sleep(0.1)
+    scheduler.stop()
+
+    stats = scheduler.stats()
+    assert stats['pending_sessions'] == 0
+    assert stats['applied'] + stats['coalesced'] == stats['submitted'] == 1000, stats
+    assert stats['max_latency_ms'] < 3 * 1000 / 30 + 20, stats
+    assert stats['ticks'] <= (time.monotonic() - started) * 30 + 1, stats
+    print(f"✅ {stats['submitted']} samples in {stats['ticks']} ticks, "
+          f"max latency {stats['max_latency_ms']} ms")
+
+
+def test_activity_endpoint_returns_tick():
+    service = OfflineNeuroglancerService()
+    service.search_chrimson_circuits()
+    flywire_neuroglancer.flywire_service = service
+    client = flywire_neuroglancer.app.test_client()
+    try:
+        response = client.post('/api/activity/update', json={'optogeneticStimulus': True, 'timestamp': 11.5},
+                               headers={'X-Session-Id': 'larva-1'})
+        assert response.status_code == 200 and response.get_json()['tick'] >= 1, response.get_json()
+        assert client.post('/api/activity/update', data='nope').status_code == 400
+
+        deadline = time.monotonic() + 1
+        while service.activity_scheduler.stats()['applied'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        circuits = client.get('/api/circuits/current').get_json()['circuits']
+        assert circuits[1]['neurons'][0]['activity'] == 0.8
+        assert client.get('/api/activity/stats').get_json()['scheduler']['applied'] == 1
+    finally:
+        service.activity_scheduler.stop()
+        flywire_neuroglancer.flywire_service = None
+    print("✅ Activity endpoint queues samples and returns the tick")
+
+
+if __name__ == "__main__":
+    print("🧪 ACTIVITY SCHEDULER TESTS")
+    print("=" * 50)
+    test_burst_is_coalesced_per_session()
+    test_too_many_sessions_are_dropped()
+    test_latency_bounded_under_bursts()
+    test_activity_endpoint_returns_tick()
+    print("\n🎉 All activity scheduler tests passed!")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test the server-sent activity stream
+Checks that one activity computation reaches every subscriber as compact uint8
+frames, that unchanged circuits are not resent, and that /api/activity/stream
+speaks SSE - no FlyWire connection needed
+"""
+
+import base64
+import json
+import threading
+import time
+
+import flywire_neuroglancer
+from activity_stream import ActivityBroadcaster, sse_event
+from test_cave_queries import OfflineNeuroglancerService
+
+
+def parse_event(text):
+    fields = dict(line.split(': ', 1) for line in text.strip().splitlines())
+    return fields['event'], json.loads(fields['data'])
+
+
+def drain(subscription):
+    events = []
+    while True:
+        event = subscription.get(timeout=0)
+        if event is None:
+            return [parse_event(event) for event in events]
+        events.append(event)
+
+
+def test_frames_reach_every_subscriber():
+    service = OfflineNeuroglancerService()
+    circuits = service.search_chrimson_circuits()
+    first, second = service.subscribe_activity(), service.subscribe_activity()
+
+    kinds = [kind for kind, _ in drain(first)]
+    assert kinds == ['circuits', 'activity', 'activity', 'activity'], kinds
+    drain(second)
+
+    service.update_circuit_activity({'optogeneticStimulus': True, 'timestamp': 11.5})
+    frames = drain(first)
+    assert frames == drain(second)
+    assert [data['circuit'] for _, data in frames] == [0, 1, 2]
+
+    photoreceptors = base64.b64decode(frames[1][1]['activity'])
+    assert len(photoreceptors) == len(circuits[1]['neurons'])
+    assert set(photoreceptors) == {round(0.8 * 255)}
+
+    # Force alone leaves photoreceptors untouched, so only two circuits are resent
+    service.update_circuit_activity({'optogeneticStimulus': True, 'timestamp': 11.5,
+                                     'femParameters': {'mechanicalForce': 0.1}})
+    assert [data['circuit'] for _, data in drain(first)] == [0, 2]
+    print(f"✅ {service.activity_stream.stats()['frames_published']} frames fanned out to 2 subscribers")
+
+
+def test_slow_subscriber_drops_oldest_frames():
+    broadcaster = ActivityBroadcaster(backlog=2)
+    subscription = broadcaster.subscribe()
+    for generation in range(5):
+        broadcaster.reset([])
+    assert [data['generation'] for _, data in drain(subscription)] == [4, 5]
+    assert subscription.dropped == 3
+    broadcaster.unsubscribe(subscription)
+    assert not broadcaster.has_subscribers()
+    print("✅ Slow subscribers keep only the newest frames")
+
+
+def test_subscribe_sizes_backlog_under_lock():
+    broadcaster = ActivityBroadcaster(backlog=2)
+    broadcaster.reset([{'name': f'circuit {i}', 'neurons': [{}]} for i in range(5)])
+    subscriptions = []
+    thread = threading.Thread(target=lambda: subscriptions.append(broadcaster.subscribe()))
+
+    # A publish holds the lock and adds frames while the new client waits for it
+    with broadcaster._lock:
+        thread.start()
+        time.sleep(0.05)
+        for index in range(5):
+            broadcaster._last_events[index] = sse_event('activity', {'generation': 1, 'circuit': index})
+    thread.join()
+
+    events = drain(subscriptions[0])
+    assert [kind for kind, _ in events] == ['circuits'] + ['activity'] * 5, events
+    assert subscriptions[0].dropped == 0 and broadcaster.stats()['frames_dropped'] == 0
+    print("✅ A new subscriber is primed with the circuit list and every latest frame")
+
+
+def test_stream_endpoint_is_sse():
+    service = OfflineNeuroglancerService()
+    service.search_chrimson_circuits()
+    flywire_neuroglancer.flywire_service = service
+    try:
+        response = flywire_neuroglancer.app.test_client().get('/api/activity/stream')
+        assert response.mimetype == 'text/event-stream'
+        chunks = (chunk.decode() for chunk in response.response)
+        assert parse_event(next(chunks))[0] == 'circuits'
+        kind, data = parse_event(next(chunks))
+        assert kind == 'activity' and data['circuit'] == 0
+        response.close()
+        assert not service.activity_stream.has_subscribers()
+    finally:
+        flywire_neuroglancer.flywire_service = None
+    print("✅ /api/activity/stream serves server-sent events")
+
+
+if __name__ == "__main__":
+    print("🧪 ACTIVITY STREAM TESTS")
+    print("=" * 50)
+    test_frames_reach_every_subscriber()
+    test_slow_subscriber_drops_oldest_frames()
+    test_subscribe_sizes_backlog_under_lock()
+    test_stream_endpoint_is_sse()
+    print("\n🎉 All activity stream tests passed!")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test the columnar annotation snapshot
+Round-trips a synthetic annotation table through the snapshot store and checks
+that categoricals, exact 64-bit ids and missing values survive, that a second
+start reuses the snapshot without parsing and that older snapshots are pruned
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from annotation_snapshot import (AnnotationSnapshotStore, MANIFEST_NAME, file_sha256,
+                                 prepare_annotation_frame)
+
+CELL_TYPES = ['JO-A', 'JO-B', 'jo-e', 'LC10', 'DNp01', 'T4a', 'BM_InOm', 'AN_GNG_1', 'KC_gamma']
+
+
+def synthetic_annotations(n=2000, seed=0) -> pd.DataFrame:
+    """Annotation table shaped like Supplemental_file1_neuron_annotations.tsv"""
+    rng = np.random.default_rng(seed)
+    cell_type = rng.choice(CELL_TYPES, n).astype(object)
+    cell_type[rng.random(n) < 0.1] = np.nan
+    cell_class = rng.choice(['mechanosensory', 'visual', 'olfactory', 'unknown'], n).astype(object)
+    cell_class[cell_class == 'unknown'] = np.nan
+    df = pd.DataFrame({
+        'supervoxel_id': rng.integers(7 * 10 ** 16, 8 * 10 ** 16, n),
+        'root_id': np.arange(720575940600000000, 720575940600000000 + n),
+        'pos_x': rng.integers(100000, 900000, n).astype(float),
+        'pos_y': rng.integers(100000, 400000, n).astype(float),
+        'pos_z': rng.integers(1000, 7000, n).astype(float),
+        'soma_x': rng.integers(100000, 900000, n).astype(float),
+        'soma_y': rng.integers(100000, 400000, n).astype(float),
+        'soma_z': rng.integers(1000, 7000, n).astype(float),
+        'flow': rng.choice(['intrinsic', 'afferent', 'efferent'], n),
+        'super_class': rng.choice(['optic', 'central', 'sensory', 'ascending'], n),
+        'cell_class': cell_class,
+        'cell_type': cell_type,
+        'side': rng.choice(['left', 'right', 'center'], n)
+    })
+    df.loc[rng.random(n) < 0.05, 'soma_x'] = np.nan
+    return df
+
+
+def write_tsv(df: pd.DataFrame, path) -> Path:
+    path = Path(path)
+    df.to_csv(path, sep='\t', index=False)
+    return path
+
+
+def test_snapshot_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        tsv = write_tsv(synthetic_annotations(), Path(tmp) / 'annotations.tsv')
+        source_hash = file_sha256(tsv)
+        parsed = pd.read_csv(tsv, sep='\t', low_memory=False)
+        store = AnnotationSnapshotStore(Path(tmp) / 'snapshots')
+
+        built = store.load_or_build(source_hash, lambda: parsed)
+        assert store.snapshot_path(source_hash).joinpath(MANIFEST_NAME).exists()
+
+        loaded = store.load(source_hash)
+        assert loaded is not None and list(loaded.columns) == list(parsed.columns)
+        assert loaded['root_id'].dtype == np.int64 and loaded['supervoxel_id'].dtype == np.int64
+        for column in ('cell_type', 'cell_class', 'flow', 'side'):
+            assert isinstance(loaded[column].dtype, pd.CategoricalDtype), column
+
+        # Memory-mapped columns hold the same values as the parsed TSV, NaNs included
+        assert isinstance(loaded['pos_x'].to_numpy().base, np.memmap)
+        copied = store.load(source_hash, mmap=False)
+        pd.testing.assert_frame_equal(copied, prepare_annotation_frame(parsed))
+        pd.testing.assert_frame_equal(copied, built)
+        assert loaded['soma_x'].isna().sum() == parsed['soma_x'].isna().sum() > 0
+        assert (loaded['cell_type'].astype(object).fillna('') == parsed['cell_type'].fillna('')).all()
+    print(f"✅ {len(loaded)} rows round-trip through the columnar snapshot")
+
+
+def test_snapshot_reused_and_pruned():
+    def parse_fails():
+        raise AssertionError("a cached snapshot must not re-parse the TSV")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnnotationSnapshotStore(Path(tmp) / 'snapshots')
+        first = synthetic_annotations(seed=1)
+        store.load_or_build('a' * 64, lambda: first)
+
+        # A second start with the same source file loads the snapshot without parsing
+        assert len(store.load_or_build('a' * 64, parse_fails)) == len(first)
+        assert store.load('a' * 64, mmap=False)['root_id'].tolist() == first['root_id'].tolist()
+
+        # A changed source file builds a new snapshot and drops the old one
+        second = synthetic_annotations(n=500, seed=2)
+        assert len(store.load_or_build('b' * 64, lambda: second)) == 500
+        assert not store.snapshot_path('a' * 64).exists()
+        assert store.load('a' * 64) is None
+        assert sorted(p.name for p in store.snapshot_dir.iterdir()) == [store.snapshot_path('b' * 64).name]
+
+        # A snapshot from another source hash under the same prefix is not trusted
+        assert store.load('b' * 16 + 'c' * 48) is None
+    print("✅ Snapshots are reused by source hash and pruned on change")
+
+
+if __name__ == "__main__":
+    print("🧪 ANNOTATION SNAPSHOT TESTS")
+    print("=" * 50)
+    test_snapshot_round_trip()
+    test_snapshot_reused_and_pruned()
+    print("\n🎉 All annotation snapshot tests passed!")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test msgpack neuron responses
+Requests one endpoint as JSON, with format=msgpack and with an msgpack Accept
+header, unpacks the raw array buffers and checks ids, positions and dictionary
+coded labels against the JSON payload
+"""
+
+import tempfile
+from pathlib import Path
+
+import msgpack
+import numpy as np
+
+import flywire_cloud_backend
+from binary_response import pack_payload
+from neuron_records import build_neuron_columns
+from test_annotation_snapshot import synthetic_annotations
+from test_dataset_swap import AnnotationServer, configure_offline
+
+URL = '/api/neurons/search?type=jo-&limit=200'
+
+
+def unpack_array(encoded):
+    return np.frombuffer(encoded['data'], dtype=encoded['dtype']).reshape(encoded['shape'])
+
+
+def decode_labels(encoded):
+    return [encoded['labels'][code] for code in unpack_array(encoded['codes']).tolist()]
+
+
+def test_array_encoding():
+    df = synthetic_annotations(n=50, seed=3)
+    payload = msgpack.unpackb(pack_payload({'neurons': build_neuron_columns(df, source='test')}), raw=False)
+    columns = payload['neurons']
+    ids = unpack_array(columns['id'])
+    assert ids.dtype == np.dtype('<u8') and ids.tolist() == df['root_id'].tolist()
+    positions = unpack_array(columns['position'])
+    assert positions.dtype == np.dtype('<f4') and positions.shape == (50, 3)
+    assert np.array_equal(positions, df[['pos_x', 'pos_y', 'pos_z']].to_numpy(dtype=np.float32))
+    assert decode_labels(columns['type']) == df['cell_type'].fillna('unknown').tolist()
+    assert columns['count'] == 50 and columns['source'] == 'test' and columns['activity'] == 0.0
+    print("✅ Arrays pack as little-endian {dtype, shape, data} buffers")
+
+
+def test_content_negotiation():
+    service = flywire_cloud_backend.flywire_service
+    client = flywire_cloud_backend.app.test_client()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        server.publish(synthetic_annotations(n=2000, seed=9), version=1)
+        configure_offline(service, server.url, Path(tmp) / 'cache')
+        try:
+            response = client.get(URL)
+            assert response.status_code == 200 and response.mimetype == 'application/json'
+            assert 'Accept' in response.vary
+            neurons = response.get_json()['neurons']
+            assert len(neurons) > 10
+
+            for url, headers in ((URL + '&format=msgpack', {}), (URL, {'Accept': 'application/x-msgpack'})):
+                response = client.get(url, headers=headers)
+                assert response.status_code == 200 and response.mimetype == 'application/msgpack', url
+                assert 'Accept' in response.vary
+                columns = msgpack.unpackb(response.get_data(), raw=False)['neurons']
+
+                assert columns['count'] == len(neurons)
+                assert unpack_array(columns['id']).tolist() == [int(n['id']) for n in neurons]
+                assert unpack_array(columns['mesh_id']).tolist() == [n['mesh_id'] for n in neurons]
+                for field in ('position', 'soma_position'):
+                    expected = np.array([n[field] for n in neurons], dtype=np.float32)
+                    assert np.array_equal(unpack_array(columns[field]), expected), field
+                for field in ('type', 'super_class', 'cell_class', 'side'):
+                    assert decode_labels(columns[field]) == [n[field] for n in neurons], field
+
+            assert client.get(URL + '&format=xml').status_code == 400
+        finally:
+            server.close()
+            service._dataset = None
+    print(f"✅ JSON, format=msgpack and Accept negotiation agree on {len(neurons)} neurons")
+
+
+if __name__ == "__main__":
+    print("🧪 BINARY RESPONSE TESTS")
+    print("=" * 50)
+    test_array_encoding()
+    test_content_negotiation()
+    print("\n🎉 All binary response tests passed!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test the blob cache against a local HTTP stand-in
+Covers the first download, revalidation that ends in 304 and reuses the cached
+file, and serving the cached copy while the server is down - no network access needed
+"""
+
+import http.server
+import tempfile
+import threading
+
+import requests
+
+from blob_cache import BlobCache
+
+PAYLOAD = b"root_id,cell_type\n720575940600000000,KC_gamma\n" * 1000
+ETAG = '"annotations-v1"'
+LAST_MODIFIED = 'Sat, 17 Oct 2026 00:00:00 GMT'
+
+
+class ConditionalHandler(http.server.BaseHTTPRequestHandler):
+    """Serves PAYLOAD with validators and answers matching conditional requests with 304"""
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        ConditionalHandler.requests_seen.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+
+def start_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ConditionalHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/annotations.tsv"
+
+
+def test_fetch_revalidate_and_offline():
+    ConditionalHandler.requests_seen = []
+    server, url = start_server()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = BlobCache(cache_dir)
+
+        # First fetch downloads and stores the file with its validators
+        first = cache.fetch(url, timeout=5)
+        assert first.changed and first.path.read_bytes() == PAYLOAD
+        assert first.meta['etag'] == ETAG and first.meta['last_modified'] == LAST_MODIFIED
+        assert 'If-None-Match' not in ConditionalHandler.requests_seen[0]
+
+        # Refetch sends both validators, gets 304 and keeps the cached file
+        mtime = first.path.stat().st_mtime_ns
+        second = cache.fetch(url, timeout=5)
+        sent = ConditionalHandler.requests_seen[1]
+        assert sent['If-None-Match'] == ETAG and sent['If-Modified-Since'] == LAST_MODIFIED
+        assert not second.changed and second.path == first.path and second.sha256 == first.sha256
+        assert second.path.stat().st_mtime_ns == mtime
+
+        # With the server gone the cached copy is still served
+        server.shutdown()
+        server.server_close()
+        offline = cache.fetch(url, timeout=2)
+        assert not offline.changed and offline.path.read_bytes() == PAYLOAD
+        assert len(ConditionalHandler.requests_seen) == 2
+    print("✅ Download, 304 revalidation and offline fallback")
+
+
+def test_offline_without_cache_fails():
+    server, url = start_server()
+    server.shutdown()
+    server.server_close()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            BlobCache(cache_dir).fetch(url, timeout=2)
+            assert False, "an uncached download must fail while the server is down"
+        except requests.ConnectionError:
+            pass
+    print("✅ Uncached downloads fail while the server is down")
+
+
+if __name__ == "__main__":
+    print("🧪 BLOB CACHE TESTS")
+    print("=" * 50)
+    test_fetch_revalidate_and_offline()
+    test_offline_without_cache_fails()
+    print("\n🎉 All blob cache tests passed!")
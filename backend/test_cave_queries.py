@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test CAVE access of the neuroglancer service with a fake CAVE client
+Checks that a circuit search costs one nucleus query per circuit instead of one
+per neuron, and that tables and their metadata are fetched once per materialization version -
+no FlyWire connection needed
+"""
+
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from cave_table_cache import CaveTableCache
+from precomputed_annotations import AnnotationStore
+from flywire_neuroglancer import FlyWireNeuroglancerService
+
+CELL_TYPES = pd.DataFrame({
+    'pt_root_id': [720575940600000000 + i for i in range(40)],
+    'cell_type': (['CHRIMSON_touch_receptor_larval'] * 20 + ['photoreceptor_R7'] * 10 + ['L1_larval_interneuron'] * 10),
+    'confidence': [0.9] * 40
+})
+
+
+class FakeMaterialize:
+    """Answers query_table from in-memory frames and records every call"""
+
+    def __init__(self):
+        self.calls = []
+        self.version = 783
+        self.nucleus_latency = 0.0
+        self.gates = {}
+        self.nuclei = pd.DataFrame({
+            'pt_root_id': CELL_TYPES['pt_root_id'],
+            'pt_position_x': range(40),
+            'pt_position_y': range(100, 140),
+            'pt_position_z': range(200, 240)
+        })
+
+    def get_table_metadata(self):
+        self.calls.append(('table_metadata', None, None))
+        return {'cell_type_local': {}, 'nucleus_detection_v0': {}}
+
+    def most_recent_version(self):
+        return self.version
+
+    def query_table(self, table, filter_equal_dict=None, filter_in_dict=None, materialization_version=None,
+                    split_positions=False):
+        assert materialization_version == self.version and split_positions
+        self.calls.append((table, filter_equal_dict, filter_in_dict))
+        if table in self.gates:
+            assert self.gates[table].wait(5)
+        if table == 'cell_type_local':
+            return CELL_TYPES
+        time.sleep(self.nucleus_latency)
+        nuclei = self.nuclei
+        for column, value in (filter_equal_dict or {}).items():
+            nuclei = nuclei[nuclei[column] == value]
+        for column, values in (filter_in_dict or {}).items():
+            nuclei = nuclei[nuclei[column].isin(values)]
+        return nuclei
+
+
+class FakeCaveClient:
+    def __init__(self):
+        self.materialize = FakeMaterialize()
+
+
+class OfflineNeuroglancerService(FlyWireNeuroglancerService):
+    def initialize_services(self):
+        self.cave_client = FakeCaveClient()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.table_cache = CaveTableCache(self.cave_client, self.dataset, cache_dir=self.cache_dir.name,
+                                          version_ttl=0)
+        self.annotation_store = AnnotationStore(f"{self.cache_dir.name}/annotations")
+
+
+def test_circuit_search_batches_soma_queries():
+    service = OfflineNeuroglancerService()
+    circuits = service.search_chrimson_circuits()
+    calls = service.cave_client.materialize.calls
+
+    assert [len(c['neurons']) for c in circuits] == [20, 10, 10], [len(c['neurons']) for c in circuits]
+    nucleus_calls = [call for call in calls if call[0] == 'nucleus_detection_v0']
+    assert len(nucleus_calls) <= len(circuits), len(nucleus_calls)
+    assert all(call[1] is None for call in nucleus_calls)
+    assert len([call for call in calls if call[0] == 'cell_type_local']) == 1
+
+    neuron = circuits[1]['neurons'][0]
+    assert neuron['id'] == '720575940600000020'
+    assert neuron['position'] == [20.0, 120.0, 220.0]
+    assert neuron['source'] == 'flywire_photoreceptor' and neuron['confidence'] == 0.9
+    print(f"✅ {sum(len(c['neurons']) for c in circuits)} neurons positioned with {len(calls)} CAVE queries")
+
+
+def test_repeated_search_uses_cached_tables():
+    service = OfflineNeuroglancerService()
+    materialize = service.cave_client.materialize
+    first = service.search_chrimson_circuits()
+    downloads = len(materialize.calls)
+
+    assert service.search_chrimson_circuits() == first
+    assert len(materialize.calls) == downloads, materialize.calls[downloads:]
+
+    # A new process reads the table files instead of downloading them
+    restarted = OfflineNeuroglancerService()
+    restarted.cave_client.materialize = materialize
+    restarted.table_cache.cache_dir = service.table_cache.cache_dir
+    restarted._tables().get('cell_type_local')
+    assert len(materialize.calls) == downloads
+
+    # A new materialization is downloaded once, then cached again
+    materialize.version = 784
+    service.search_chrimson_circuits()
+    new_calls = materialize.calls[downloads:]
+    assert [call[0] for call in new_calls].count('cell_type_local') == 1, new_calls
+    assert [call[0] for call in new_calls].count('table_metadata') == 1, new_calls
+    assert len(list(service.table_cache.cache_dir.glob('*-cell_type_local-v*'))) == 1
+    print(f"✅ Repeated searches made no table downloads until materialization {materialize.version}")
+
+
+def test_download_does_not_block_other_tables():
+    client = FakeCaveClient()
+    materialize = client.materialize
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = CaveTableCache(client, 'flywire_fafb_public', cache_dir=tmp, version_ttl=0)
+        nuclei = cache.get('nucleus_detection_v0')
+
+        # Four requests for a table whose download hangs until released
+        materialize.gates['cell_type_local'] = threading.Event()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('cell_type_local'))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while not any(call[0] == 'cell_type_local' for call in materialize.calls):
+            time.sleep(0.01)
+
+        started = time.monotonic()
+        assert cache.get('nucleus_detection_v0') is nuclei
+        assert cache.materialization_version() == materialize.version
+        elapsed = time.monotonic() - started
+        materialize.gates['cell_type_local'].set()
+        for thread in threads:
+            thread.join()
+
+        assert elapsed < 0.5, elapsed
+        assert [call[0] for call in materialize.calls].count('cell_type_local') == 1
+        assert len(results) == 4 and all(df is results[0] for df in results)
+    print(f"✅ Cached tables served in {elapsed * 1000:.1f} ms during another table's download")
+
+
+def test_circuit_queries_run_concurrently():
+    service = OfflineNeuroglancerService()
+    service.cave_client.materialize.nucleus_latency = 0.3
+    started = time.monotonic()
+    service.search_chrimson_circuits()
+    elapsed = time.monotonic() - started
+    assert elapsed < 0.6, elapsed
+    print(f"✅ Three circuits with 0.3s soma queries searched in {elapsed:.2f}s")
+
+
+def test_search_deadline():
+    service = OfflineNeuroglancerService()
+    service.cave_client.materialize.nucleus_latency = 0.5
+    service.search_deadline = 0.1
+    try:
+        service.search_chrimson_circuits()
+        raise AssertionError("Search should stop at its deadline")
+    except TimeoutError as e:
+        assert 'mechanosensory' in str(e)
+    print("✅ Slow searches fail at the deadline")
+
+
+def test_missing_soma_fails_the_circuit():
+    service = OfflineNeuroglancerService()
+    materialize = service.cave_client.materialize
+    materialize.nuclei = materialize.nuclei.iloc[1:]
+    try:
+        service._get_soma_positions(CELL_TYPES['pt_root_id'].head(5))
+        raise AssertionError("A neuron without a nucleus should be reported")
+    except RuntimeError as e:
+        assert '720575940600000000' in str(e)
+    print("✅ Neurons without a detected nucleus are reported")
+
+
+if __name__ == "__main__":
+    print("🧪 TESTING CAVE QUERIES")
+    print("=" * 50)
+    test_circuit_search_batches_soma_queries()
+    test_repeated_search_uses_cached_tables()
+    test_download_does_not_block_other_tables()
+    test_circuit_queries_run_concurrently()
+    test_search_deadline()
+    test_missing_soma_fails_the_circuit()
+    print("\n🎉 All CAVE query tests passed!")
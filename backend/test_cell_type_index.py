@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test the cell type index
+Every lookup must return exactly the rows a full-table pandas scan would -
+Series.str.contains for substring/regex searches and str.startswith for prefixes
+"""
+
+import numpy as np
+
+from cell_type_index import CellTypeIndex
+from test_annotation_snapshot import synthetic_annotations
+
+QUERIES = ['JO-', 'jo-', 'jo-e', 'JO-E', 'gamma', 'KC_GAMMA', 'a', 'An', 'T4', 'zzz', 'LC10x', '',
+           'JO-[AB]', '^DN', 'gam+a$']
+
+
+def test_contains_matches_pandas():
+    cell_types = synthetic_annotations(n=5000)['cell_type']
+    index = CellTypeIndex.from_series(cell_types)
+
+    for query in QUERIES:
+        for case in (False, True):
+            expected = np.flatnonzero(cell_types.str.contains(query, case=case, na=False).to_numpy())
+            got = index.contains(query, case=case)
+            assert got.tolist() == expected.tolist(), (query, case, len(got), len(expected))
+    print(f"✅ {len(QUERIES)} queries match str.contains with and without case")
+
+
+def test_prefix_matches_pandas():
+    cell_types = synthetic_annotations(n=5000, seed=3)['cell_type'].astype('category')
+    index = CellTypeIndex.from_series(cell_types)
+    lower = cell_types.astype(object).str.lower()
+
+    for prefix in ['JO', 'jo-a', 'K', 'kc_gamma', 'AN_', 'T4a', 'T4ab', 'x', '']:
+        expected = np.flatnonzero(lower.str.startswith(prefix.lower(), na=False).to_numpy())
+        assert index.startswith(prefix).tolist() == expected.tolist(), prefix
+
+    # Row counts per type add up to the non-missing rows
+    assert sum(index.type_count(t) for t in range(len(index.types))) == cell_types.notna().sum()
+    print("✅ Prefix lookups match str.startswith")
+
+
+if __name__ == "__main__":
+    print("🧪 CELL TYPE INDEX TESTS")
+    print("=" * 50)
+    test_contains_matches_pandas()
+    test_prefix_matches_pandas()
+    print("\n🎉 All cell type index tests passed!")
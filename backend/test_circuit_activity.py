@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Test the array-backed circuit activity model
+Checks the vectorized FEM update against the per-neuron rules it replaced, that
+only segments whose colour bucket changed reach the viewer, and times an update
+over a large synthetic circuit set - no FlyWire connection needed
+"""
+
+import contextlib
+import time
+
+import neuroglancer
+import numpy as np
+
+from circuit_activity import CircuitActivity, COLOR_BUCKETS, activity_palette
+from test_cave_queries import OfflineNeuroglancerService
+
+TYPES = ['CHRIMSON_mechanosensory_larval', 'CHRIMSON_touch_receptor_larval', 'photoreceptor_R7',
+         'L1_larval_interneuron', 'KC_gamma']
+
+
+def make_circuits(neurons_per_circuit):
+    rng = np.random.default_rng(0)
+    return [
+        {
+            'name': name,
+            'color': color,
+            'neurons': [{'id': str(1000 * c + i), 'mesh_id': 1000 * c + i, 'type': TYPES[t], 'activity': 0.0}
+                        for i, t in enumerate(rng.integers(len(TYPES), size=neurons_per_circuit))]
+        }
+        for c, (name, color) in enumerate([('Mechanosensory', '#FF4081'), ('Photoreceptor', '#E91E63'),
+                                           ('Larval', '#2196F3')])
+    ]
+
+
+def reference_activity(neuron_type, fem_data):
+    """The per-neuron rules of the original dict-walking update"""
+    optogenetic_stimulus = fem_data.get('optogeneticStimulus', False)
+    mechanical_force = fem_data.get('femParameters', {}).get('mechanicalForce', 0)
+    time_factor = np.exp(-abs(fem_data.get('timestamp', 0) - fem_data.get('peakTime', 11.5)) / 5.0)
+    if 'mechanosensory' in neuron_type or 'touch' in neuron_type:
+        return min(1.0, ((0.9 if optogenetic_stimulus else 0.05) + mechanical_force * 0.2) * time_factor)
+    elif 'photoreceptor' in neuron_type:
+        return (0.8 if optogenetic_stimulus else 0.1) * time_factor
+    return mechanical_force * 0.15 * time_factor
+
+
+def test_update_matches_reference_rules():
+    circuits = make_circuits(50)
+    activity = CircuitActivity(circuits)
+    for fem_data in [{}, {'optogeneticStimulus': True, 'timestamp': 11.5, 'femParameters': {'mechanicalForce': 3}},
+                     {'optogeneticStimulus': False, 'timestamp': 4, 'femParameters': {'mechanicalForce': 0.5}},
+                     {'optogeneticStimulus': True, 'timestamp': 20, 'peakTime': 18}]:
+        activity.update(fem_data)
+        activity.write_back(circuits)
+        for circuit in circuits:
+            for neuron in circuit['neurons']:
+                assert abs(neuron['activity'] - reference_activity(neuron['type'], fem_data)) < 1e-6
+    print("✅ Vectorized update matches the per-neuron rules")
+
+
+def test_circuit_slices():
+    circuits = make_circuits(7)
+    activity = CircuitActivity(circuits)
+    assert len(activity) == 21
+    assert activity.mesh_ids[activity.circuit_slice(1)].tolist() == [n['mesh_id'] for n in circuits[1]['neurons']]
+    assert len(CircuitActivity([])) == 0
+    print("✅ Circuits map to contiguous slices")
+
+
+def test_color_updates_are_deltas():
+    activity = CircuitActivity(make_circuits(30))
+    assert activity_palette('#FF4081')[0] == '#ff4081' and len(activity_palette('#FF4081')) == COLOR_BUCKETS
+
+    colors, buckets = activity.color_updates()
+    assert sum(map(len, colors)) == 90
+    activity.mark_pushed(buckets)
+    assert activity.color_updates()[0] == [{}, {}, {}]
+
+    # Force on its own only changes mechanosensory and other neurons, not photoreceptors
+    activity.update({'timestamp': 11.5})
+    activity.mark_pushed(activity.color_updates()[1])
+    activity.update({'timestamp': 11.5, 'femParameters': {'mechanicalForce': 1}})
+    colors, buckets = activity.color_updates()
+    changed = {mesh_id for circuit_colors in colors for mesh_id in circuit_colors}
+    expected = {mesh_id for mesh_id, response in zip(activity.mesh_ids.tolist(), activity.response) if response != 1}
+    assert changed == expected
+    activity.mark_pushed(buckets)
+
+    # A change smaller than a bucket pushes nothing
+    activity.update({'timestamp': 11.5, 'femParameters': {'mechanicalForce': 1.001}})
+    assert activity.color_updates()[0] == [{}, {}, {}]
+    print(f"✅ {len(changed)} of {len(activity)} segment colours changed")
+
+
+class CountingViewer:
+    """Neuroglancer viewer stand-in that counts state transactions"""
+
+    def __init__(self):
+        self.state = neuroglancer.ViewerState()
+        self.transactions = 0
+
+    @contextlib.contextmanager
+    def txn(self):
+        self.transactions += 1
+        yield self.state
+
+    def __str__(self):
+        return 'http://neuroglancer.test/'
+
+
+def test_unchanged_activity_skips_viewer_transaction():
+    service = OfflineNeuroglancerService()
+    service.viewer = CountingViewer()
+    service.search_chrimson_circuits()
+    service.create_neuroglancer_visualization()
+    assert service.viewer.transactions == 1
+
+    service.update_circuit_activity({'timestamp': 30})
+    assert service.viewer.transactions == 1
+
+    service.update_circuit_activity({'optogeneticStimulus': True, 'timestamp': 11.5})
+    assert service.viewer.transactions == 2
+    colors = service.viewer.state.layers['Photoreceptor Circuit_meshes'].segment_colors.to_json()
+    assert set(colors.values()) == {activity_palette('#E91E63')[12]}, colors
+
+    service.update_circuit_activity({'optogeneticStimulus': True, 'timestamp': 11.5})
+    assert service.viewer.transactions == 2
+    print("✅ Viewer transaction skipped when no colour changed")
+
+
+def segment_colors_by_layer(state):
+    return {layer.name: layer.segment_colors.to_json() for layer in state.layers if layer.name.endswith('_meshes')}
+
+
+def test_color_pushes_write_only_changed_segments():
+    service = OfflineNeuroglancerService()
+    service.viewer = CountingViewer()
+    service.search_chrimson_circuits()
+    service.create_neuroglancer_visualization()
+
+    color_map = type(service.viewer.state.layers['Photoreceptor Circuit_meshes'].segment_colors)
+    original_setitem = color_map.__setitem__
+    writes = []
+
+    def counting_setitem(self, key, value):
+        writes.append(key)
+        original_setitem(self, key, value)
+
+    color_map.__setitem__ = counting_setitem
+    try:
+        for fem_data in [{'timestamp': 11.5}, {'timestamp': 11.5, 'femParameters': {'mechanicalForce': 1}},
+                         {'optogeneticStimulus': True, 'timestamp': 11.5}, {'optogeneticStimulus': True, 'timestamp': 11.5}]:
+            before = segment_colors_by_layer(service.viewer.state)
+            writes.clear()
+            service.update_circuit_activity(fem_data)
+            after = segment_colors_by_layer(service.viewer.state)
+
+            # One map write per segment whose colour changed, and every colour reads back intact
+            changed = sum(before[name][key] != colors[key] for name, colors in after.items() for key in colors)
+            assert len(writes) == changed, (len(writes), changed)
+            for name, colors in after.items():
+                assert set(colors) == set(before[name]) and 'None' not in colors.values(), name
+                layer_colors = service.viewer.state.layers[name].segment_colors
+                assert {str(key): value for key, value in layer_colors.items()} == colors
+    finally:
+        color_map.__setitem__ = original_setitem
+    print("✅ Colour pushes write only the segments that changed")
+
+
+class SwappingViewer(CountingViewer):
+    """Viewer stand-in that runs a callback as its next transaction opens, like a search finishing mid-tick"""
+
+    def __init__(self):
+        super().__init__()
+        self.during_txn = None
+
+    @contextlib.contextmanager
+    def txn(self):
+        if self.during_txn is not None:
+            callback, self.during_txn = self.during_txn, None
+            callback()
+        with super().txn() as state:
+            yield state
+
+
+def test_tick_uses_one_circuit_state():
+    service = OfflineNeuroglancerService()
+    service.viewer = SwappingViewer()
+    circuits = service.search_chrimson_circuits()
+    service.create_neuroglancer_visualization()
+
+    # A search publishing circuits in another order while the tick pushes colours
+    reordered = circuits[::-1]
+    service.viewer.during_txn = lambda: setattr(service, '_circuit_state', (reordered, CircuitActivity(reordered)))
+    service.update_circuit_activity({'optogeneticStimulus': True, 'timestamp': 11.5})
+    assert service.current_circuits is reordered
+
+    # Every layer only received colours of its own segments
+    for circuit in circuits:
+        colors = service.viewer.state.layers[f"{circuit['name']}_meshes"].segment_colors.to_json()
+        assert set(map(int, colors)) == {neuron['mesh_id'] for neuron in circuit['neurons']}, circuit['name']
+    print("✅ A tick pairs circuits and activity from the same search")
+
+
+def test_update_speed():
+    activity = CircuitActivity(make_circuits(20000))
+    fem_data = {'optogeneticStimulus': True, 'timestamp': 10, 'femParameters': {'mechanicalForce': 1.2}}
+    started = time.perf_counter()
+    for _ in range(100):
+        activity.update(fem_data)
+    per_update = (time.perf_counter() - started) / 100
+    print(f"✅ {len(activity):,} neurons updated in {per_update * 1000:.3f} ms")
+    assert per_update < 0.01
+
+
+if __name__ == "__main__":
+    print("🧪 CIRCUIT ACTIVITY TESTS")
+    print("=" * 50)
+    test_update_matches_reference_rules()
+    test_circuit_slices()
+    test_color_updates_are_deltas()
+    test_unchanged_activity_skips_viewer_transaction()
+    test_color_pushes_write_only_changed_segments()
+    test_tick_uses_one_circuit_state()
+    test_update_speed()
+    print("\n🎉 All circuit activity tests passed!")
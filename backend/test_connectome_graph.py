@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the CSR connectome graph
+Builds graphs from a small edge list (in memory and streamed from CSV in tiny
+chunks) and checks partners, degrees and sub-graph edges against a plain
+dictionary of summed synapse counts, plus the memory-mapped save/load round trip
+"""
+
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from connectome_graph import ConnectomeGraph, ConnectomeGraphStore
+
+BASE = 720575940600000000
+
+
+def random_edges(n_nodes=60, n_rows=600, seed=0) -> pd.DataFrame:
+    """Synapse table rows with repeated (pre, post) pairs, like the per-synapse export"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pre_pt_root_id': BASE + rng.integers(0, n_nodes, n_rows),
+        'post_pt_root_id': BASE + rng.integers(0, n_nodes, n_rows),
+        'syn_count': rng.integers(1, 20, n_rows)
+    })
+
+
+def summed_edges(edges: pd.DataFrame):
+    totals = defaultdict(int)
+    for pre, post, count in edges.itertuples(index=False):
+        totals[(pre, post)] += count
+    return totals
+
+
+def check_graph(graph: ConnectomeGraph, edges: pd.DataFrame):
+    totals = summed_edges(edges)
+    assert graph.n_edges == len(totals)
+    assert graph.root_ids.tolist() == sorted(set(edges['pre_pt_root_id']) | set(edges['post_pt_root_id']))
+
+    for root_id in graph.root_ids[::7].tolist():
+        downstream = {post: w for (pre, post), w in totals.items() if pre == root_id}
+        upstream = {pre: w for (pre, post), w in totals.items() if post == root_id}
+        ids, weights = graph.downstream(root_id)
+        assert dict(zip(ids.tolist(), weights.tolist())) == downstream
+        assert list(weights) == sorted(weights, reverse=True)
+        ids, weights = graph.upstream(root_id, min_weight=10)
+        assert dict(zip(ids.tolist(), weights.tolist())) == {k: w for k, w in upstream.items() if w >= 10}
+
+        assert graph.out_degree([root_id]).tolist() == [len(downstream)]
+        assert graph.in_degree([root_id], weighted=True).tolist() == [sum(upstream.values())]
+
+    subset = graph.root_ids[:20].tolist()
+    pre, post, weight = graph.edges(subset, min_weight=5)
+    expected = {(a, b): w for (a, b), w in totals.items() if a in subset and b in subset and w >= 5}
+    assert dict(zip(zip(pre.tolist(), post.tolist()), weight.tolist())) == expected
+
+    # Neurons without edges have no partners and zero degree
+    assert len(graph.downstream(BASE - 1)[0]) == 0 and graph.out_degree([BASE - 1]).tolist() == [0]
+
+
+def test_graph_matches_edge_sums():
+    edges = random_edges()
+    graph = ConnectomeGraph.from_edges(*(edges[c].to_numpy() for c in edges.columns))
+    check_graph(graph, edges)
+
+    # Restricting to a node set drops every edge touching other neurons
+    keep = graph.root_ids[::2]
+    restricted = ConnectomeGraph.from_edges(*(edges[c].to_numpy() for c in edges.columns), root_ids=keep)
+    inside = edges[edges['pre_pt_root_id'].isin(keep) & edges['post_pt_root_id'].isin(keep)]
+    assert restricted.n_edges == len(summed_edges(inside))
+    print(f"✅ {graph.n_nodes} neurons, {graph.n_edges} edges match summed synapse counts")
+
+
+def test_streamed_build_and_store():
+    edges = random_edges(seed=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(tmp) / 'connections.csv'
+        edges.to_csv(csv, index=False)
+
+        # Duplicate pairs split across chunks are summed like in one pass
+        streamed = ConnectomeGraph.from_edge_list(csv, chunksize=37)
+        check_graph(streamed, edges)
+
+        store = ConnectomeGraphStore(Path(tmp) / 'graphs')
+        built = store.load_or_build('f' * 64, csv)
+        assert built.version == 'f' * 64 and isinstance(built.out_indices, np.memmap)
+        for name in ('root_ids', 'out_indptr', 'out_indices', 'out_weights', 'in_indptr', 'in_weights'):
+            assert np.array_equal(getattr(built, name), getattr(streamed, name)), name
+
+        # The saved graph is reused without reading the edge list again
+        csv.unlink()
+        assert store.load_or_build('f' * 64, csv).n_edges == streamed.n_edges
+        assert store.latest().version == 'f' * 64
+    print("✅ Chunked CSV build matches, saves and memory-maps")
+
+
+if __name__ == "__main__":
+    print("🧪 CONNECTOME GRAPH TESTS")
+    print("=" * 50)
+    test_graph_matches_edge_sums()
+    test_streamed_build_and_store()
+    print("\n🎉 All connectome graph tests passed!")
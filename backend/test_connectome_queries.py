@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test k-hop expansion and strongest paths on a small hand-built connectome
+
+    F --3--> A --10--> B --5--> D --1--> E        G --1--> H
+             |                  ^
+             +---6---> C --6----+
+"""
+
+import numpy as np
+
+from connectome_graph import ConnectomeGraph
+from connectome_queries import ConnectomeQueries
+
+BASE = 720575940600000000
+A, B, C, D, E, F, G, H = (BASE + i for i in range(8))
+EDGES = [(A, B, 10), (A, C, 6), (B, D, 5), (C, D, 6), (D, E, 1), (F, A, 3), (G, H, 1)]
+
+
+def hand_built_queries() -> ConnectomeQueries:
+    pre, post, weight = (np.array(column, dtype=np.int64) for column in zip(*EDGES))
+    return ConnectomeQueries(ConnectomeGraph.from_edges(pre, post, weight))
+
+
+def neighbourhood(result):
+    return dict(zip(result['root_ids'].tolist(), result['hops'].tolist()))
+
+
+def edge_set(result):
+    edges = result['edges']
+    return set(zip(edges['pre'].tolist(), edges['post'].tolist(), edges['weight'].tolist()))
+
+
+def test_expand():
+    queries = hand_built_queries()
+
+    one = queries.expand([A], hops=1)
+    assert neighbourhood(one) == {A: 0, B: 1, C: 1} and not one['truncated']
+    assert edge_set(one) == {(A, B, 10), (A, C, 6)}
+
+    two = queries.expand([A], hops=2)
+    assert neighbourhood(two) == {A: 0, B: 1, C: 1, D: 2}
+    assert two['hops'].tolist() == sorted(two['hops'].tolist())
+
+    # Weak edges are neither followed nor returned
+    strong = queries.expand([A], hops=3, min_weight=6)
+    assert neighbourhood(strong) == {A: 0, B: 1, C: 1, D: 2}
+    assert edge_set(strong) == {(A, B, 10), (A, C, 6), (C, D, 6)}
+
+    assert neighbourhood(queries.expand([A], hops=2, direction='upstream')) == {A: 0, F: 1}
+    assert neighbourhood(queries.expand([D], hops=1, direction='both')) == {D: 0, B: 1, C: 1, E: 1}
+    assert neighbourhood(queries.expand([A, G], hops=0)) == {A: 0, G: 0}
+
+    # A hop that overflows max_nodes keeps its most strongly connected neurons
+    capped = queries.expand([A], hops=2, max_nodes=2)
+    assert neighbourhood(capped) == {A: 0, B: 1} and capped['truncated']
+    print("✅ k-hop expansion matches the hand-built graph")
+
+
+def test_expand_rejects_bad_seeds():
+    queries = hand_built_queries()
+    for kwargs in ({'seeds': [A, B, C], 'max_nodes': 2}, {'seeds': [BASE - 1]},
+                   {'seeds': [A], 'direction': 'sideways'}, {'seeds': [A], 'hops': 7},
+                   {'seeds': [A], 'max_nodes': 0}):
+        try:
+            queries.expand(**kwargs)
+            assert False, f"expand must reject {kwargs}"
+        except ValueError:
+            pass
+
+    # Unconnected ids and duplicates do not count towards max_nodes
+    assert neighbourhood(queries.expand([A, A, BASE - 1], hops=0, max_nodes=1)) == {A: 0}
+    print("✅ Seed sets larger than max_nodes are rejected before traversal")
+
+
+def test_strongest_path():
+    queries = hand_built_queries()
+
+    path = queries.strongest_path(A, E)
+    assert path['root_ids'].tolist() == [A, B, D, E]
+    assert path['weights'].tolist() == [10, 5, 1]
+    assert np.isclose(path['cost'], 1 / 10 + 1 / 5 + 1)
+
+    # Dropping weak edges reroutes through C, or disconnects the target
+    assert queries.strongest_path(A, D, min_weight=6)['root_ids'].tolist() == [A, C, D]
+    assert queries.strongest_path(A, E, min_weight=2) is None
+    assert queries.strongest_path(F, E)['root_ids'].tolist() == [F, A, B, D, E]
+
+    # Direction matters and other components are unreachable
+    assert queries.strongest_path(E, A) is None
+    assert queries.strongest_path(A, H) is None
+    try:
+        queries.strongest_path(A, BASE - 1)
+        assert False, "unknown neurons must raise"
+    except ValueError:
+        pass
+    print("✅ Strongest paths follow the fewest-weak-synapse route")
+
+
+if __name__ == "__main__":
+    print("🧪 CONNECTOME QUERY TESTS")
+    print("=" * 50)
+    test_expand()
+    test_expand_rejects_bad_seeds()
+    test_strongest_path()
+    print("\n🎉 All connectome query tests passed!")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the statistics materialized with each snapshot
+Checks the counts against pandas value_counts, that the stats sidecar is written
+with a new snapshot and read back instead of rescanning, and the /api/stats view
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+import flywire_cloud_backend
+from annotation_snapshot import AnnotationSnapshotStore
+from dataset_stats import compute_dataset_stats, group_counts
+from flywire_dataset import STATS_SIDECAR, FlyWireDataset
+from test_annotation_snapshot import synthetic_annotations
+from test_dataset_swap import AnnotationServer, configure_offline
+
+
+def test_group_counts_match_value_counts():
+    df = synthetic_annotations(n=4000)
+    for column in ('cell_type', 'cell_class', 'side'):
+        counts = group_counts(df, column)
+        expected = df[column].value_counts()
+        assert counts == {str(k): int(v) for k, v in expected.items()}, column
+        assert list(counts.values()) == sorted(counts.values(), reverse=True)
+
+    stats = compute_dataset_stats(df, auditory_neurons=7)
+    assert stats['total_neurons'] == 4000 and stats['auditory_neurons'] == 7
+    assert stats['mechanosensory_neurons'] == (df['cell_class'] == 'mechanosensory').sum()
+    assert stats['sensory_neurons'] == (df['super_class'] == 'sensory').sum()
+    print("✅ Group counts match pandas value_counts")
+
+
+def test_stats_sidecar_reused():
+    df = synthetic_annotations(n=2000)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnnotationSnapshotStore(tmp)
+        dataset = FlyWireDataset.load(store, 'd' * 64, lambda: df, source='test')
+        sidecar = store.snapshot_path('d' * 64) / STATS_SIDECAR
+        assert json.loads(sidecar.read_text()) == dataset.stats
+        assert dataset.stats['auditory_neurons'] == df['cell_type'].str.contains('JO-', na=False).sum()
+
+        # The next start serves the stored counts instead of recomputing them
+        stored = dict(dataset.stats, total_neurons=-1)
+        sidecar.write_text(json.dumps(stored))
+        assert FlyWireDataset.load(store, 'd' * 64, lambda: df, source='test').stats == stored
+
+        # Columns outside the stored dimensions are counted once on demand
+        assert dataset.group_counts('flow') == group_counts(df, 'flow')
+        assert dataset.group_counts('flow') is dataset.group_counts('flow')
+    print("✅ Statistics sidecar written once and reused")
+
+
+def test_stats_endpoint():
+    service = flywire_cloud_backend.flywire_service
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        server.publish(synthetic_annotations(n=2000, seed=11), version=1)
+        configure_offline(service, server.url, Path(tmp) / 'cache')
+        client = flywire_cloud_backend.app.test_client()
+        try:
+            data = client.get('/api/stats?group_by=flow&top_k=2').get_json()
+            stats = service.get_dataset().stats
+            assert data['success'] and data['stats']['total_neurons'] == 2000
+            assert data['stats']['top_cell_types'] == dict(list(stats['counts']['cell_type'].items())[:2])
+            assert data['stats']['counts']['flow'] == service.get_dataset().group_counts('flow')
+
+            response = client.get('/api/stats?group_by=no_such_column')
+            assert response.status_code == 400 and not response.get_json()['success']
+        finally:
+            server.close()
+            service._dataset = None
+    print("✅ /api/stats serves the materialized counts")
+
+
+if __name__ == "__main__":
+    print("🧪 DATASET STATS TESTS")
+    print("=" * 50)
+    test_group_counts_match_value_counts()
+    test_stats_sidecar_reused()
+    test_stats_endpoint()
+    print("\n🎉 All dataset stats tests passed!")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test single-flight loading and the atomic dataset swap of the cloud backend
+Serves a synthetic annotation TSV from a local HTTP server, then checks that
+concurrent cold requests share one load and that a refresh publishes a complete
+new snapshot while readers keep the one they started with
+"""
+
+import functools
+import http.server
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from annotation_snapshot import AnnotationSnapshotStore
+from blob_cache import BlobCache
+from flywire_cloud_backend import FlyWireCloudDataService
+from test_annotation_snapshot import synthetic_annotations, write_tsv
+
+TSV_NAME = 'Supplemental_file1_neuron_annotations.tsv'
+
+
+class AnnotationServer:
+    """Local stand-in for the GitHub raw file host, answering If-Modified-Since with 304"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.downloads = 0
+        server = self
+
+        class Handler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_response(self, code, message=None):
+                if code == 200:
+                    server.downloads += 1
+                super().send_response(code, message)
+
+        self.httpd = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), functools.partial(Handler, directory=str(self.directory)))
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/{TSV_NAME}"
+
+    def publish(self, df, version: int):
+        """Replace the served TSV; distinct mtimes make Last-Modified change"""
+        path = write_tsv(df, self.directory / TSV_NAME)
+        os.utime(path, (1_700_000_000 + version * 3600,) * 2)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def configure_offline(service: FlyWireCloudDataService, url: str, cache_dir) -> FlyWireCloudDataService:
+    """Point a cloud service at a local annotation server and private caches"""
+    service.data_urls['neuron_annotations'] = url
+    service.blobs = BlobCache(Path(cache_dir) / 'blobs')
+    service.snapshots = AnnotationSnapshotStore(Path(cache_dir) / 'snapshots')
+    service._dataset = None
+    service._validated_at = None
+    return service
+
+
+def test_concurrent_cold_requests_share_one_load():
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        server.publish(synthetic_annotations(n=3000), version=1)
+        service = configure_offline(FlyWireCloudDataService(), server.url, Path(tmp) / 'cache')
+        try:
+            barrier = threading.Barrier(8)
+            results = []
+
+            def cold_request():
+                barrier.wait()
+                results.append(service.get_dataset())
+
+            threads = [threading.Thread(target=cold_request) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert len(results) == 8 and all(dataset is results[0] for dataset in results)
+            assert server.downloads == 1
+            assert len(results[0]) == 3000 and results[0].mechanosensory_circuit is not None
+        finally:
+            server.close()
+    print("✅ 8 concurrent cold requests shared one download and parse")
+
+
+def test_refresh_swaps_whole_snapshot():
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        server.publish(synthetic_annotations(n=3000), version=1)
+        service = configure_offline(FlyWireCloudDataService(), server.url, Path(tmp) / 'cache')
+        try:
+            old = service.get_dataset()
+            old_rows = old.mechanosensory_rows.copy()
+
+            # Readers running through a refresh only ever see one complete snapshot
+            stop = threading.Event()
+            seen, torn = set(), []
+
+            def reader():
+                while not stop.is_set():
+                    dataset = service.get_dataset()
+                    seen.add(dataset.version)
+                    if dataset.stats['total_neurons'] != len(dataset.neuron_data) or \
+                            dataset.mechanosensory_circuit['total_available'] != len(dataset.mechanosensory_rows):
+                        torn.append(dataset.version)
+
+            readers = [threading.Thread(target=reader) for _ in range(4)]
+            for thread in readers:
+                thread.start()
+            server.publish(synthetic_annotations(n=1500, seed=9), version=2)
+            service.load_cloud_data(force_refresh=True)
+            time.sleep(0.05)
+            stop.set()
+            for thread in readers:
+                thread.join()
+
+            new = service.get_dataset()
+            assert new is not old and new.version != old.version and len(new) == 1500
+            assert not torn and seen <= {old.version, new.version}
+
+            # The superseded snapshot is untouched for requests still holding it
+            assert len(old) == 3000 and (old.mechanosensory_rows == old_rows).all()
+            assert old.neuron_data.iloc[old_rows]['cell_class'].eq('mechanosensory').all()
+
+            # An unchanged upstream file is revalidated without building a new snapshot
+            service.load_cloud_data(force_refresh=True)
+            assert service.get_dataset() is new and server.downloads == 2
+        finally:
+            server.close()
+    print("✅ Refresh published a complete snapshot while readers kept theirs")
+
+
+def test_stale_dataset_served_during_background_refresh():
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        server.publish(synthetic_annotations(n=1000), version=1)
+        service = configure_offline(FlyWireCloudDataService(), server.url, Path(tmp) / 'cache')
+        try:
+            old = service.get_dataset()
+            server.publish(synthetic_annotations(n=800, seed=2), version=2)
+            service._validated_at -= service.cache_duration * 2
+
+            # The expired snapshot is returned at once; its replacement builds in the background
+            assert service.get_dataset() is old
+            service._refresh_thread.join(timeout=30)
+            assert len(service.get_dataset()) == 800
+        finally:
+            server.close()
+    print("✅ Expired data keeps serving until the background refresh publishes")
+
+
+if __name__ == "__main__":
+    print("🧪 DATASET SWAP TESTS")
+    print("=" * 50)
+    test_concurrent_cold_requests_share_one_load()
+    test_refresh_swaps_whole_snapshot()
+    test_stale_dataset_served_during_background_refresh()
+    print("\n🎉 All dataset swap tests passed!")
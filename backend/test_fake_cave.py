@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark the neuroglancer circuit search against the offline fake CAVE server
+Starts fake_cave_server.py in-process at each table size, points the service at
+it through FLYWIRE_CAVE_CLIENT/FLYWIRE_CAVE_SERVER and times cold and cached
+searches - no network access needed
+
+    python test_fake_cave.py                     # 10k and 100k rows
+    python test_fake_cave.py 1000000 --latency 0.05
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from fake_cave_server import create_app
+
+
+def start_fake_cave(rows, latency=0.0):
+    app = create_app(rows=rows, latency=latency)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, app.config['FAKE_CAVE_STATS']
+
+
+def run_search_benchmark(rows, latency=0.0):
+    server, stats = start_fake_cave(rows, latency)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ.update({
+            'FLYWIRE_CAVE_CLIENT': 'local',
+            'FLYWIRE_CAVE_SERVER': f"http://127.0.0.1:{server.server_port}",
+            'FLYWIRE_CAVE_CACHE_DIR': cache_dir
+        })
+        from flywire_neuroglancer import FlyWireNeuroglancerService
+        service = FlyWireNeuroglancerService()
+
+        started = time.monotonic()
+        circuits = service.search_chrimson_circuits()
+        cold = time.monotonic() - started
+        cold_requests = stats['requests']
+
+        started = time.monotonic()
+        assert service.search_chrimson_circuits() == circuits
+        warm = time.monotonic() - started
+        warm_requests = stats['requests'] - cold_requests
+
+    server.shutdown()
+    assert [c['type'] for c in circuits] == ['mechanosensory', 'photoreceptor', 'larval']
+    assert all(len(neuron['position']) == 3 for c in circuits for neuron in c['neurons'])
+    print(f"  {rows:>9,} rows: cold {cold * 1000:7.1f} ms ({cold_requests} requests), "
+          f"cached {warm * 1000:6.1f} ms ({warm_requests} requests)")
+    return cold, warm
+
+
+def test_search_against_fake_cave():
+    run_search_benchmark(10000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("rows", type=int, nargs="*", default=[10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake CAVE response")
+    args = parser.parse_args()
+
+    print("🧪 CIRCUIT SEARCH AGAINST FAKE CAVE")
+    print("=" * 50)
+    for rows in args.rows:
+        run_search_benchmark(rows, args.latency)
+    print("\n🎉 Circuit search benchmark finished!")
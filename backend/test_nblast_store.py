@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the memory-mapped NBLAST store
+Converts a small wide score table and checks similar-neuron lookups, from the
+top-k table and from a matrix row scan, against a brute-force sort of each row
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from nblast_store import NblastStore, iter_score_rows, rank_top_k
+
+BASE = 720575940600000000
+
+
+def score_table(n_queries=40, n_targets=50, seed=0) -> pd.DataFrame:
+    """Wide NBLAST table; distinct scores that are exact in float16 so rankings have no ties"""
+    rng = np.random.default_rng(seed)
+    scores = (rng.permutation(n_queries * n_targets) / 2048 - 0.5).reshape(n_queries, n_targets)
+    targets = BASE + np.arange(n_targets)
+    queries = rng.permutation(targets)[:n_queries]
+    table = pd.DataFrame(scores, columns=[str(t) for t in targets])
+    table.insert(0, 'root_id', queries)
+    return table
+
+
+def brute_force_similar(table: pd.DataFrame, root_id: int, k: int, min_score=None):
+    row = table.loc[table['root_id'] == root_id].iloc[0].drop('root_id')
+    row = row.drop(str(root_id), errors='ignore').sort_values(ascending=False)[:k]
+    if min_score is not None:
+        row = row[row >= min_score]
+    return [int(t) for t in row.index], row.to_numpy(dtype=np.float32)
+
+
+def test_similar_matches_brute_force():
+    table = score_table()
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(tmp) / 'nblast.csv'
+        table.to_csv(csv, index=False)
+        matrix = NblastStore(Path(tmp) / 'nblast').load_or_build('9' * 64, csv, k=10)
+        assert matrix.top_k == 10 and matrix.scores.dtype == np.float16
+
+        for root_id in table['root_id'].tolist():
+            # k within the top-k table, beyond it (row scan) and with a score floor
+            for k, min_score in ((5, None), (10, None), (30, None), (49, None), (20, 0.1)):
+                result = matrix.similar(root_id, k=k, min_score=min_score)
+                expected_ids, expected_scores = brute_force_similar(table, root_id, k, min_score)
+                assert result['root_ids'].tolist() == expected_ids, (root_id, k)
+                assert np.array_equal(result['scores'], expected_scores)
+                assert root_id not in result['root_ids']
+
+        assert matrix.similar(BASE + 10 ** 6) is None
+        for k in (0, 1001):
+            try:
+                matrix.similar(int(table['root_id'][0]), k=k)
+                assert False, "k out of range must raise"
+            except ValueError:
+                pass
+
+        # The converted matrix is reused for the same table
+        csv.unlink()
+        assert NblastStore(Path(tmp) / 'nblast').load_or_build('9' * 64, csv).version == '9' * 64
+    print(f"✅ {len(table)} neurons' similar lists match a brute-force sort")
+
+
+def test_arrow_tables_read_in_chunks():
+    table = score_table()
+    with tempfile.TemporaryDirectory() as tmp:
+        parquet = Path(tmp) / 'nblast.parquet'
+        feather = Path(tmp) / 'nblast.feather'
+        table.to_parquet(parquet, index=False)
+        table.to_feather(feather)
+
+        for path in (parquet, feather):
+            chunks = list(iter_score_rows(path, chunksize=7))
+            # One row group / record batch on disk, still yielded 7 rows at a time
+            assert [len(queries) for queries, _, _ in chunks] == [7] * 5 + [5], path.suffix
+            assert np.concatenate([queries for queries, _, _ in chunks]).tolist() == table['root_id'].tolist()
+            scores = np.concatenate([rows for _, _, rows in chunks])
+            assert scores.dtype == np.float32 and np.array_equal(scores, table.iloc[:, 1:].to_numpy(np.float32))
+
+        matrix = NblastStore(Path(tmp) / 'nblast').load_or_build('f' * 64, feather, k=10)
+        root_id = int(table['root_id'][0])
+        assert matrix.similar(root_id, k=10)['root_ids'].tolist() == brute_force_similar(table, root_id, 10)[0]
+    print("✅ Parquet and Feather tables are converted chunksize rows at a time")
+
+
+def test_rank_top_k():
+    scores = np.array([[0.1, 0.9, -0.2, 0.5], [0.3, 0.2, 0.8, -np.inf]], dtype=np.float32)
+    columns, best = rank_top_k(scores, 2)
+    assert columns.tolist() == [[1, 3], [2, 0]] and np.allclose(best, [[0.9, 0.5], [0.8, 0.3]])
+    assert rank_top_k(scores, 10)[0].shape == (2, 4)
+    assert rank_top_k(scores, 0)[0].shape == (2, 0)
+    print("✅ rank_top_k orders each row best first")
+
+
+if __name__ == "__main__":
+    print("🧪 NBLAST STORE TESTS")
+    print("=" * 50)
+    test_similar_matches_brute_force()
+    test_arrow_tables_read_in_chunks()
+    test_rank_top_k()
+    print("\n🎉 All NBLAST store tests passed!")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the column-wise neuron record builder
+Checks build_neuron_records against the per-row dict construction it replaced,
+on frames with NaN coordinates, missing and categorical cell types and a field
+projection
+"""
+
+import numpy as np
+import pandas as pd
+
+from neuron_records import NEURON_FIELDS, build_neuron_records, label_column, root_id_array, stack_coordinates
+from test_annotation_snapshot import synthetic_annotations
+
+
+def reference_records(df, source, default_type):
+    """The original iterrows() serialization"""
+    def number(value):
+        return float(value) if pd.notna(value) else 0.0
+
+    def label(value, default):
+        return str(value) if pd.notna(value) else default
+
+    neurons = []
+    for _, row in df.iterrows():
+        neurons.append({
+            'id': str(row['root_id']),
+            'type': label(row['cell_type'], default_type),
+            'position': [number(row['pos_x']), number(row['pos_y']), number(row['pos_z'])],
+            'soma_position': [number(row['soma_x']), number(row['soma_y']), number(row['soma_z'])],
+            'activity': 0.0,
+            'mesh_id': row['root_id'],
+            'confidence': 1.0,
+            'source': source,
+            'super_class': label(row['super_class'], 'unknown'),
+            'cell_class': label(row['cell_class'], 'unknown'),
+            'side': label(row['side'], 'unknown')
+        })
+    return neurons
+
+
+def annotation_frames():
+    df = synthetic_annotations(n=500, seed=5)
+    rng = np.random.default_rng(5)
+    df.loc[rng.random(len(df)) < 0.1, 'pos_y'] = np.nan
+    df.loc[rng.random(len(df)) < 0.1, 'soma_z'] = np.nan
+    categorical = df.assign(cell_type=df['cell_type'].astype('category'), side=df['side'].astype('category'))
+    return {'object': df, 'categorical': categorical, 'subset': categorical.iloc[::7]}
+
+
+def test_records_match_row_construction():
+    for name, df in annotation_frames().items():
+        records = build_neuron_records(df, source='test', default_type='mechanosensory')
+        expected = reference_records(df, 'test', 'mechanosensory')
+        assert records == expected, name
+        assert all(list(record) == list(NEURON_FIELDS) for record in records)
+        assert all(type(record['mesh_id']) is int for record in records)
+        assert all(type(value) is float for record in records for value in record['position'])
+        assert any(record['type'] == 'mechanosensory' for record in records)
+        assert any(0.0 in record['position'] for record in records)
+    print("✅ Column-wise records match the per-row dicts")
+
+
+def test_field_projection():
+    df = annotation_frames()['categorical']
+    records = build_neuron_records(df, source='test', fields=['mesh_id', 'type', 'soma_position', 'secret'])
+    expected = reference_records(df, 'test', 'unknown')
+    assert [list(record) for record in records] == [['mesh_id', 'type', 'soma_position']] * len(df)
+    assert records == [{key: row[key] for key in ('mesh_id', 'type', 'soma_position')} for row in expected]
+    assert build_neuron_records(df.iloc[:0], source='test') == []
+    print("✅ fields= keeps only the requested keys")
+
+
+def test_column_helpers():
+    df = pd.DataFrame({
+        'pt_root_id': [720575940600000001, 720575940600000002, 720575940600000003],
+        'pos_x': [1.0, np.nan, 3.0],
+        'pos_y': ['4', 'bad', None],
+        'cell_type': pd.Categorical(['JO-A', None, 'JO-B'])
+    })
+    assert stack_coordinates(df).tolist() == [[1.0, 4.0, 0.0], [0.0, 0.0, 0.0], [3.0, 0.0, 0.0]]
+    kept = stack_coordinates(df, fill_missing=False)
+    assert kept[0, 0] == 1.0 and np.isnan(kept[1]).all() and np.isnan(kept[:, 2]).all()
+
+    ids = root_id_array(df)
+    assert ids.dtype == np.int64 and ids.tolist() == df['pt_root_id'].tolist()
+    assert root_id_array(df[['pos_x']]).tolist() == [0, 0, 0]
+
+    assert label_column(df, 'cell_type', 'none') == ['JO-A', 'none', 'JO-B']
+    assert label_column(df, 'side', 'unknown') == ['unknown'] * 3
+    print("✅ Coordinate, id and label helpers fill missing values")
+
+
+if __name__ == "__main__":
+    print("🧪 NEURON RECORD TESTS")
+    print("=" * 50)
+    test_records_match_row_construction()
+    test_field_projection()
+    test_column_helpers()
+    print("\n🎉 All neuron record tests passed!")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test cursor pagination and field projection
+Pages through neuron listings with cursors and checks every matching neuron is
+returned exactly once, and that cursors issued before a snapshot swap are
+rejected instead of silently shifting pages
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import flywire_cloud_backend
+from pagination import CursorError, decode_cursor, encode_cursor, paginate, parse_fields
+from test_annotation_snapshot import synthetic_annotations
+from test_dataset_swap import AnnotationServer, configure_offline
+
+
+def page_through(client, url):
+    """All neurons of a listing, following next_cursor; returns (neurons, page count)"""
+    neurons, pages, cursor = [], 0, None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ''))
+        assert response.status_code == 200, response.get_json()
+        data = response.get_json()
+        neurons.extend(data['neurons'])
+        pages += 1
+        cursor = data['next_cursor']
+        if cursor is None:
+            return neurons, pages
+
+
+def test_paginate_covers_rows_once():
+    rows = np.arange(1000, 1103)
+    for limit in (1, 10, 50, 103, 500):
+        seen, cursor = [], None
+        while True:
+            page, cursor = paginate(rows, limit, cursor, query='q', version='v' * 64)
+            seen.extend(page.tolist())
+            if cursor is None:
+                break
+        assert seen == rows.tolist(), limit
+
+    cursor = encode_cursor(10, 'q', 'v' * 64)
+    assert decode_cursor(cursor, 'q', 'v' * 64) == 10
+    for query, version, bad in (('other', 'v' * 64, cursor), ('q', 'w' * 64, cursor), ('q', 'v' * 64, 'not-a-cursor')):
+        try:
+            decode_cursor(bad, query, version)
+            assert False, "mismatched cursor must raise"
+        except CursorError:
+            pass
+
+    assert parse_fields('id, type') == ['id', 'type']
+    try:
+        parse_fields('id,secret')
+        assert False, "unknown fields must raise"
+    except ValueError:
+        pass
+    print("✅ paginate covers every row exactly once for any page size")
+
+
+def test_cursors_across_snapshot_swap():
+    service = flywire_cloud_backend.flywire_service
+    client = flywire_cloud_backend.app.test_client()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        df = synthetic_annotations(n=3000, seed=12)
+        server.publish(df, version=1)
+        configure_offline(service, server.url, Path(tmp) / 'cache')
+        try:
+            # Every JO neuron exactly once, in table order
+            neurons, pages = page_through(client, '/api/neurons/search?type=jo-&limit=37')
+            expected = df.loc[df['cell_type'].str.contains('jo-', case=False, na=False), 'root_id']
+            assert [n['id'] for n in neurons] == [str(i) for i in expected] and pages > 2
+
+            mech, _ = page_through(client, '/api/neurons/mechanosensory?limit=250&fields=id,type')
+            expected = df.loc[df['cell_class'] == 'mechanosensory', 'root_id']
+            assert [n['id'] for n in mech] == [str(i) for i in expected]
+            assert set(mech[0]) == {'id', 'type'}
+
+            # A cursor from another query is refused
+            first = client.get('/api/neurons/search?type=jo-&limit=37').get_json()
+            response = client.get(f"/api/neurons/search?type=LC10&limit=37&cursor={first['next_cursor']}")
+            assert response.status_code == 400
+
+            # After a refresh the old cursor expires instead of skipping or repeating neurons
+            server.publish(synthetic_annotations(n=2500, seed=13), version=2)
+            assert client.post('/api/refresh').status_code == 200
+            response = client.get(f"/api/neurons/search?type=jo-&limit=37&cursor={first['next_cursor']}")
+            assert response.status_code == 400 and 'expired' in response.get_json()['error']
+
+            # Restarting from the first page walks the new snapshot without gaps
+            swapped, _ = page_through(client, '/api/neurons/search?type=jo-&limit=37')
+            new_df = synthetic_annotations(n=2500, seed=13)
+            expected = new_df.loc[new_df['cell_type'].str.contains('jo-', case=False, na=False), 'root_id']
+            assert [n['id'] for n in swapped] == [str(i) for i in expected]
+        finally:
+            server.close()
+            service._dataset = None
+    print(f"✅ {len(neurons)} neurons paged without duplicates or gaps; stale cursors rejected")
+
+
+if __name__ == "__main__":
+    print("🧪 PAGINATION TESTS")
+    print("=" * 50)
+    test_paginate_covers_rows_once()
+    test_cursors_across_snapshot_swap()
+    print("\n🎉 All pagination tests passed!")
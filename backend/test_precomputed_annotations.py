@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test the precomputed annotation exporter
+Reads exported shard files back the way Neuroglancer does (id lookups and
+spatial chunks), and checks that the viewer state references the export by URL
+while /precomputed serves it with range requests - no FlyWire connection needed
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import flywire_neuroglancer
+from precomputed_annotations import (POINT_DTYPE, compressed_morton_code, read_sharded,
+                                     write_point_annotations)
+from test_cave_queries import OfflineNeuroglancerService
+from test_circuit_activity import CountingViewer
+
+
+def test_morton_codes_skip_exhausted_dimensions():
+    cells = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [2, 1, 0], [3, 0, 0]])
+    # x has 2 bits, y 1 bit, z 1 bit: x0 y0 z0 x1
+    assert compressed_morton_code(cells, [4, 2, 2]).tolist() == [0, 1, 2, 4, 10, 9]
+    assert compressed_morton_code(cells[:1], [1, 1, 1]).tolist() == [0]
+    print("✅ Compressed Morton codes match the precomputed spec")
+
+
+def test_sharded_export_round_trip():
+    rng = np.random.default_rng(7)
+    n = 10000
+    ids = (720575940600000000 + rng.choice(10 ** 8, size=n, replace=False)).astype(np.uint64)
+    positions = rng.uniform([100000, 100000, 10000], [900000, 400000, 280000], size=(n, 3)).round()
+    type_codes = rng.integers(3, size=n).astype(np.uint32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'layer'
+        info = write_point_annotations(path, ids, positions, np.full(n, 0.9, dtype=np.float32), type_codes,
+                                       ['KC_gamma', 'MBON01', 'T4a'])
+        assert json.loads((path / 'info').read_text()) == info
+        assert info['by_id']['sharding']['shard_bits'] > 0
+
+        # Id index: every root id resolves to its own point
+        for i in rng.choice(n, size=50, replace=False):
+            record = np.frombuffer(read_sharded(path / 'by_id', int(ids[i]), info['by_id']['sharding']), POINT_DTYPE)
+            assert record['point'][0].tolist() == positions[i].tolist() and record['cell_type'][0] == type_codes[i]
+        assert read_sharded(path / 'by_id', 12345, info['by_id']['sharding']) is None
+
+        # Spatial index: each annotation lies in exactly one chunk, inside that chunk's bounds
+        spatial = info['spatial'][0]
+        grid = np.stack(np.meshgrid(*[np.arange(size) for size in spatial['grid_shape']], indexing='ij'),
+                        axis=-1).reshape(-1, 3)
+        seen = []
+        for cell, code in zip(grid, compressed_morton_code(grid, spatial['grid_shape']).tolist()):
+            chunk = read_sharded(path / 'spatial0', code, spatial['sharding'])
+            if chunk is None:
+                continue
+            count = int(np.frombuffer(chunk, dtype='<u8', count=1)[0])
+            assert count <= spatial['limit']
+            records = np.frombuffer(chunk, dtype=POINT_DTYPE, count=count, offset=8)
+            seen.extend(np.frombuffer(chunk, dtype='<u8', offset=8 + records.nbytes).tolist())
+            low = np.array(info['lower_bound']) + cell * spatial['chunk_size']
+            assert np.all(records['point'] >= low) and np.all(records['point'] < low + spatial['chunk_size'])
+        assert sorted(seen) == sorted(ids.tolist())
+    print(f"✅ {n} annotations round-trip through {len(grid)} spatial chunks")
+
+
+def test_viewer_references_served_export():
+    service = OfflineNeuroglancerService()
+    service.viewer = CountingViewer()
+    circuits = service.search_chrimson_circuits()
+    service.create_neuroglancer_visualization(annotation_url='http://backend.test/precomputed/')
+
+    layer = service.viewer.state.layers['Photoreceptor Circuit_annotations']
+    source = layer.to_json()['source'][0]['url']
+    assert source.startswith('precomputed://http://backend.test/precomputed/circuits-') and source.endswith('/1')
+    assert 'annotations' not in layer.to_json()
+
+    flywire_neuroglancer.flywire_service = service
+    client = flywire_neuroglancer.app.test_client()
+    try:
+        relative = source.split('/precomputed/', 1)[1]
+        response = client.get(f'/precomputed/{relative}/info')
+        assert response.status_code == 200 and response.headers['Access-Control-Allow-Origin'] == '*'
+        info = json.loads(response.data)
+        assert info['annotation_type'] == 'POINT'
+        assert info['properties'][1]['enum_labels'] == ['photoreceptor_R7']
+
+        shard = client.get(f'/precomputed/{relative}/by_id/0.shard', headers={'Range': 'bytes=0-15'})
+        assert shard.status_code == 206 and len(shard.data) == 16
+        assert client.get('/precomputed/../secrets').status_code == 404
+    finally:
+        flywire_neuroglancer.flywire_service = None
+
+    # The same circuits reuse the export
+    store = service.annotation_store
+    assert store.load_or_build(circuits).name == relative.split('/')[0]
+    print(f"✅ Viewer state points at {source}")
+
+
+if __name__ == "__main__":
+    print("🧪 PRECOMPUTED ANNOTATION TESTS")
+    print("=" * 50)
+    test_morton_codes_skip_exhausted_dimensions()
+    test_sharded_export_round_trip()
+    test_viewer_references_served_export()
+    print("\n🎉 All precomputed annotation tests passed!")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test ETags, 304 responses and compression of cached endpoints
+Uses a small Flask app whose view counts its calls, so the tests can tell
+served-from-cache responses from fresh renders
+"""
+
+import gzip
+
+from flask import Flask, jsonify, request
+
+from response_cache import ResponseCache
+
+
+def make_app(state):
+    app = Flask(__name__)
+    cache = ResponseCache(version=lambda: state['version'])
+    cache.init_app(app)
+
+    @app.route('/neurons')
+    @cache.cached
+    def neurons():
+        state['calls'] += 1
+        size = request.args.get('n', 500, type=int)
+        response = jsonify({'version': state['version'], 'ids': list(range(size))})
+        response.vary.add('Accept')
+        return response
+
+    return app
+
+
+def test_etag_and_304():
+    state = {'version': 'snapshot-a', 'calls': 0}
+    client = make_app(state).test_client()
+
+    first = client.get('/neurons')
+    etag = first.headers['ETag'].strip('"')
+    assert first.status_code == 200 and state['calls'] == 1 and 'Content-Encoding' not in first.headers
+
+    # Same snapshot and query: served from the cache, and revalidates to 304
+    assert client.get('/neurons').data == first.data and state['calls'] == 1
+    not_modified = client.get('/neurons', headers={'If-None-Match': f'"{etag}"'})
+    assert not_modified.status_code == 304 and not not_modified.data
+    assert not_modified.headers['ETag'] == f'"{etag}"'
+
+    # Different parameters render separately under their own tag
+    other = client.get('/neurons?n=3')
+    assert other.headers['ETag'] != first.headers['ETag'] and state['calls'] == 2
+
+    # A new snapshot invalidates both the tag and the cached body
+    state['version'] = 'snapshot-b'
+    refreshed = client.get('/neurons', headers={'If-None-Match': f'"{etag}"'})
+    assert refreshed.status_code == 200 and refreshed.get_json()['version'] == 'snapshot-b'
+    assert state['calls'] == 3
+
+    # Without a loaded snapshot the view runs uncached
+    state['version'] = None
+    client.get('/neurons')
+    client.get('/neurons')
+    assert state['calls'] == 5
+    print("✅ Strong ETags, 304 revalidation and snapshot invalidation")
+
+
+def test_compressed_etag_revalidates():
+    state = {'version': 'snapshot-a', 'calls': 0}
+    client = make_app(state).test_client()
+
+    compressed = client.get('/neurons', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    etag = compressed.headers['ETag'].strip('"')
+    assert etag.endswith('-gzip')
+    plain = client.get('/neurons')
+    assert gzip.decompress(compressed.data) == plain.data and state['calls'] == 1
+
+    # The encoded tag a browser stored revalidates like the plain one
+    response = client.get('/neurons', headers={'If-None-Match': f'"{etag}"', 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304 and response.headers['ETag'] == f'"{etag}"'
+    assert set(response.vary) == set(compressed.vary) == {'Accept', 'Accept-Encoding'}
+
+    # A tag of one encoding never revalidates a request that would get another
+    response = client.get('/neurons', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200 and response.data == plain.data
+    plain_etag = plain.headers['ETag']
+    response = client.get('/neurons', headers={'If-None-Match': plain_etag, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200 and response.headers['ETag'] == f'"{etag}"'
+    response = client.get('/neurons', headers={'If-None-Match': plain_etag})
+    assert response.status_code == 304 and response.headers['ETag'] == plain_etag
+    assert set(response.vary) == {'Accept', 'Accept-Encoding'} and state['calls'] == 1
+
+    # Small bodies are sent uncompressed
+    small = client.get('/neurons?n=2', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers and small.get_json()['ids'] == [0, 1]
+    print("✅ Compressed responses revalidate with their encoded ETag")
+
+
+if __name__ == "__main__":
+    print("🧪 RESPONSE CACHE TESTS")
+    print("=" * 50)
+    test_etag_and_304()
+    test_compressed_etag_revalidates()
+    print("\n🎉 All response cache tests passed!")
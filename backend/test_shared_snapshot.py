@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test sharing the annotation snapshot across gunicorn workers
+Checks that every loaded column, categorical codes included, stays a view of the
+snapshot files, and that a worker forked after the master's when_ready preload
+serves the inherited dataset without downloading or parsing again
+"""
+
+import gc
+import json
+import os
+import runpy
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import flywire_cloud_backend
+from annotation_snapshot import AnnotationSnapshotStore
+from test_annotation_snapshot import synthetic_annotations
+from test_dataset_swap import AnnotationServer, configure_offline
+
+GUNICORN_CONF = Path(__file__).resolve().parent / 'gunicorn.conf.py'
+
+
+class FakeArbiter:
+    class log:
+        messages = []
+
+        @classmethod
+        def info(cls, message):
+            cls.messages.append(message)
+
+        warning = info
+
+
+def backed_by_file(values: np.ndarray) -> bool:
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def test_columns_map_the_snapshot():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnnotationSnapshotStore(tmp)
+        store.load_or_build('e' * 64, lambda: synthetic_annotations(n=1000))
+        loaded = store.load('e' * 64)
+        for column in loaded.columns:
+            series = loaded[column]
+            values = series.cat.codes.to_numpy() if hasattr(series, 'cat') else series.to_numpy()
+            assert backed_by_file(values), column
+        copied = store.load('e' * 64, mmap=False)
+        assert not backed_by_file(copied['pos_x'].to_numpy())
+    print(f"✅ All {len(loaded.columns)} columns are views of the snapshot files")
+
+
+def test_forked_worker_inherits_preloaded_dataset():
+    service = flywire_cloud_backend.flywire_service
+    config = runpy.run_path(str(GUNICORN_CONF))
+    assert config['preload_app']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AnnotationServer(tmp)
+        server.publish(synthetic_annotations(n=2000, seed=14), version=1)
+        configure_offline(service, server.url, Path(tmp) / 'cache')
+        try:
+            config['when_ready'](FakeArbiter)
+            assert gc.get_freeze_count() > 0
+            dataset = service.get_dataset()
+            assert server.downloads == 1 and any('Preloaded 2,000 neurons' in m for m in FakeArbiter.log.messages)
+
+            read_end, write_end = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                # Worker: post_fork, then answer from the inherited snapshot
+                try:
+                    config['post_fork'](FakeArbiter, None)
+                    worker_dataset = service.get_dataset()
+                    report = {
+                        'same': worker_dataset is dataset,
+                        'session': service.blobs.session is not None,
+                        'jo': len(worker_dataset.cell_type_index.contains('JO-'))
+                    }
+                    os.write(write_end, json.dumps(report).encode())
+                finally:
+                    os._exit(0)
+            os.close(write_end)
+            with os.fdopen(read_end) as pipe:
+                report = json.loads(pipe.read())
+            os.waitpid(pid, 0)
+
+            assert report == {'same': True, 'session': True,
+                              'jo': len(dataset.cell_type_index.contains('JO-'))}
+            assert server.downloads == 1
+        finally:
+            gc.unfreeze()
+            server.close()
+            service._dataset = None
+    print("✅ Forked worker served the master's snapshot without reloading")
+
+
+if __name__ == "__main__":
+    print("🧪 SHARED SNAPSHOT TESTS")
+    print("=" * 50)
+    test_columns_map_the_snapshot()
+    test_forked_worker_inherits_preloaded_dataset()
+    print("\n🎉 All shared snapshot tests passed!")
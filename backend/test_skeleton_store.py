@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test the packed skeleton store
+Parses a small branched SWC (nodes out of order) and its precomputed encoding,
+checks cable distances and downsampling against a plain parent walk, and reads
+every level of detail back from a packed store built from a directory and a zip
+"""
+
+import struct
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from skeleton_store import (SkeletonStore, cable_distance, downsample, iter_skeletons, parse_precomputed,
+                            parse_swc)
+
+ROOT_ID = 720575940600000000
+
+# Trunk of 10 nodes along x from node 1, a 5-node side branch along y from node 5
+NODES = [(i, (100.0 * (i - 1), 0.0, 0.0), i - 1 if i > 1 else -1) for i in range(1, 11)] + \
+        [(i, (400.0, 100.0 * (i - 10), 0.0), i - 1 if i > 11 else 5) for i in range(11, 16)]
+
+
+def swc_bytes(nodes=NODES, order=None) -> bytes:
+    order = order if order is not None else range(len(nodes))
+    lines = ['# test neuron']
+    for i in order:
+        node_id, (x, y, z), parent = nodes[i]
+        lines.append(f"{node_id} 0 {x} {y} {z} {node_id / 10} {parent}")
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def precomputed_bytes(nodes=NODES) -> bytes:
+    index = {node_id: i for i, (node_id, _, _) in enumerate(nodes)}
+    edges = [(index[node_id], index[parent]) for node_id, _, parent in nodes if parent >= 0]
+    vertices = np.array([xyz for _, xyz, _ in nodes], dtype='<f4')
+    radius = np.array([node_id / 10 for node_id, _, _ in nodes], dtype='<f4')
+    return (struct.pack('<II', len(nodes), len(edges)) + vertices.tobytes() +
+            np.array(edges, dtype='<u4').tobytes() + radius.tobytes())
+
+
+def edge_set(skeleton):
+    vertices, _, parents = skeleton
+    return {(tuple(vertices[i].tolist()), tuple(vertices[p].tolist())) for i, p in enumerate(parents) if p >= 0}
+
+
+def expected_edges():
+    xyz = {node_id: position for node_id, position, _ in NODES}
+    return {(xyz[node_id], xyz[parent]) for node_id, _, parent in NODES if parent >= 0}
+
+
+def test_parse_swc_and_precomputed():
+    shuffled = np.random.default_rng(0).permutation(len(NODES))
+    for skeleton in (parse_swc(swc_bytes(order=shuffled)),
+                     parse_precomputed(precomputed_bytes(), [{'id': 'radius', 'data_type': 'float32'}])):
+        vertices, radius, parents = skeleton
+        assert len(vertices) == len(NODES) and parents[0] == -1 and (parents[1:] >= 0).all()
+        # Breadth-first order: every parent comes before its children
+        assert (parents[1:] < np.arange(1, len(parents))).all()
+        assert edge_set(skeleton) == expected_edges()
+        assert tuple(vertices[0].tolist()) == (0.0, 0.0, 0.0) and radius[0] == np.float32(0.1)
+    print("✅ SWC and precomputed skeletons parse to the same tree")
+
+
+def test_cable_distance_and_downsample():
+    vertices, radius, parents = parse_swc(swc_bytes())
+
+    def walk(i):
+        return 0.0 if parents[i] < 0 else np.linalg.norm(vertices[i] - vertices[parents[i]]) + walk(parents[i])
+    assert np.allclose(cable_distance(vertices, parents), [walk(i) for i in range(len(parents))])
+
+    # Coarse levels keep the root, the branch point and both leaves, joined by the remaining cable
+    coarse = downsample((vertices, radius, parents), spacing=10_000)
+    assert sorted(map(tuple, coarse[0].tolist())) == sorted([(0, 0, 0), (400, 0, 0), (900, 0, 0), (400, 500, 0)])
+    assert edge_set(coarse) == {((400, 0, 0), (0, 0, 0)), ((900, 0, 0), (400, 0, 0)), ((400, 500, 0), (400, 0, 0))}
+
+    middle = downsample((vertices, radius, parents), spacing=250)
+    assert 4 < len(middle[2]) < len(parents)
+    assert np.isclose(cable_distance(middle[0], middle[2]).max(), cable_distance(vertices, parents).max())
+    assert downsample((vertices, radius, parents), spacing=0)[2] is parents
+    print(f"✅ Downsampling keeps topology: {len(parents)} → {len(middle[2])} → {len(coarse[2])} nodes")
+
+
+def test_packed_store_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / 'swc'
+        source.mkdir()
+        (source / f'{ROOT_ID}.swc').write_bytes(swc_bytes())
+        (source / f'{ROOT_ID + 1}.swc').write_bytes(swc_bytes(NODES[:10]))
+        archive = Path(tmp) / 'skeletons.zip'
+        with zipfile.ZipFile(archive, 'w') as z:
+            for file in source.iterdir():
+                z.write(file, f'sk_lod1_783/{file.name}')
+
+        for name, release in (('dir', source), ('zip', archive)):
+            store = SkeletonStore(Path(tmp) / f'store-{name}')
+            packed = store.load_or_build(name * 8, release)
+            assert len(packed) == 2 and ROOT_ID in packed and ROOT_ID + 2 not in packed
+            assert packed.skeleton(ROOT_ID + 2) is None
+
+            for root_id, skeleton in iter_skeletons(release):
+                for lod, spacing in enumerate(packed.lod_spacings):
+                    served = packed.skeleton(root_id, lod=lod)
+                    expected = downsample(skeleton, spacing)
+                    assert np.array_equal(served['vertices'], expected[0])
+                    assert np.array_equal(served['radius'], expected[1])
+                    assert np.array_equal(served['parents'], expected[2])
+            try:
+                packed.skeleton(ROOT_ID, lod=len(packed.lod_spacings))
+                assert False, "an unknown level of detail must raise"
+            except ValueError:
+                pass
+
+            # The packed store is reused while the release is unchanged
+            assert store.load_or_build(name * 8, Path(tmp) / 'missing').version == name * 8
+    print("✅ Packed skeletons round-trip at every level of detail")
+
+
+if __name__ == "__main__":
+    print("🧪 SKELETON STORE TESTS")
+    print("=" * 50)
+    test_parse_swc_and_precomputed()
+    test_cable_distance_and_downsample()
+    test_packed_store_round_trip()
+    print("\n🎉 All skeleton store tests passed!")
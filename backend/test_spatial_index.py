@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test the neuron spatial index
+Nearest-neighbour and bounding-box queries must return exactly what a brute-force
+distance filter over the annotation table gives, skipping rows without a soma
+"""
+
+import numpy as np
+
+from neuron_records import POSITION_COLUMNS, SOMA_COLUMNS
+from spatial_index import NeuronSpatialIndex
+from test_annotation_snapshot import synthetic_annotations
+
+
+def brute_force_coords(df, columns):
+    return df[list(columns)].to_numpy(dtype=np.float64)
+
+
+def test_nearest_matches_brute_force():
+    df = synthetic_annotations(n=3000)
+    index = NeuronSpatialIndex(df)
+    rng = np.random.default_rng(4)
+
+    for space, columns in (('soma', SOMA_COLUMNS), ('position', POSITION_COLUMNS)):
+        coords = brute_force_coords(df, columns)
+        for point in rng.uniform([100000, 100000, 1000], [900000, 400000, 7000], size=(20, 3)):
+            distances = np.linalg.norm(coords - point, axis=1)
+            distances[np.isnan(distances)] = np.inf
+            expected = np.sort(distances)[:10]
+
+            rows, got = index.nearest(point, k=10, space=space)
+            assert np.allclose(got, expected), space
+            assert np.allclose(distances[rows], got)
+            assert np.isfinite(coords[rows]).all()
+
+            # max_distance keeps only neighbours within range
+            limit = float(expected[4])
+            rows, got = index.nearest(point, k=10, space=space, max_distance=limit + 1e-6)
+            assert np.allclose(got, expected[expected <= limit + 1e-6])
+
+    assert len(index.nearest([0, 0, 0], k=0)[0]) == 0
+    assert len(index.nearest([0, 0, 0], k=10 ** 6)[0]) == df[list(SOMA_COLUMNS)].notna().all(axis=1).sum()
+    print("✅ Nearest neighbours match a brute-force distance sort")
+
+
+def test_region_matches_brute_force():
+    df = synthetic_annotations(n=3000, seed=5)
+    index = NeuronSpatialIndex(df)
+    rng = np.random.default_rng(6)
+
+    for space, columns in (('soma', SOMA_COLUMNS), ('position', POSITION_COLUMNS)):
+        coords = brute_force_coords(df, columns)
+        for _ in range(20):
+            corners = rng.uniform([100000, 100000, 1000], [900000, 400000, 7000], size=(2, 3))
+            lower, upper = corners.min(axis=0), corners.max(axis=0)
+            inside = np.all((coords >= lower) & (coords <= upper), axis=1)
+            assert index.within_box(lower, upper, space=space).tolist() == np.flatnonzero(inside).tolist()
+
+        # Box edges are inclusive
+        row = int(np.flatnonzero(np.isfinite(coords).all(axis=1))[0])
+        assert row in index.within_box(coords[row], coords[row], space=space).tolist()
+
+    for bad in ((lambda: index.within_box([1, 1, 1], [0, 0, 0])), (lambda: index.nearest([0, 0, 0], space='mesh'))):
+        try:
+            bad()
+            assert False, "invalid region or space must raise"
+        except ValueError:
+            pass
+    print("✅ Region queries match a brute-force box filter")
+
+
+if __name__ == "__main__":
+    print("🧪 SPATIAL INDEX TESTS")
+    print("=" * 50)
+    test_nearest_matches_brute_force()
+    test_region_matches_brute_force()
+    print("\n🎉 All spatial index tests passed!")